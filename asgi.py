@@ -12,5 +12,19 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+# Listing and review reads are served by the async views (listings.async_views)
+os.environ.setdefault('ASYNC_API_VIEWS', 'True')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Booking and payment status streams are served in front of Django
+from listings.push import StatusStreamApplication  # noqa: E402
+
+application = StatusStreamApplication(django_application)
+
+# Pay the first-request costs at boot. Under gunicorn with preload_app the
+# master imports this module, so gunicorn.conf.py defers it to post_fork.
+if os.environ.get('DJANGO_WARMUP', 'import') == 'import':
+    from listings.warmup import warm_up
+
+    warm_up()
@@ -0,0 +1,49 @@
+"""
+Gunicorn configuration for alx_travel_app.
+Run with: gunicorn wsgi:application (this file is picked up automatically)
+
+Workers write Prometheus metrics to PROMETHEUS_MULTIPROC_DIR so that
+/metrics can aggregate every worker process (see listings/metrics.py).
+
+Each worker is warmed up (listings/warmup.py) when it imports wsgi.py. With
+GUNICORN_PRELOAD=True the app is imported once in the master instead, and
+the warm-up, which opens database connections that must not be shared
+across processes, runs in each worker after the fork.
+"""
+
+import os
+import shutil
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes')
+
+if preload_app:
+    os.environ['DJANGO_WARMUP'] = 'post_fork'
+
+# Must be set before anything imports prometheus_client: workers inherit
+# the master's modules, and the value storage is chosen at import time
+# Celery workers must be started with the same directory so their task
+# metrics are aggregated too
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/alx_travel_app_metrics')
+
+
+def on_starting(server):
+    # Values left by a previous run would be added to the new ones
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from listings.warmup import warm_up
+
+        warm_up()
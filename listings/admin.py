@@ -1,12 +1,187 @@
 """
 Admin configuration for the listings app models.
+
+The changelists are built for tables with millions of rows:
+- foreign keys shown in list_display are joined with list_select_related
+- the unfiltered "N total" count is not computed, and the paginator uses
+  the planner's row estimate for unfiltered PostgreSQL tables
+- filters offer fixed ranges instead of SELECT DISTINCT value lists
+- foreign key widgets are autocompletes instead of full <select> lists
+- search matches prefixes (^field) and, on PostgreSQL, full-text vectors,
+  both backed by the indexes created in migration 0004
+
+Booking and payment status actions are set-based (listings.bulk); large
+selections run as a Celery task.
 """
-from django.contrib import admin
-from .models import Listing, Booking, Review
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.http import Http404, JsonResponse
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from . import bulk
+from .models import Listing, Booking, Review, Payment
+from .tasks import bulk_status_change
+
+
+# Text search configuration of the GIN indexes in migration 0004
+FULL_TEXT_CONFIG = 'english'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the row estimate from pg_class instead of running
+    COUNT(*) over a large unfiltered PostgreSQL table.
+    """
+    # Below this many rows an exact count is cheap enough
+    estimate_above = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                        [queryset.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] >= self.estimate_above:
+                    return int(row[0])
+        return super().count
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """
+    Base admin for the large tables.
+
+    full_text_search_fields are matched with to_tsvector/websearch_to_tsquery
+    on PostgreSQL, in addition to search_fields. Other backends cannot use
+    an index for them and skip them.
+    """
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    list_per_page = 50
+    date_hierarchy = 'created_at'
+    full_text_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        matches, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not search_term or not self.full_text_search_fields:
+            return matches, may_have_duplicates
+        if connections[queryset.db].vendor != 'postgresql':
+            return matches, may_have_duplicates
+
+        from django.contrib.postgres.search import SearchQuery, SearchVector, SearchVectorExact
+
+        query = SearchQuery(search_term, config=FULL_TEXT_CONFIG, search_type='websearch')
+        condition = Q()
+        for field in self.full_text_search_fields:
+            condition |= Q(SearchVectorExact(SearchVector(field, config=FULL_TEXT_CONFIG), query))
+        return matches | queryset.filter(condition), may_have_duplicates
+
+
+class BulkActionMixin:
+    """
+    Runs listings.bulk operations from admin actions. Selections of up to
+    BULK_ACTION_ASYNC_THRESHOLD rows are changed within the request, larger
+    ones by the bulk_status_change task, whose progress is served as JSON
+    on <changelist>/bulk-progress/<task id>/.
+    """
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path(
+                'bulk-progress/<str:task_id>/',
+                self.admin_site.admin_view(self.bulk_progress_view),
+                name=f'{opts.app_label}_{opts.model_name}_bulk_progress',
+            ),
+        ] + super().get_urls()
+
+    def bulk_progress_view(self, request, task_id):
+        progress = bulk.get_progress(task_id)
+        if progress is None:
+            raise Http404('Unknown bulk action')
+        return JsonResponse(progress)
+
+    def run_bulk_action(self, request, queryset, operation, *args):
+        opts = self.model._meta
+        total = queryset.count()
+        if total > settings.BULK_ACTION_ASYNC_THRESHOLD:
+            ids = [str(pk) for pk in queryset.values_list('pk', flat=True)]
+            result = bulk_status_change.delay(operation, ids, request.user.pk, *args)
+            if not bulk.progress_is_shared():
+                self.message_user(request, (
+                    f'{total} {opts.verbose_name_plural} are being processed in the background. Progress '
+                    'cannot be shown: BULK_PROGRESS_CACHE_ALIAS is a per-process LocMem cache.'
+                ), messages.WARNING)
+                return
+            url = reverse(f'admin:{opts.app_label}_{opts.model_name}_bulk_progress', args=[result.id])
+            self.message_user(request, format_html(
+                '{} {} are being processed in the background (<a href="{}">progress</a>).',
+                total, opts.verbose_name_plural, url,
+            ))
+            return
+
+        counts = bulk.OPERATIONS[operation][1](queryset, request.user.pk, *args)
+        changed = ', '.join(f'{count} {status}' for status, count in counts.items() if count)
+        unchanged = total - sum(counts.values())
+        self.message_user(request, f'{changed or "none changed"}; {unchanged} left unchanged.')
+
+
+class PriceRangeFilter(admin.SimpleListFilter):
+    """Fixed price-per-night buckets, filtered with the price index."""
+    title = 'price per night'
+    parameter_name = 'price'
+    ranges = [
+        ('0-50', 0, 50),
+        ('50-100', 50, 100),
+        ('100-200', 100, 200),
+        ('200-500', 200, 500),
+        ('500-', 500, None),
+    ]
+
+    def lookups(self, request, model_admin):
+        return [
+            (key, f'{low} - {high}' if high is not None else f'{low} and above')
+            for key, low, high in self.ranges
+        ]
+
+    def queryset(self, request, queryset):
+        for key, low, high in self.ranges:
+            if self.value() == key:
+                queryset = queryset.filter(price_per_night__gte=Decimal(low))
+                if high is not None:
+                    queryset = queryset.filter(price_per_night__lt=Decimal(high))
+                return queryset
+        return queryset
+
+
+class RatingFilter(admin.SimpleListFilter):
+    """Ratings 1-5 without a SELECT DISTINCT over the table."""
+    title = 'rating'
+    parameter_name = 'rating'
+
+    def lookups(self, request, model_admin):
+        return [(str(rating), '★' * rating) for rating in range(5, 0, -1)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(rating=self.value())
+        return queryset
 
 
 @admin.register(Listing)
-class ListingAdmin(admin.ModelAdmin):
+class ListingAdmin(ScalableModelAdmin):
     """Admin interface for Listing model."""
     list_display = [
         'listing_id',
@@ -19,14 +194,17 @@ class ListingAdmin(admin.ModelAdmin):
         'available_to',
         'created_at'
     ]
-    list_filter = ['location', 'created_at', 'price_per_night']
-    search_fields = ['title', 'description', 'location', 'host__username']
+    list_select_related = ['host']
+    list_filter = [PriceRangeFilter, 'available_from']
+    search_fields = ['^title', '^location', 'host__username__startswith']
+    full_text_search_fields = ['description']
+    autocomplete_fields = ['host']
     readonly_fields = ['listing_id', 'created_at', 'updated_at']
     ordering = ['-created_at']
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(BulkActionMixin, ScalableModelAdmin):
     """Admin interface for Booking model."""
     list_display = [
         'booking_id',
@@ -39,14 +217,29 @@ class BookingAdmin(admin.ModelAdmin):
         'status',
         'created_at'
     ]
-    list_filter = ['status', 'created_at', 'check_in_date']
-    search_fields = ['listing__title', 'user__username']
+    list_select_related = ['listing', 'user']
+    list_filter = ['status', 'check_in_date']
+    search_fields = ['^listing__title', 'user__username__startswith']
+    autocomplete_fields = ['listing', 'user']
     readonly_fields = ['booking_id', 'created_at', 'updated_at']
     ordering = ['-created_at']
+    actions = ['confirm_bookings', 'cancel_bookings', 'complete_bookings']
+
+    @admin.action(description='Confirm selected pending bookings', permissions=['change'])
+    def confirm_bookings(self, request, queryset):
+        self.run_bulk_action(request, queryset, 'transition_bookings', 'confirmed')
+
+    @admin.action(description='Cancel selected pending or confirmed bookings', permissions=['change'])
+    def cancel_bookings(self, request, queryset):
+        self.run_bulk_action(request, queryset, 'transition_bookings', 'cancelled')
+
+    @admin.action(description='Complete selected confirmed bookings that have ended', permissions=['change'])
+    def complete_bookings(self, request, queryset):
+        self.run_bulk_action(request, queryset, 'transition_bookings', 'completed')
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(ScalableModelAdmin):
     """Admin interface for Review model."""
     list_display = [
         'review_id',
@@ -55,7 +248,41 @@ class ReviewAdmin(admin.ModelAdmin):
         'rating',
         'created_at'
     ]
-    list_filter = ['rating', 'created_at']
-    search_fields = ['listing__title', 'user__username', 'comment']
+    list_select_related = ['listing', 'user']
+    list_filter = [RatingFilter]
+    search_fields = ['^listing__title', 'user__username__startswith']
+    full_text_search_fields = ['comment']
+    autocomplete_fields = ['listing', 'user']
     readonly_fields = ['review_id', 'created_at', 'updated_at']
     ordering = ['-created_at']
+
+
+@admin.register(Payment)
+class PaymentAdmin(BulkActionMixin, ScalableModelAdmin):
+    """Admin interface for Payment model."""
+    list_display = [
+        'payment_id',
+        'booking',
+        'amount',
+        'currency',
+        'payment_status',
+        'payment_method',
+        'payment_date',
+        'created_at'
+    ]
+    list_select_related = ['booking__user']
+    list_filter = ['payment_status']
+    # Unique columns, looked up exactly so their indexes are used
+    search_fields = ['chapa_reference__exact', 'transaction_id__exact']
+    autocomplete_fields = ['booking']
+    readonly_fields = ['payment_id', 'created_at', 'updated_at']
+    ordering = ['-created_at']
+    actions = ['reverify_payments', 'expire_payments']
+
+    @admin.action(description='Re-verify selected pending payments with Chapa', permissions=['change'])
+    def reverify_payments(self, request, queryset):
+        self.run_bulk_action(request, queryset, 'reverify_payments')
+
+    @admin.action(description='Expire selected pending payments', permissions=['change'])
+    def expire_payments(self, request, queryset):
+        self.run_bulk_action(request, queryset, 'expire_payments')
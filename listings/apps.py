@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ListingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'listings'
+
+    def ready(self):
+        # Connect signal handlers
+        from . import querycount, signals  # noqa: F401
+
+        # The project root is not imported as a package, so its __init__
+        # never loads the Celery app and shared tasks would fall back to
+        # Celery's default AMQP app. Load it here so CELERY_* settings apply.
+        import celery_app  # noqa: F401
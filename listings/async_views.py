@@ -0,0 +1,177 @@
+"""
+Native async list and retrieve views for listings and reviews.
+
+With ASYNC_API_VIEWS (set by asgi.py) the listing and review URLs are
+served by these views. GET requests run on the event loop and only the
+database access is awaited (acount/aiterator/aget). Everything else comes
+from the DRF viewset, so the responses are the same as the sync API's:
+- queryset
+- filter backends and ordering
+- throttles
+- serializer and pagination
+- response cache entries
+
+Other methods, the browsable API (Accept: text/html) and format suffixes
+are passed to the viewset, which runs in a worker thread as any sync view
+does under ASGI.
+
+Serialization runs inline. Throttling and the response cache lookups go
+to the cache backend, a network round trip with Redis, so they run in a
+worker thread, as does filtering, since the ranked ?search= reads the term
+index. The serializers only read what select_related loaded; an
+accidental lazy query would raise SynchronousOnlyOperation rather than
+block the loop.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from . import cache
+from .cache import CachedResponseMixin
+from .timing import TimedJSONRenderer
+from .views import ListingViewSet, ReviewViewSet
+
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+
+async def cache_call(function, *args):
+    """
+    Run a blocking cache call (response cache, throttle buckets) in a
+    worker thread. They touch no database connection, so they need not
+    queue behind the thread the ORM calls share.
+    """
+    return await sync_to_async(function, thread_sensitive=False)(*args)
+
+
+class AsyncReadView(View):
+    """
+    Async GET list (detail=False) or retrieve (detail=True) for `viewset`.
+    """
+    viewset = None
+    detail = False
+    # The viewset's own view for the same URL, set by as_view()
+    sync_view = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        actions = DETAIL_ACTIONS if initkwargs.get('detail', cls.detail) else LIST_ACTIONS
+        view = super().as_view(sync_view=cls.viewset.as_view(actions), **initkwargs)
+        # As with APIView, CSRF is enforced by SessionAuthentication in the
+        # viewset for the methods passed to it
+        return csrf_exempt(view)
+
+    async def passthrough(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        if 'text/html' in request.headers.get('Accept', '') or 'format' in request.GET:
+            return await self.passthrough(request, *args, **kwargs)
+
+        request.user = await request.auser()
+        drf_request = Request(request)
+        drf_request.user = request.user
+        view = self.viewset(
+            request=drf_request,
+            args=args,
+            kwargs=kwargs,
+            action='retrieve' if self.detail else 'list',
+            detail=self.detail,
+            format_kwarg=None,
+        )
+        try:
+            await cache_call(view.check_throttles, drf_request)
+            cache_key = None
+            if settings.RESPONSE_CACHE_ENABLED and isinstance(view, CachedResponseMixin):
+                cache_key, data = await cache_call(cache.lookup, request, view.get_cache_tags())
+                if data is not None:
+                    return self.render(data, 200, 'HIT')
+
+            if self.detail:
+                data = await self.retrieve(view)
+            else:
+                data = await self.list(view)
+        except (APIException, Http404) as exc:
+            response = exception_handler(exc, {'view': view, 'request': drf_request})
+            rendered = self.render(response.data, response.status_code)
+            for header, value in response.headers.items():
+                if header != 'Content-Type':
+                    rendered[header] = value
+            return rendered
+
+        if cache_key is not None:
+            await cache_call(cache.store, cache_key, data)
+            return self.render(data, 200, 'MISS')
+        return self.render(data, 200)
+
+    async def filter_queryset(self, view):
+        return await sync_to_async(view.filter_queryset)(view.get_queryset())
+
+    async def list(self, view):
+        queryset = await self.filter_queryset(view)
+        paginator = view.paginator
+        page_size = paginator.get_page_size(view.request) if paginator else None
+        if page_size is None:
+            objects = [obj async for obj in queryset.aiterator()]
+            return view.get_serializer(objects, many=True).data
+
+        # Same steps as PageNumberPagination.paginate_queryset, with the
+        # count and the page query awaited
+        django_paginator = paginator.django_paginator_class(queryset, page_size)
+        django_paginator.count = await queryset.acount()
+        page_number = paginator.get_page_number(view.request, django_paginator)
+        if page_number in paginator.last_page_strings:
+            page_number = django_paginator.num_pages
+        try:
+            page = django_paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        page.object_list = [obj async for obj in page.object_list.aiterator()]
+
+        paginator.page = page
+        paginator.request = view.request
+        data = view.get_serializer(page.object_list, many=True).data
+        return paginator.get_paginated_response(data).data
+
+    async def retrieve(self, view):
+        queryset = await self.filter_queryset(view)
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        try:
+            instance = await queryset.aget(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+        except ObjectDoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        except (ValidationError, ValueError, TypeError):
+            # Malformed id, as in rest_framework.generics.get_object_or_404
+            raise Http404
+        view.check_object_permissions(view.request, instance)
+        return view.get_serializer(instance).data
+
+    def render(self, data, status, cache_status=None):
+        response = HttpResponse(
+            TimedJSONRenderer().render(data),
+            status=status,
+            content_type='application/json',
+        )
+        response['Vary'] = 'Accept'
+        if cache_status:
+            response['X-Cache'] = cache_status
+        return response
+
+    post = put = patch = delete = options = passthrough
+
+
+class ListingReadView(AsyncReadView):
+    viewset = ListingViewSet
+
+
+class ReviewReadView(AsyncReadView):
+    viewset = ReviewViewSet
@@ -0,0 +1,320 @@
+"""
+Typeahead suggestions for the listing search box.
+
+Suggestions are listing locations ("Sydney, Australia") and title terms
+("beachfront"), weighted by the number of listings they describe. They
+are looked up in a snapshot file that every worker memory-maps, so the
+operating system keeps one copy in the page cache however many workers
+read it, and a lookup runs no SQL.
+
+Snapshot layout (little-endian), after a JSON header with the section
+offsets:
+- labels: the suggestion texts, ordered by weight, heaviest first, so a
+  lower label id always ranks higher; with their kind and weight
+- keys: normalized strings (accents removed, casefolded, punctuation as
+  spaces), sorted bytewise, each pointing to its label. A location has a
+  key for each word it contains from the start or later on ("york usa"
+  finds "New York, USA")
+- heads: for every prefix of up to HEAD_LENGTH characters, its top
+  HEAD_RESULTS label ids
+
+A prefix of up to HEAD_LENGTH characters is answered from heads; a longer
+one bisects the keys for the range sharing the prefix and keeps its
+lowest label ids. Building is pure Python as well, so web workers do not
+need NumPy to rebuild a missing snapshot.
+
+The snapshot is written by build_snapshot(), from `manage.py
+build_autocomplete` or the refresh_autocomplete Celery task. The task runs
+every AUTOCOMPLETE_REFRESH_SECONDS and rebuilds when the listings changed
+since the snapshot was written (count or latest updated_at). The file is
+replaced atomically and workers map the new one on their next lookup.
+"""
+
+import bisect
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Listing, SearchPosting
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'LACP'
+FORMAT_VERSION = 1
+HEAD_LENGTH = 3
+HEAD_RESULTS = 20
+KINDS = ('location', 'term')
+# Seconds between checks for a new snapshot file
+RELOAD_INTERVAL = 1.0
+
+
+def normalize(text):
+    """
+    Casefolded text without accents, with punctuation as single spaces.
+    """
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char if char.isalnum() else ' ' for char in text if not unicodedata.combining(char))
+    return ' '.join(text.casefold().split())
+
+
+def listing_suggestions():
+    """
+    (text, kind, weight) of every location and title term in the database.
+    Title terms come from the search index (listings.search).
+    """
+    for location, listings in Listing.objects.order_by().values('location').annotate(
+        listings=Count('pk'),
+    ).values_list('location', 'listings'):
+        yield location, 'location', listings
+    for term, listings in SearchPosting.objects.filter(title_tf__gt=0).order_by().values('term').annotate(
+        listings=Count('pk'),
+    ).values_list('term', 'listings'):
+        if not term.isdigit():
+            yield term, 'term', listings
+
+
+def source_version():
+    """
+    Identifies the listings a snapshot was built from.
+    """
+    stats = Listing.objects.aggregate(count=Count('pk'), updated=Max('updated_at'))
+    return f"{stats['count']}:{stats['updated'].isoformat() if stats['updated'] else ''}"
+
+
+def _pack_strings(strings):
+    offsets = [0]
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    return struct.pack(f'<{len(offsets)}I', *offsets), b''.join(strings)
+
+
+def encode_snapshot(suggestions, version=''):
+    """
+    Encode (text, kind, weight) suggestions into the snapshot format.
+    Suggestions with the same text and kind are merged, adding weights.
+    """
+    weights = Counter()
+    for text, kind, weight in suggestions:
+        if normalize(text):
+            weights[text, kind] += weight
+    labels = sorted(weights, key=lambda label: (-weights[label], label))
+
+    keys = []
+    for label_id, (text, kind) in enumerate(labels):
+        words = normalize(text).split()
+        starts = range(len(words)) if kind == 'location' else range(1)
+        keys.extend((' '.join(words[start:]).encode(), label_id) for start in starts)
+    keys = sorted(set(keys))
+
+    heads = defaultdict(list)
+    for key, label_id in keys:
+        text = key.decode()
+        for length in range(1, min(HEAD_LENGTH, len(text)) + 1):
+            heads[text[:length]].append(label_id)
+    head_keys = sorted(heads, key=str.encode)
+
+    sections = {
+        'label_offsets': None, 'label_blob': None,
+        'label_kinds': struct.pack(f'<{len(labels)}B', *(KINDS.index(kind) for _, kind in labels)),
+        'label_weights': struct.pack(f'<{len(labels)}I', *(weights[label] for label in labels)),
+        'key_offsets': None, 'key_blob': None,
+        'key_labels': struct.pack(f'<{len(keys)}I', *(label_id for _, label_id in keys)),
+        'head_offsets': None, 'head_blob': None,
+        'head_top': b''.join(
+            struct.pack(f'<{HEAD_RESULTS}i', *(top + [-1] * (HEAD_RESULTS - len(top))))
+            for top in (heapq.nsmallest(HEAD_RESULTS, set(heads[head])) for head in head_keys)
+        ),
+    }
+    sections['label_offsets'], sections['label_blob'] = _pack_strings([text.encode() for text, _ in labels])
+    sections['key_offsets'], sections['key_blob'] = _pack_strings([key for key, _ in keys])
+    sections['head_offsets'], sections['head_blob'] = _pack_strings([head.encode() for head in head_keys])
+
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        layout[name] = [offset, len(data)]
+        # 8-byte alignment, so every integer section can be cast in place
+        offset += len(data) + (-len(data) % 8)
+    header = json.dumps({
+        'format': FORMAT_VERSION,
+        'version': version,
+        'labels': len(labels),
+        'keys': len(keys),
+        'heads': len(head_keys),
+        'sections': layout,
+    }).encode()
+    header += b' ' * (-(len(header) + 8) % 8)
+    body = b''.join(data + b'\0' * (-len(data) % 8) for data in sections.values())
+    return MAGIC + struct.pack('<I', len(header)) + header + body
+
+
+def write_snapshot(data, path=None):
+    """
+    Replace the snapshot file atomically; mapped readers keep the old file.
+    """
+    path = path or settings.AUTOCOMPLETE_SNAPSHOT_PATH
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as snapshot_file:
+        snapshot_file.write(data)
+    os.replace(temporary, path)
+
+
+def build_snapshot(path=None):
+    """
+    Build the snapshot from the database and write it. Returns the index.
+    """
+    version = source_version()
+    data = encode_snapshot(listing_suggestions(), version)
+    write_snapshot(data, path)
+    return PrefixIndex(data)
+
+
+def refresh_snapshot(force=False, path=None):
+    """
+    Rebuild the snapshot if the listings changed since it was written.
+    Returns True when it was rebuilt.
+    """
+    path = path or settings.AUTOCOMPLETE_SNAPSHOT_PATH
+    if not force:
+        try:
+            current = PrefixIndex.open(path)
+        except (FileNotFoundError, ValueError):
+            pass
+        else:
+            if current.version == source_version():
+                return False
+    build_snapshot(path)
+    return True
+
+
+class PrefixIndex:
+    """
+    Read-only view of a snapshot, over bytes or a memory map.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        view = memoryview(buffer)
+        if bytes(view[:4]) != MAGIC:
+            raise ValueError('Not an autocomplete snapshot')
+        (header_length,) = struct.unpack_from('<I', view, 4)
+        header = json.loads(bytes(view[8:8 + header_length]))
+        if header['format'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {header['format']}")
+        self.version = header['version']
+        base = 8 + header_length
+        sections = {
+            name: view[base + offset:base + offset + length]
+            for name, (offset, length) in header['sections'].items()
+        }
+        self.label_offsets = sections['label_offsets'].cast('I')
+        self.label_blob = sections['label_blob']
+        self.label_kinds = sections['label_kinds']
+        self.label_weights = sections['label_weights'].cast('I')
+        self.key_offsets = sections['key_offsets'].cast('I')
+        self.key_blob = sections['key_blob']
+        self.key_labels = sections['key_labels'].cast('I')
+        self.head_offsets = sections['head_offsets'].cast('I')
+        self.head_blob = sections['head_blob']
+        self.head_top = sections['head_top'].cast('i')
+        self.key_count = header['keys']
+        self.head_count = header['heads']
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as snapshot_file:
+            return cls(mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return len(self.label_kinds)
+
+    def _key(self, index):
+        return bytes(self.key_blob[self.key_offsets[index]:self.key_offsets[index + 1]])
+
+    def _head(self, index):
+        return bytes(self.head_blob[self.head_offsets[index]:self.head_offsets[index + 1]])
+
+    def label(self, label_id):
+        return {
+            'text': bytes(self.label_blob[self.label_offsets[label_id]:self.label_offsets[label_id + 1]]).decode(),
+            'kind': KINDS[self.label_kinds[label_id]],
+            'weight': self.label_weights[label_id],
+        }
+
+    def lookup(self, prefix, limit=10):
+        """
+        Up to `limit` (at most HEAD_RESULTS) suggestions starting with
+        `prefix`, heaviest first.
+        """
+        prefix = normalize(prefix)
+        limit = min(limit, HEAD_RESULTS)
+        if not prefix or limit < 1:
+            return []
+        encoded = prefix.encode()
+        if len(prefix) <= HEAD_LENGTH:
+            index = bisect.bisect_left(range(self.head_count), encoded, key=self._head)
+            if index == self.head_count or self._head(index) != encoded:
+                return []
+            top = self.head_top[index * HEAD_RESULTS:index * HEAD_RESULTS + limit]
+            label_ids = [label_id for label_id in top if label_id >= 0]
+        else:
+            keys = range(self.key_count)
+            start = bisect.bisect_left(keys, encoded, key=self._key)
+            # 0xff never occurs in UTF-8, so this sorts after every extension
+            end = bisect.bisect_left(keys, encoded + b'\xff', lo=start, key=self._key)
+            label_ids = heapq.nsmallest(limit, set(self.key_labels[start:end]))
+        return [self.label(label_id) for label_id in label_ids]
+
+
+class SharedIndex:
+    """
+    The snapshot at AUTOCOMPLETE_SNAPSHOT_PATH, mapped once per process and
+    remapped when the file is replaced. Built in process, with a warning,
+    when no snapshot exists yet.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.path = None
+        self.identity = None
+        self.checked_at = 0.0
+
+    def get(self):
+        path = settings.AUTOCOMPLETE_SNAPSHOT_PATH
+        now = time.monotonic()
+        if self.index is not None and path == self.path and now - self.checked_at < RELOAD_INTERVAL:
+            return self.index
+        with self.lock:
+            self.checked_at = now
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                logger.warning('%s not found, building it; run manage.py build_autocomplete', path)
+                build_snapshot(path)
+                stat = os.stat(path)
+            identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if identity != self.identity or path != self.path:
+                self.index = PrefixIndex.open(path)
+                self.path = path
+                self.identity = identity
+            return self.index
+
+
+shared_index = SharedIndex()
+
+
+def suggest(prefix, limit=10):
+    return shared_index.get().lookup(prefix, limit)
@@ -0,0 +1,225 @@
+"""
+Shared helpers for the benchmark management commands.
+Provides latency summaries, a simple thread-based load driver, a local
+stand-in for the Chapa API and a synthetic listing corpus for search.
+"""
+
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .models import Listing
+from .search import tokenize
+
+
+def percentile(sorted_samples, pct):
+    """
+    Return the pct-th percentile of an already sorted list of samples.
+    """
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100.0 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(samples, elapsed=None):
+    """
+    Summarize latency samples (in seconds) as milliseconds.
+
+    Args:
+        samples (list): Per-operation durations in seconds
+        elapsed (float): Wall-clock duration of the whole run, used for throughput
+
+    Returns:
+        dict: count, throughput and latency percentiles
+    """
+    ordered = sorted(samples)
+    count = len(ordered)
+    summary = {
+        'count': count,
+        'mean_ms': round(sum(ordered) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if count else 0.0,
+    }
+    if elapsed:
+        summary['elapsed_s'] = round(elapsed, 3)
+        summary['throughput_rps'] = round(count / elapsed, 1)
+    return summary
+
+
+def run_concurrently(operation, total, concurrency, on_thread_exit=None):
+    """
+    Call operation() `total` times spread over `concurrency` threads.
+
+    Args:
+        operation (callable): Unit of work to time
+        total (int): Total number of calls
+        concurrency (int): Number of worker threads
+        on_thread_exit (callable): Optional cleanup run at the end of each thread
+            (e.g. closing its database connection)
+
+    Returns:
+        tuple: (list of per-call durations in seconds, wall-clock seconds, errors)
+    """
+    samples = []
+    errors = []
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker():
+        local_samples = []
+        try:
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+                start = time.perf_counter()
+                try:
+                    operation()
+                except Exception as e:
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                local_samples.append(time.perf_counter() - start)
+        finally:
+            with lock:
+                samples.extend(local_samples)
+            if on_thread_exit:
+                on_thread_exit()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started, errors
+
+
+SEARCH_FEATURES = [
+    'beach', 'beachfront', 'ocean', 'mountain', 'lake', 'garden', 'pool',
+    'rooftop', 'historic', 'modern', 'cozy', 'luxury', 'spacious', 'quiet',
+]
+SEARCH_PROPERTY_TYPES = [
+    'villa', 'cabin', 'loft', 'studio', 'cottage', 'condo', 'penthouse',
+    'apartment', 'bungalow', 'chalet',
+]
+SEARCH_CITIES = ['Sydney', 'Paris', 'Tokyo', 'London', 'Barcelona', 'Dubai', 'Amsterdam', 'New York']
+SEARCH_FILLER = [
+    'bright', 'kitchen', 'balcony', 'wifi', 'parking', 'family', 'walk',
+    'center', 'shops', 'restaurants', 'view', 'bedroom', 'bathroom', 'terrace',
+    'breakfast', 'station', 'quiet', 'street', 'friendly', 'host', 'clean',
+    'comfortable', 'washer', 'heating', 'workspace', 'sunny', 'park', 'museum',
+    'minutes', 'airport', 'great', 'stay', 'perfect', 'couples', 'groups',
+]
+SEARCH_QUERIES = ['beach villa', 'mountain cabin', 'luxury penthouse', 'garden cottage', 'rooftop loft']
+
+
+def synthetic_listings(count, host_id, seed=0):
+    """
+    Unsaved listings with generated titles ("<Feature> <Type> in <City>")
+    and 20-80 word descriptions for the search tests and benchmark. A
+    quarter of the descriptions mention other features and property types,
+    so description-only matches exist for every query.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    listings = []
+    for _ in range(count):
+        city = rng.choice(SEARCH_CITIES)
+        words = rng.choices(SEARCH_FILLER, k=rng.randint(20, 80))
+        if rng.random() < 0.25:
+            words[rng.randrange(len(words))] = rng.choice(SEARCH_FEATURES)
+            words[rng.randrange(len(words))] = rng.choice(SEARCH_PROPERTY_TYPES)
+        listings.append(Listing(
+            host_id=host_id,
+            title=f'{rng.choice(SEARCH_FEATURES).title()} {rng.choice(SEARCH_PROPERTY_TYPES).title()} in {city}',
+            description=' '.join(words).capitalize() + '.',
+            location=city,
+            price_per_night=Decimal(rng.randint(50, 500)),
+            max_guests=rng.randint(1, 8),
+            available_from=today,
+            available_to=today + timedelta(days=365),
+        ))
+    return listings
+
+
+def title_matches(listing, query):
+    """
+    Whether every query term starts a word of the listing's title
+    ("beach" matches "Beachfront"): the relevant results of a synthetic
+    corpus query.
+    """
+    words = tokenize(listing.title)
+    return all(any(word.startswith(term) for word in words) for term in tokenize(query))
+
+
+class _ChapaStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers the two Chapa endpoints the payment views call, always successfully.
+    """
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if self.path.endswith('/transaction/initialize'):
+            self.send_json({
+                'status': 'success',
+                'message': 'Hosted Link',
+                'data': {'checkout_url': f"https://checkout.chapa.co/checkout/payment/{payload.get('tx_ref')}"},
+            })
+        else:
+            self.send_json({'status': 'failed', 'message': 'Not found'}, status=404)
+
+    def do_GET(self):
+        if '/transaction/verify/' in self.path:
+            tx_ref = self.path.rsplit('/', 1)[-1]
+            self.send_json({
+                'status': 'success',
+                'message': 'Payment details',
+                'data': {'status': 'success', 'reference': f'chapa-{tx_ref}', 'payment_method': 'test'},
+            })
+        else:
+            self.send_json({'status': 'failed', 'message': 'Not found'}, status=404)
+
+    def send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ChapaStub:
+    """
+    Local HTTP server standing in for the Chapa API during benchmarks.
+
+    Usage:
+        with ChapaStub() as stub:
+            os.environ['CHAPA_BASE_URL'] = stub.base_url
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = ThreadingHTTPServer((host, port), _ChapaStubHandler)
+        self.server.daemon_threads = True
+        self.base_url = f'http://{host}:{self.server.server_port}/v1'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
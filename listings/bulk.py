@@ -0,0 +1,232 @@
+"""
+Set-based status changes for bookings and payments, used by the admin
+actions and by the bulk_status_change Celery task.
+
+Each operation takes a queryset, narrows it to the rows the state rules
+allow to change, locks them and changes them with a single UPDATE, then
+writes one admin LogEntry per changed row with a single bulk INSERT. It
+returns the number of changed rows per new status. No model save() runs, so save signals
+do not fire: the booking status changes invalidate the cached listing
+lists filtered by availability, and the status changes are published to
+the push streams (listings.push) here. The booking and payment API
+responses themselves are not cached.
+
+Large admin selections are split into chunks of BULK_ACTION_CHUNK_SIZE ids
+by the task, which records its progress with set_progress() in the
+BULK_PROGRESS_CACHE_ALIAS cache, where the admin reads it.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics, push
+from .cache import AVAILABILITY_TAG, invalidate_tags
+from .models import Booking, Payment
+
+
+logger = logging.getLogger(__name__)
+
+# Target status -> statuses a booking may move to it from
+BOOKING_TRANSITIONS = {
+    'confirmed': ('pending',),
+    'cancelled': ('pending', 'confirmed'),
+    'completed': ('confirmed',),
+}
+
+PROGRESS_PREFIX = 'bulk:progress:'
+PROGRESS_TIMEOUT = 24 * 60 * 60
+
+# Concurrent Chapa verification requests per chunk
+CHAPA_VERIFY_WORKERS = 8
+
+
+def eligible_bookings(queryset, status):
+    """
+    Narrow `queryset` to the bookings that may move to `status`.
+    Only stays that have ended can be completed.
+    """
+    queryset = queryset.filter(status__in=BOOKING_TRANSITIONS[status])
+    if status == 'completed':
+        queryset = queryset.filter(check_out_date__lte=timezone.localdate())
+    return queryset
+
+
+def _log_changes(model, pks, user_id, message):
+    if not pks:
+        return
+    # Payment and Booking __str__ read related objects
+    related = {Booking: ['user'], Payment: ['booking']}[model]
+    changed = model.objects.filter(pk__in=pks).select_related(*related)
+    LogEntry.objects.log_actions(user_id, changed, CHANGE, [{'changed': {'fields': message}}])
+
+
+def _lock(queryset):
+    return list(queryset.select_for_update().values_list('pk', flat=True))
+
+
+def transition_bookings(queryset, user_id, status):
+    """
+    Move every eligible booking in `queryset` to `status`.
+    """
+    with transaction.atomic():
+        pks = _lock(eligible_bookings(queryset, status))
+        if not pks:
+            return {}
+        now = timezone.now()
+        changed = Booking.objects.filter(pk__in=pks).update(status=status, updated_at=now)
+        _log_changes(Booking, pks, user_id, ['Status'])
+        push.publish_statuses('booking', [(pk, status, now) for pk in pks])
+    invalidate_tags(AVAILABILITY_TAG)
+    if status == 'confirmed':
+        metrics.bookings_confirmed.labels('admin').inc(changed)
+    return {status: changed}
+
+
+def expire_payments(queryset, user_id):
+    """
+    Cancel every pending payment in `queryset`; its checkout link is
+    abandoned and the guest has to initiate a new payment.
+    """
+    with transaction.atomic():
+        pks = _lock(queryset.filter(payment_status='pending'))
+        if not pks:
+            return {}
+        now = timezone.now()
+        changed = Payment.objects.filter(pk__in=pks).update(payment_status='cancelled', updated_at=now)
+        _log_changes(Payment, pks, user_id, ['Payment status'])
+        push.publish_statuses('payment', [(pk, 'cancelled', now) for pk in pks])
+    metrics.payments.labels('cancelled').inc(changed)
+    return {'cancelled': changed}
+
+
+def chapa_verify(tx_ref):
+    """
+    Return Chapa's verification payload for `tx_ref`, or None if Chapa
+    could not be asked or did not answer with a status.
+    """
+    url = f"{os.getenv('CHAPA_BASE_URL', 'https://api.chapa.co/v1')}/transaction/verify/{tx_ref}"
+    headers = {"Authorization": f"Bearer {os.getenv('CHAPA_SECRET_KEY')}"}
+    try:
+        response = metrics.observe_chapa('verify', requests.get, url, headers=headers, timeout=30)
+        data = response.json()
+    except (requests.RequestException, ValueError) as error:
+        logger.warning('Chapa verification of %s failed: %s', tx_ref, error)
+        return None
+    if response.status_code != 200 or data.get('status') != 'success':
+        return None
+    return data['data']
+
+
+def reverify_payments(queryset, user_id):
+    """
+    Ask Chapa again about every pending payment in `queryset` and apply the
+    answers: paid ones are completed and their pending bookings confirmed,
+    failed ones are marked failed, and ones Chapa could not report on are
+    left pending.
+
+    Returns the number of completed and failed payments.
+    """
+    pending = list(queryset.filter(payment_status='pending').only(
+        'pk', 'chapa_reference', 'booking_id', 'amount', 'currency',
+    ))
+    with ThreadPoolExecutor(max_workers=CHAPA_VERIFY_WORKERS) as executor:
+        answers = list(executor.map(chapa_verify, [payment.chapa_reference for payment in pending]))
+
+    paid, failed = [], []
+    now = timezone.now()
+    for payment, answer in zip(pending, answers):
+        if answer is None:
+            continue
+        if answer.get('status') == 'success':
+            payment.payment_status = 'completed'
+            payment.transaction_id = answer.get('reference')
+            payment.payment_method = answer.get('payment_method', 'Unknown')
+            payment.payment_date = now
+            payment.updated_at = now
+            paid.append(payment)
+        else:
+            failed.append(payment.pk)
+
+    with transaction.atomic():
+        # Another request may have settled some of them meanwhile
+        still_pending = set(_lock(Payment.objects.filter(
+            pk__in=[payment.pk for payment in paid] + failed, payment_status='pending',
+        )))
+        paid = [payment for payment in paid if payment.pk in still_pending]
+        failed = [pk for pk in failed if pk in still_pending]
+
+        Payment.objects.bulk_update(
+            paid, ['payment_status', 'transaction_id', 'payment_method', 'payment_date', 'updated_at'],
+        )
+        Payment.objects.filter(pk__in=failed).update(payment_status='failed', updated_at=now)
+        confirmed = _lock(Booking.objects.filter(
+            pk__in=[payment.booking_id for payment in paid], status='pending',
+        ))
+        Booking.objects.filter(pk__in=confirmed).update(status='confirmed', updated_at=now)
+        _log_changes(Payment, [payment.pk for payment in paid] + failed, user_id, ['Payment status'])
+        push.publish_statuses('payment', [
+            *((payment.pk, 'completed', now) for payment in paid),
+            *((pk, 'failed', now) for pk in failed),
+        ])
+        push.publish_statuses('booking', [(pk, 'confirmed', now) for pk in confirmed])
+
+        def send_emails():
+            from .tasks import send_payment_confirmation_email
+
+            for payment in paid:
+                send_payment_confirmation_email.delay(str(payment.pk), str(payment.booking_id))
+
+        transaction.on_commit(send_emails)
+
+    if confirmed:
+        invalidate_tags(AVAILABILITY_TAG)
+    metrics.payments.labels('completed').inc(len(paid))
+    for payment in paid:
+        metrics.payment_amount.labels(payment.currency).inc(float(payment.amount))
+    metrics.payments.labels('failed').inc(len(failed))
+    metrics.bookings_confirmed.labels('payment').inc(len(confirmed))
+    return {'completed': len(paid), 'failed': len(failed)}
+
+
+# Operation name (as passed to the bulk_status_change task) -> (model, function)
+OPERATIONS = {
+    'transition_bookings': (Booking, transition_bookings),
+    'expire_payments': (Payment, expire_payments),
+    'reverify_payments': (Payment, reverify_payments),
+}
+
+
+def progress_key(task_id):
+    return PROGRESS_PREFIX + task_id
+
+
+def progress_cache():
+    return caches[settings.BULK_PROGRESS_CACHE_ALIAS]
+
+
+def progress_is_shared():
+    """
+    Whether the web workers can read the progress the task records: not when
+    the task runs in a Celery worker and the cache is a per-process LocMem.
+    """
+    return settings.CELERY_TASK_ALWAYS_EAGER or not isinstance(progress_cache(), LocMemCache)
+
+
+def set_progress(task_id, **progress):
+    progress_cache().set(progress_key(task_id), progress, timeout=PROGRESS_TIMEOUT)
+
+
+def get_progress(task_id):
+    """
+    Return the progress recorded by a bulk_status_change task, or None.
+    """
+    return progress_cache().get(progress_key(task_id))
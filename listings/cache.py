@@ -0,0 +1,177 @@
+"""
+Response cache for read-only API actions with tag-based invalidation.
+
+Cached entries store the serialized response data of list/retrieve
+actions. Every entry depends on a set of tags (e.g. "listing:<id>",
+"listings:location:<location>"); each tag has a version number kept in
+the cache and the versions are part of the entry key. Invalidating a tag
+bumps its version, which makes every entry that depends on it
+unreachable. This works the same way on LocMem, file-based and Redis
+backends since it only needs get/set/add/incr.
+"""
+
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+
+TAG_PREFIX = 'respcache:tag:'
+ENTRY_PREFIX = 'respcache:entry:'
+STATS_PREFIX = 'respcache:stats:'
+
+# Every cached response embeds user data (host/reviewer)
+USERS_TAG = 'users'
+# Listing lists filtered on bookings (?check_in=/?check_out=) and on
+# reviews (?min_rating=) also depend on every booking or review write
+AVAILABILITY_TAG = 'listings:availability'
+RATINGS_TAG = 'listings:ratings'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _tag_key(tag):
+    # Tags may contain spaces (locations), which memcached-style key
+    # validation rejects, so they are hashed.
+    return TAG_PREFIX + hashlib.md5(tag.encode()).hexdigest()
+
+
+def tag_versions(tags):
+    """
+    Return the current version of each tag, creating missing ones.
+
+    New versions start from the current time so that a tag evicted from
+    the cache never comes back with a version an old entry was stored under.
+    """
+    cache = get_cache()
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    """
+    Invalidate every cached response that depends on any of the given tags.
+    """
+    cache = get_cache()
+    for tag in set(tags):
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            # Tag was never used (or was evicted): nothing cached under it
+            pass
+
+
+def _count(name):
+    cache = get_cache()
+    key = STATS_PREFIX + name
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def response_cache_stats():
+    """
+    Return shared hit/miss counters and the hit ratio.
+    """
+    counters = get_cache().get_many([STATS_PREFIX + 'hits', STATS_PREFIX + 'misses'])
+    hits = counters.get(STATS_PREFIX + 'hits', 0)
+    misses = counters.get(STATS_PREFIX + 'misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_response_cache_stats():
+    get_cache().delete_many([STATS_PREFIX + 'hits', STATS_PREFIX + 'misses'])
+
+
+def build_cache_key(request, tags):
+    """
+    Build the entry key from the host, path, normalized query params and tag versions.
+    """
+    params = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        for value in values
+        if value != '' and not (name == 'page' and value == '1')
+    )
+    raw = repr((
+        request.get_host(),
+        request.path,
+        params,
+        tag_versions(tags),
+    ))
+    return ENTRY_PREFIX + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def lookup(request, tags):
+    """
+    Return (entry key, cached response data or None) and count the hit or miss.
+    """
+    key = build_cache_key(request, [USERS_TAG, *tags])
+    data = get_cache().get(key)
+    _count('hits' if data is not None else 'misses')
+    return key, data
+
+
+def store(key, data):
+    get_cache().set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+
+
+class CachedResponseMixin:
+    """
+    ViewSet mixin that caches list and retrieve responses.
+
+    Subclasses define get_cache_tags() returning the tags the current
+    action depends on. Responses carry an X-Cache: HIT/MISS header.
+    """
+
+    def get_cache_tags(self):
+        raise NotImplementedError
+
+    def cache_tag_id(self, value):
+        """
+        Normalize a UUID from the URL or query string to the form used by
+        the invalidation signals.
+        """
+        try:
+            return str(uuid.UUID(value))
+        except ValueError:
+            return value
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, action, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return action(request, *args, **kwargs)
+
+        key, data = lookup(request, self.get_cache_tags())
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = action(request, *args, **kwargs)
+        if response.status_code == 200:
+            store(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,236 @@
+"""
+Geospatial filtering of listings: ?near=lat,lng&radius=km and ?bbox=.
+
+Listings with coordinates store their geohash at GEOHASH_PRECISION
+characters (cells of about 5 x 5 m). A geohash is a Z-order curve: the
+cells of a prefix are contiguous in the index, so an area is looked up
+as a few range scans. covering_ranges() picks the finest precision at
+which at most MAX_CELLS cells cover the area's bounding box, and merges
+neighbouring cells into ranges. The (geohash, latitude, longitude) index
+then answers the exact box test without reading the table, and a radius
+query finally checks the haversine distance of the remaining rows in SQL.
+
+With GEO_POSTGIS on a PostgreSQL database that has the postgis extension
+(migration 0009 creates a GiST index on the listing's geography point),
+radius queries use ST_DWithin instead.
+"""
+
+import math
+
+from django.conf import settings
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.fields import BooleanField
+from django.db.models.functions import Cos, Power, Radians, Sin
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 9
+MAX_CELLS = 32
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 500.0
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Sorts after every geohash character
+UPPER_BOUND = '{'
+
+# City centres for backfilling listings that only have a location string
+# ("Paris, France"); backfill_coordinates --gazetteer adds more
+KNOWN_CITIES = {
+    'amsterdam': (52.3676, 4.9041),
+    'barcelona': (41.3874, 2.1686),
+    'dubai': (25.2048, 55.2708),
+    'london': (51.5074, -0.1278),
+    'new york': (40.7128, -74.0060),
+    'paris': (48.8566, 2.3522),
+    'sydney': (-33.8688, 151.2093),
+    'tokyo': (35.6762, 139.6503),
+}
+
+# Must match the expression of the GiST index created by migration 0009
+POSTGIS_POINT = 'ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography'
+
+
+def _bits(precision):
+    """
+    (longitude bits, latitude bits) of a geohash of `precision` characters.
+    """
+    total = 5 * precision
+    return (total + 1) // 2, total // 2
+
+
+def _grid(lat, lng, precision):
+    """
+    Column and row of the cell containing a point.
+    """
+    lng_bits, lat_bits = _bits(precision)
+    column = min(int((lng + 180.0) / 360.0 * (1 << lng_bits)), (1 << lng_bits) - 1)
+    row = min(int((lat + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    return column, row
+
+
+def _interleave(column, row, precision):
+    """
+    The cell's position on the Z-order curve: longitude and latitude bits
+    alternate, longitude first.
+    """
+    lng_bits, lat_bits = _bits(precision)
+    value = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            lng_bits -= 1
+            value = (value << 1) | ((column >> lng_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((row >> lat_bits) & 1)
+    return value
+
+
+def _to_string(value, precision):
+    return ''.join(BASE32[(value >> (5 * (precision - 1 - index))) & 31] for index in range(precision))
+
+
+def encode(lat, lng, precision=GEOHASH_PRECISION):
+    """
+    Geohash of a point.
+    """
+    return _to_string(_interleave(*_grid(lat, lng, precision), precision), precision)
+
+
+def geocode(location, gazetteer=KNOWN_CITIES):
+    """
+    (latitude, longitude) of a location string, looked up in the gazetteer
+    as a whole ("paris, france") and then by its first part ("paris").
+    None when unknown.
+    """
+    location = ' '.join(location.casefold().split())
+    return gazetteer.get(location) or gazetteer.get(location.split(',')[0].strip())
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance between two points.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def radius_bbox(lat, lng, radius_km):
+    """
+    Boxes (min_lat, min_lng, max_lat, max_lng) around a circle: two when it
+    crosses the antimeridian, one spanning every longitude near a pole.
+    """
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return [(max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0)]
+    delta_lng = math.degrees(math.asin(min(math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)), 1.0)))
+    return split_bbox(min_lat, lng - delta_lng, max_lat, lng + delta_lng)
+
+
+def split_bbox(min_lat, min_lng, max_lat, max_lng):
+    """
+    Split a box whose longitudes run past -180 or 180 into boxes within
+    -180..180.
+    """
+    if max_lng - min_lng >= 360:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    if min_lng < -180:
+        return [(min_lat, min_lng + 360.0, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lng)]
+    if max_lng > 180:
+        return [(min_lat, min_lng, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lng - 360.0)]
+    return [(min_lat, min_lng, max_lat, max_lng)]
+
+
+def covering_ranges(boxes, max_cells=MAX_CELLS):
+    """
+    Geohash ranges [low, high) whose cells cover the boxes, at the finest
+    precision with at most `max_cells` cells.
+    """
+    cells = None
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        candidate = set()
+        for min_lat, min_lng, max_lat, max_lng in boxes:
+            min_column, min_row = _grid(min_lat, min_lng, precision)
+            max_column, max_row = _grid(max_lat, max_lng, precision)
+            if (max_column - min_column + 1) * (max_row - min_row + 1) > max_cells:
+                candidate = None
+                break
+            candidate.update(
+                _interleave(column, row, precision)
+                for column in range(min_column, max_column + 1)
+                for row in range(min_row, max_row + 1)
+            )
+        if candidate is None or len(candidate) > max_cells:
+            break
+        cells = (precision, sorted(candidate))
+    if cells is None:
+        # Wider than MAX_CELLS first-level cells: every geohash
+        return [(BASE32[0], UPPER_BOUND)]
+
+    precision, values = cells
+    ranges = []
+    for value in values:
+        if ranges and ranges[-1][1] == value:
+            ranges[-1][1] = value + 1
+        else:
+            ranges.append([value, value + 1])
+    return [
+        (_to_string(low, precision), _to_string(high, precision) if high < 32 ** precision else UPPER_BOUND)
+        for low, high in ranges
+    ]
+
+
+def _box_filter(boxes):
+    condition = Q()
+    for low, high in covering_ranges(boxes):
+        condition |= Q(geohash__gte=low, geohash__lt=high)
+    inside = Q()
+    for min_lat, min_lng, max_lat, max_lng in boxes:
+        inside |= Q(
+            latitude__gte=min_lat, latitude__lte=max_lat,
+            longitude__gte=min_lng, longitude__lte=max_lng,
+        )
+    return condition & inside
+
+
+def within_bbox(queryset, min_lat, min_lng, max_lat, max_lng):
+    """
+    Listings inside a box; min_lng > max_lng crosses the antimeridian.
+    """
+    if min_lng > max_lng:
+        max_lng += 360.0
+    return queryset.filter(_box_filter(split_bbox(min_lat, min_lng, max_lat, max_lng)))
+
+
+def haversine_filter(queryset, lat, lng, radius_km):
+    """
+    Listings within `radius_km` of a point by their haversine distance
+    alone, a full scan without the box test of within_radius().
+    """
+    # The haversine term, compared with its value at the radius to avoid
+    # ASIN and SQRT per row
+    half_chord = ExpressionWrapper(
+        Power(Sin(Radians(F('latitude') - Value(lat)) / 2), 2)
+        + Value(math.cos(math.radians(lat))) * Cos(Radians(F('latitude')))
+        * Power(Sin(Radians(F('longitude') - Value(lng)) / 2), 2),
+        output_field=FloatField(),
+    )
+    limit = math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2) ** 2
+    return queryset.alias(half_chord=half_chord).filter(half_chord__lte=limit)
+
+
+def within_radius(queryset, lat, lng, radius_km):
+    """
+    Listings within `radius_km` of a point.
+    """
+    if settings.GEO_POSTGIS:
+        return queryset.filter(RawSQL(
+            f'ST_DWithin({POSTGIS_POINT}, ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography, %s)',
+            (lng, lat, radius_km * 1000),
+            output_field=BooleanField(),
+        ))
+    return haversine_filter(queryset.filter(_box_filter(radius_bbox(lat, lng, radius_km))), lat, lng, radius_km)
@@ -0,0 +1,85 @@
+"""
+Management command to give existing listings coordinates for map search.
+Run with: python manage.py backfill_coordinates [--gazetteer cities.csv] [--overwrite]
+
+Listings created before migration 0009 only have a free-text location.
+Each distinct location is geocoded to its city centre with
+listings.geo.KNOWN_CITIES, extended by --gazetteer, a CSV file with
+location, latitude and longitude columns ("Lisbon, Portugal" or "lisbon").
+All listings of a location are updated with one statement. Hosts can set
+the exact coordinates through the API afterwards.
+
+Listings that have coordinates but no geohash (bulk_create and raw SQL
+skip the signal that computes it) get their geohash as well.
+"""
+
+import csv
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from listings import geo
+from listings.cache import USERS_TAG, invalidate_tags
+from listings.models import Listing
+
+
+class Command(BaseCommand):
+    help = 'Geocodes listing locations and fills in missing geohashes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gazetteer', help='CSV file with location,latitude,longitude columns')
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Also replace coordinates listings already have')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Geohashes written per statement')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        gazetteer = dict(geo.KNOWN_CITIES)
+        if options['gazetteer']:
+            with open(options['gazetteer'], newline='') as gazetteer_file:
+                for row in csv.DictReader(gazetteer_file):
+                    location = ' '.join(row['location'].casefold().split())
+                    gazetteer[location] = (float(row['latitude']), float(row['longitude']))
+
+        geocoded = self.geocode(gazetteer, options['overwrite'])
+        hashed = self.fill_geohashes(options['chunk_size'])
+        if geocoded or hashed:
+            # update() sends no signals; listing data is in most cached responses
+            invalidate_tags(USERS_TAG)
+        self.stdout.write(self.style.SUCCESS(
+            f'Geocoded {geocoded} listings and hashed {hashed} in {time.perf_counter() - start:.1f}s'
+        ))
+
+    def geocode(self, gazetteer, overwrite):
+        listings = Listing.objects.order_by()
+        if not overwrite:
+            listings = listings.filter(latitude__isnull=True)
+        now = timezone.now()
+        geocoded = 0
+        unknown = []
+        for location, count in listings.values('location').annotate(count=Count('pk')).values_list('location', 'count'):
+            coordinates = geo.geocode(location, gazetteer)
+            if coordinates is None:
+                unknown.append((count, location))
+                continue
+            lat, lng = coordinates
+            geocoded += listings.filter(location=location).update(
+                latitude=lat, longitude=lng, geohash=geo.encode(lat, lng), updated_at=now,
+            )
+        for count, location in sorted(unknown, reverse=True):
+            self.stdout.write(self.style.WARNING(f'Unknown location: {location} ({count} listings)'))
+        return geocoded
+
+    def fill_geohashes(self, chunk_size):
+        listings = Listing.objects.filter(latitude__isnull=False, longitude__isnull=False, geohash='')
+        hashed = 0
+        while True:
+            # Updated rows leave the filter, so every page starts over
+            chunk = list(listings.order_by('pk').only('pk', 'latitude', 'longitude')[:chunk_size])
+            if not chunk:
+                return hashed
+            for listing in chunk:
+                listing.geohash = geo.encode(listing.latitude, listing.longitude)
+            hashed += Listing.objects.bulk_update(chunk, ['geohash'])
@@ -0,0 +1,358 @@
+"""
+Management command running the API benchmark suite.
+Run with: python manage.py bench_api [--save] [--threshold 0.2]
+
+The suite:
+- creates a throwaway test database and seeds a fixed-size dataset
+- starts a local stand-in for the Chapa API
+- exercises every viewset action and both payment endpoints through the
+  Django test client and through a real threaded WSGI server
+- records latency percentiles, SQL queries per request and allocated memory
+
+Results are compared with the JSON baseline (benchmarks/api_baseline.json
+by default) and the command fails if a metric regresses by more than the
+threshold. Record a new baseline with --save.
+"""
+
+import json
+import logging
+import os
+import platform
+import socket
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from listings.benchmarking import ChapaStub, summarize
+from listings.models import Listing, Booking, Review, Payment
+
+
+# Metrics compared against the baseline, with the absolute difference
+# below which a change is treated as noise
+COMPARED_METRICS = {
+    'p50_ms': 0.5,
+    'p95_ms': 1.0,
+    'queries': 0,
+    'alloc_kb': 16,
+}
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; without TCP_NODELAY every
+        # keep-alive response waits for the client's delayed ACK (~40 ms)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Scenario:
+    """
+    One API call. prepare() creates whatever the call consumes (untimed)
+    and returns (path, json body or None).
+    """
+
+    def __init__(self, name, method, prepare, cached=False):
+        self.name = name
+        self.method = method
+        self.prepare = prepare
+        self.cached = cached
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks every API endpoint and compares the results with a JSON baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'api_baseline.json'),
+                            help='Baseline JSON file')
+        parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative regression before failing (0.2 = 20%%)')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per scenario and mode')
+        parser.add_argument('--memory-iterations', type=int, default=5,
+                            help='Requests per scenario measured under tracemalloc')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--listings', type=int, default=2000)
+        parser.add_argument('--bookings', type=int, default=10000)
+        parser.add_argument('--only', help='Comma-separated scenario names to run')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with ChapaStub() as stub, override_settings(RESPONSE_CACHE_ENABLED=False, THROTTLE_ENABLED=False):
+                os.environ['CHAPA_BASE_URL'] = stub.base_url
+                results = self.run_suite(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'vendor': connection.vendor,
+                'dataset': {name: options[name] for name in ('users', 'listings', 'bookings')},
+                'iterations': options['iterations'],
+            },
+            'results': results,
+        }
+
+        if options['save']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump(report, baseline_file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING('No baseline found; run with --save to record one'))
+            return
+
+        with open(options['baseline']) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = self.compare(baseline['results'], results, options['threshold'])
+        if regressions:
+            raise CommandError(
+                f'{len(regressions)} regression(s) beyond {options["threshold"]:.0%}:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def run_suite(self, options):
+        call_command(
+            'seed',
+            users=options['users'],
+            listings=options['listings'],
+            bookings=options['bookings'],
+            seed=1,
+            stdout=open(os.devnull, 'w'),
+        )
+        scenarios = self.build_scenarios()
+        if options['only']:
+            wanted = set(options['only'].split(','))
+            scenarios = [scenario for scenario in scenarios if scenario.name in wanted]
+
+        server, base_url = self.start_server()
+        # One JSON line per request would drown the report (set after the
+        # WSGI app is loaded, since django.setup() reconfigures logging)
+        logging.getLogger('listings.requests').setLevel(logging.WARNING)
+        session = requests.Session()
+        client = Client()
+        results = {}
+        try:
+            for scenario in scenarios:
+                with override_settings(RESPONSE_CACHE_ENABLED=scenario.cached):
+                    cache.clear()
+                    client_result = self.run_client(client, scenario, options)
+                    wsgi_result = self.run_wsgi(session, base_url, scenario, options)
+                results[scenario.name] = {'client': client_result, 'wsgi': wsgi_result}
+                self.stdout.write(
+                    f"{scenario.name:<28} client p50 {client_result['p50_ms']:>8} ms  "
+                    f"p95 {client_result['p95_ms']:>8} ms  queries {client_result['queries']:>3}  "
+                    f"alloc {client_result['alloc_kb']:>8} KiB  |  "
+                    f"wsgi p50 {wsgi_result['p50_ms']:>8} ms  p95 {wsgi_result['p95_ms']:>8} ms"
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+        return results
+
+    def start_server(self):
+        connections_override = None
+        default = connections['default']
+        if default.vendor == 'sqlite' and default.is_in_memory_db():
+            # Share the in-memory test database with the server threads
+            default.inc_thread_sharing()
+            connections_override = {'default': default}
+        server = ThreadedWSGIServer(
+            ('127.0.0.1', 0),
+            QuietWSGIRequestHandler,
+            connections_override=connections_override,
+        )
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f'http://127.0.0.1:{server.server_port}'
+
+    def run_client(self, client, scenario, options):
+        def call():
+            path, body = scenario.prepare()
+            kwargs = {'data': json.dumps(body), 'content_type': 'application/json'} if body is not None else {}
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, scenario.method)(path, **kwargs)
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise CommandError(f'{scenario.name}: HTTP {response.status_code} {response.content[:200]}')
+            return elapsed, len(queries)
+
+        for _ in range(3):
+            call()
+        samples = []
+        query_counts = []
+        for _ in range(options['iterations']):
+            elapsed, queries = call()
+            samples.append(elapsed)
+            query_counts.append(queries)
+
+        allocations = []
+        tracemalloc.start()
+        try:
+            for _ in range(options['memory_iterations']):
+                path, body = scenario.prepare()
+                kwargs = {'data': json.dumps(body), 'content_type': 'application/json'} if body is not None else {}
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                getattr(client, scenario.method)(path, **kwargs)
+                allocations.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+
+        result = summarize(samples)
+        result['queries'] = max(query_counts)
+        result['alloc_kb'] = round(max(allocations) / 1024, 1) if allocations else 0.0
+        return result
+
+    def run_wsgi(self, session, base_url, scenario, options):
+        def call():
+            path, body = scenario.prepare()
+            start = time.perf_counter()
+            response = session.request(scenario.method.upper(), base_url + path, json=body)
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise CommandError(f'{scenario.name} (wsgi): HTTP {response.status_code} {response.text[:200]}')
+            return elapsed
+
+        for _ in range(3):
+            call()
+        return summarize([call() for _ in range(options['iterations'])])
+
+    def build_scenarios(self):
+        host = User.objects.filter(listings__isnull=False).first()
+        guest = User.objects.exclude(pk=host.pk).first()
+        listing = Listing.objects.filter(host=host).first()
+        booking = Booking.objects.first()
+        review = Review.objects.first()
+        today = date.today()
+
+        def listing_body():
+            return {
+                'host_id': host.pk,
+                'title': 'Benchmark Loft',
+                'description': 'Created by the benchmark suite.',
+                'location': 'Paris, France',
+                'price_per_night': '120.00',
+                'max_guests': 4,
+                'available_from': str(today),
+                'available_to': str(today + timedelta(days=365)),
+            }
+
+        def booking_body():
+            return {
+                'listing_id': str(listing.pk),
+                'user_id': guest.pk,
+                'check_in_date': str(today + timedelta(days=400)),
+                'check_out_date': str(today + timedelta(days=403)),
+                'number_of_guests': 1,
+                'total_price': '360.00',
+                'status': 'pending',
+            }
+
+        def new_listing():
+            return Listing.objects.create(
+                host=host, title='Disposable', description='Disposable', location='Paris, France',
+                price_per_night=Decimal('100.00'), max_guests=2,
+                available_from=today, available_to=today + timedelta(days=30)
+            )
+
+        def new_booking():
+            return Booking.objects.create(
+                listing=listing, user=guest, check_in_date=today + timedelta(days=500),
+                check_out_date=today + timedelta(days=502), number_of_guests=1,
+                total_price=Decimal('200.00')
+            )
+
+        def new_reviewer():
+            return User.objects.create(username=f'bench-{uuid.uuid4().hex[:12]}')
+
+        def new_review():
+            return Review.objects.create(listing=listing, user=new_reviewer(), rating=4, comment='Disposable')
+
+        def pending_payment():
+            payment = Payment.objects.create(
+                booking=new_booking(), amount=Decimal('200.00'),
+                chapa_reference=f'tx-{uuid.uuid4().hex[:12]}', payment_status='pending'
+            )
+            return f'/api/payments/verify/?tx_ref={payment.chapa_reference}', None
+
+        return [
+            Scenario('listings-list', 'get', lambda: ('/api/listings/', None)),
+            Scenario('listings-list-cached', 'get', lambda: ('/api/listings/', None), cached=True),
+            Scenario('listings-search', 'get', lambda: ('/api/listings/?search=Villa&ordering=price_per_night', None)),
+            Scenario('listings-retrieve', 'get', lambda: (f'/api/listings/{listing.pk}/', None)),
+            Scenario('listings-create', 'post', lambda: ('/api/listings/', listing_body())),
+            Scenario('listings-update', 'put', lambda: (f'/api/listings/{listing.pk}/', listing_body())),
+            Scenario('listings-partial-update', 'patch',
+                     lambda: (f'/api/listings/{listing.pk}/', {'max_guests': 5})),
+            Scenario('listings-destroy', 'delete', lambda: (f'/api/listings/{new_listing().pk}/', None)),
+            Scenario('bookings-list', 'get', lambda: ('/api/bookings/', None)),
+            Scenario('bookings-retrieve', 'get', lambda: (f'/api/bookings/{booking.pk}/', None)),
+            Scenario('bookings-create', 'post', lambda: ('/api/bookings/', booking_body())),
+            Scenario('bookings-update', 'put', lambda: (f'/api/bookings/{booking.pk}/', {
+                **booking_body(), 'listing_id': str(booking.listing_id), 'user_id': booking.user_id,
+            })),
+            Scenario('bookings-partial-update', 'patch',
+                     lambda: (f'/api/bookings/{booking.pk}/', {'status': 'confirmed'})),
+            Scenario('bookings-destroy', 'delete', lambda: (f'/api/bookings/{new_booking().pk}/', None)),
+            Scenario('reviews-list', 'get', lambda: ('/api/reviews/', None)),
+            Scenario('reviews-retrieve', 'get', lambda: (f'/api/reviews/{review.pk}/', None)),
+            Scenario('reviews-create', 'post', lambda: ('/api/reviews/', {
+                'listing_id': str(listing.pk), 'user_id': new_reviewer().pk, 'rating': 5, 'comment': 'Lovely',
+            })),
+            Scenario('reviews-update', 'put', lambda: (f'/api/reviews/{review.pk}/', {
+                'listing_id': str(review.listing_id), 'user_id': review.user_id, 'rating': 4, 'comment': 'Updated',
+            })),
+            Scenario('reviews-partial-update', 'patch', lambda: (f'/api/reviews/{review.pk}/', {'rating': 3})),
+            Scenario('reviews-destroy', 'delete', lambda: (f'/api/reviews/{new_review().pk}/', None)),
+            Scenario('payments-initiate', 'post',
+                     lambda: ('/api/payments/initiate/', {'booking_id': str(new_booking().pk)})),
+            Scenario('payments-verify', 'get', pending_payment),
+        ]
+
+    def compare(self, baseline, results, threshold):
+        regressions = []
+        for name, modes in results.items():
+            for mode, metrics in modes.items():
+                previous = baseline.get(name, {}).get(mode)
+                if not previous:
+                    continue
+                for metric, noise in COMPARED_METRICS.items():
+                    if metric not in metrics or metric not in previous:
+                        continue
+                    old, new = previous[metric], metrics[metric]
+                    if new > old * (1 + threshold) and new - old > noise:
+                        regressions.append(f'  {name} [{mode}] {metric}: {old} -> {new}')
+        return regressions
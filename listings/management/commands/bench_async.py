@@ -0,0 +1,231 @@
+"""
+Management command comparing the listing/review read endpoints under
+WSGI, ASGI with the sync viewsets and ASGI with the async views.
+Run with: python manage.py bench_async [--requests 2000] [--concurrency 64]
+
+Each mode runs in its own process, since ASYNC_API_VIEWS decides the URL
+routes at import time. The process creates a throwaway test database,
+seeds it, and sends --requests requests per scenario with --concurrency
+in flight, directly to the application object:
+- wsgi: get_wsgi_application() called from --concurrency threads, like
+  gunicorn's gthread worker
+- asgi-sync / asgi-async: get_asgi_application() called from concurrent
+  asyncio tasks, like a uvicorn worker
+
+No HTTP server is involved, so the numbers show the cost of the Django
+stack only. --db-latency-ms adds a sleep to every SQL query to stand in
+for a database across the network.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from listings.benchmarking import run_concurrently, summarize
+
+
+MODES = {
+    'wsgi': 'False',
+    'asgi-sync': 'False',
+    'asgi-async': 'True',
+}
+
+HEADERS = {'Host': 'testserver', 'Accept': 'application/json'}
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the read endpoints under WSGI and ASGI, with sync and async views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario and mode')
+        parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0, help='Sleep added to every SQL query')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--listings', type=int, default=1000)
+        parser.add_argument('--bookings', type=int, default=2000)
+        parser.add_argument('--mode', choices=MODES, help='Run a single mode in this process')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run_mode(options)))
+            return
+
+        for mode, async_views in MODES.items():
+            command = [sys.executable, sys.argv[0], 'bench_async', '--mode', mode]
+            for name in ('requests', 'concurrency', 'db_latency_ms', 'users', 'listings', 'bookings'):
+                command += [f'--{name.replace("_", "-")}', str(options[name])]
+            process = subprocess.run(
+                command,
+                env={**os.environ, 'ASYNC_API_VIEWS': async_views},
+                capture_output=True,
+                text=True,
+            )
+            if process.returncode:
+                raise CommandError(f'{mode} failed:\n{process.stderr}')
+            results = json.loads(process.stdout.strip().splitlines()[-1])
+            for scenario, result in results.items():
+                self.stdout.write(
+                    f"{mode:<10} {scenario:<16} {result['throughput_rps']:>8} req/s  "
+                    f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  "
+                    f"p99 {result['p99_ms']:>8} ms  errors {result['errors']}"
+                )
+
+    def run_mode(self, options):
+        if (options['mode'] == 'asgi-async') != settings.ASYNC_API_VIEWS:
+            raise CommandError('Run without --mode, or set ASYNC_API_VIEWS to match it')
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with override_settings(RESPONSE_CACHE_ENABLED=False, THROTTLE_ENABLED=False):
+                call_command(
+                    'seed', users=options['users'], listings=options['listings'],
+                    bookings=options['bookings'], seed=1, stdout=io.StringIO(),
+                )
+                if options['db_latency_ms']:
+                    self.add_db_latency(options['db_latency_ms'] / 1000)
+                return self.run_scenarios(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def add_db_latency(self, seconds):
+        def sleep(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(connection, **kwargs):
+            connection.execute_wrappers.append(sleep)
+
+        connection_created.connect(install, weak=False)
+        for conn in connections.all(initialized_only=True):
+            install(conn)
+
+    def run_scenarios(self, options):
+        from listings.models import Listing
+
+        listing = Listing.objects.order_by('pk').first()
+        scenarios = {
+            'listing-list': ('/api/listings/', ''),
+            'listing-search': ('/api/listings/', f'location={listing.location}&ordering=price_per_night'),
+            'listing-detail': (f'/api/listings/{listing.pk}/', ''),
+            'review-list': ('/api/reviews/', f'listing={listing.pk}'),
+        }
+        if options['mode'] == 'wsgi':
+            from django.core.wsgi import get_wsgi_application
+            run = self.run_wsgi
+            application = get_wsgi_application()
+        else:
+            from django.core.asgi import get_asgi_application
+            run = self.run_asgi
+            application = get_asgi_application()
+        # One JSON line per request would dominate the timings
+        logging.getLogger('listings.requests').setLevel(logging.WARNING)
+
+        results = {}
+        for name, (path, query) in scenarios.items():
+            samples, elapsed, errors = run(application, path, query, options)
+            results[name] = {**summarize(samples, elapsed), 'errors': len(errors)}
+        return results
+
+    def run_wsgi(self, application, path, query, options):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.url_scheme': 'http',
+            **{f'HTTP_{name.upper()}': value for name, value in HEADERS.items()},
+        }
+
+        def request():
+            status = []
+            body = application(
+                {**environ, 'wsgi.input': io.BytesIO()},
+                lambda response_status, headers, exc_info=None: status.append(response_status),
+            )
+            try:
+                b''.join(body)
+            finally:
+                body.close()
+            if not status[0].startswith('200'):
+                raise AssertionError(status[0])
+
+        return run_concurrently(request, options['requests'], options['concurrency'],
+                                on_thread_exit=connection.close)
+
+    def run_asgi(self, application, path, query, options):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(name.lower().encode(), value.encode()) for name, value in HEADERS.items()],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+
+        async def request():
+            body_sent = asyncio.Event()
+            status = []
+
+            async def receive():
+                if not body_sent.is_set():
+                    body_sent.set()
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client never disconnects
+                await asyncio.Future()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            await application(dict(scope), receive, send)
+            if status[0] != 200:
+                raise AssertionError(status[0])
+
+        async def run():
+            samples, errors = [], []
+            slots = asyncio.Semaphore(options['concurrency'])
+
+            async def timed():
+                async with slots:
+                    start = time.perf_counter()
+                    try:
+                        await request()
+                    except Exception as e:
+                        errors.append(repr(e))
+                        return
+                    samples.append(time.perf_counter() - start)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(timed() for _ in range(options['requests'])))
+            return samples, time.perf_counter() - started, errors
+
+        return asyncio.run(run())
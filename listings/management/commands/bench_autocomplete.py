@@ -0,0 +1,83 @@
+"""
+Management command measuring autocomplete lookups on a large vocabulary.
+Run with: python manage.py bench_autocomplete [--locations 20000] [--terms 300000]
+
+Generates random location names and title terms, with Zipf-distributed
+weights for the terms, about the vocabulary of a million listings, and
+encodes them into a snapshot in a temporary directory without touching
+the database. It then times lookups of random 1-8 character prefixes on
+the memory-mapped index, and the same prefixes through
+/api/listings/autocomplete/ to show the Django and DRF overhead on top.
+"""
+
+import logging
+import os
+import random
+import string
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from listings.autocomplete import PrefixIndex, encode_snapshot, write_snapshot
+from listings.benchmarking import summarize
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks autocomplete lookups on a synthetic vocabulary'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=20_000)
+        parser.add_argument('--terms', type=int, default=300_000)
+        parser.add_argument('--lookups', type=int, default=20_000)
+        parser.add_argument('--requests', type=int, default=2_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        def word():
+            return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+
+        suggestions = [
+            (f'{word().title()}, {word().title()}', 'location', rng.randint(1, 500))
+            for _ in range(options['locations'])
+        ]
+        suggestions += [(word(), 'term', 1_000_000 // (rank + 1) + 1) for rank in range(options['terms'])]
+        prefixes = [word()[:rng.randint(1, 8)] for _ in range(options['lookups'])]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'snapshot.idx')
+            start = time.perf_counter()
+            write_snapshot(encode_snapshot(suggestions), path)
+            self.stdout.write(
+                f'{len(suggestions)} suggestions: built in {time.perf_counter() - start:.1f}s, '
+                f'{os.path.getsize(path) / 1e6:.1f} MB'
+            )
+
+            index = PrefixIndex.open(path)
+            samples = []
+            for prefix in prefixes:
+                started = time.perf_counter()
+                index.lookup(prefix)
+                samples.append(time.perf_counter() - started)
+            self.report('lookup', summarize(samples))
+
+            # One JSON line per request would dominate the timings
+            logging.getLogger('listings.requests').setLevel(logging.WARNING)
+            with override_settings(AUTOCOMPLETE_SNAPSHOT_PATH=path, ALLOWED_HOSTS=['*']):
+                client = Client()
+                samples = []
+                for prefix in prefixes[:options['requests']]:
+                    started = time.perf_counter()
+                    response = client.get('/api/listings/autocomplete/', {'prefix': prefix})
+                    samples.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.content
+                self.report('endpoint', summarize(samples))
+
+    def report(self, name, summary):
+        self.stdout.write(
+            f"{name:<9} p50 {summary['p50_ms']:>7} ms  p95 {summary['p95_ms']:>7} ms  "
+            f"p99 {summary['p99_ms']:>7} ms  max {summary['max_ms']:>7} ms"
+        )
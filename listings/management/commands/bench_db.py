@@ -0,0 +1,104 @@
+"""
+Management command to benchmark request throughput against the configured database.
+Run with: python manage.py bench_db [--compare]
+
+With --compare the command re-runs itself in three subprocesses against a
+local PostgreSQL (DB_ENGINE=postgresql) to compare connection handling:
+- no-persistence: CONN_MAX_AGE=0, a new connection per request
+- persistent: CONN_MAX_AGE=60 with health checks
+- pool: psycopg 3 connection pool
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+
+from listings.benchmarking import run_concurrently, summarize
+
+
+MODES = {
+    'no-persistence': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'persistent': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '60'},
+    'pool': {'DB_POOL': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks API request throughput with and without database connection pooling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/listings/', help='API path to request')
+        parser.add_argument('--requests', type=int, default=2000, help='Total number of requests')
+        parser.add_argument('--concurrency', type=int, default=8, help='Number of client threads')
+        parser.add_argument('--compare', action='store_true',
+                            help='Run every connection mode against PostgreSQL and compare')
+        parser.add_argument('--json', action='store_true', help='Print the result as JSON only')
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self.compare(options)
+
+        db = settings.DATABASES['default']
+        client_kwargs = {'HTTP_HOST': (settings.ALLOWED_HOSTS or ['localhost'])[0]}
+
+        def request():
+            response = Client(**client_kwargs).get(options['path'])
+            if response.status_code != 200:
+                raise RuntimeError(f'HTTP {response.status_code}')
+
+        # Warm up URL resolvers, serializers and the first connection
+        request()
+
+        samples, elapsed, errors = run_concurrently(
+            request,
+            options['requests'],
+            options['concurrency'],
+            on_thread_exit=connections.close_all,
+        )
+        result = {
+            'vendor': connection.vendor,
+            'conn_max_age': db.get('CONN_MAX_AGE', 0),
+            'pool': bool(db.get('OPTIONS', {}).get('pool')),
+            'errors': len(errors),
+            **summarize(samples, elapsed),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(result))
+        else:
+            self.print_result('current', result)
+
+    def compare(self, options):
+        if settings.DB_ENGINE != 'postgresql':
+            raise CommandError('--compare requires DB_ENGINE=postgresql')
+
+        manage_py = os.path.join(settings.BASE_DIR, 'manage.py')
+        for mode, overrides in MODES.items():
+            env = {**os.environ, 'DB_ENGINE': 'postgresql', **overrides}
+            completed = subprocess.run(
+                [
+                    sys.executable, manage_py, 'bench_db', '--json',
+                    '--path', options['path'],
+                    '--requests', str(options['requests']),
+                    '--concurrency', str(options['concurrency']),
+                ],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if completed.returncode != 0:
+                raise CommandError(f'{mode} run failed:\n{completed.stderr}')
+            self.print_result(mode, json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    def print_result(self, mode, result):
+        self.stdout.write(
+            f"{mode:<15} {result['throughput_rps']:>8} req/s  "
+            f"p50 {result['p50_ms']:>7} ms  p95 {result['p95_ms']:>7} ms  "
+            f"p99 {result['p99_ms']:>7} ms  errors {result['errors']}"
+        )
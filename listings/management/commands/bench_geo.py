@@ -0,0 +1,130 @@
+"""
+Management command measuring radius and bounding-box queries.
+Run with: python manage.py bench_geo [--listings 1000000] [--queries 20]
+
+Creates a throwaway test database with listings scattered around the
+cities of listings.geo.KNOWN_CITIES (normally distributed, about 20 km
+across) and a tenth anywhere on land or sea. For each radius it counts
+the listings around random points, near a city or anywhere, with the
+geohash index (geo.within_radius) and with a haversine full scan as a
+baseline, checks that both agree, and times the first page of
+/api/listings/?near=&radius= with its count. ?bbox= is timed the same
+way with boxes of the radius' size.
+"""
+
+import logging
+import math
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from listings import geo
+from listings.benchmarking import summarize
+from listings.models import Listing
+
+
+BATCH_SIZE = 5000
+RADII_KM = (1, 5, 25, 100)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the geohash-indexed radius and bounding-box listing filters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=20, help='Points per radius')
+        parser.add_argument('--baseline', type=int, default=3, help='Full-scan queries per radius')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with override_settings(RESPONSE_CACHE_ENABLED=False, THROTTLE_ENABLED=False, ALLOWED_HOSTS=['*']):
+                rng = random.Random(options['seed'])
+                self.load_listings(rng, options['listings'])
+                self.run_queries(rng, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def random_point(self, rng):
+        if rng.random() < 0.1:
+            return math.degrees(math.asin(rng.uniform(-1, 1))), rng.uniform(-180, 180)
+        lat, lng = rng.choice(list(geo.KNOWN_CITIES.values()))
+        return lat + rng.gauss(0, 0.1), lng + rng.gauss(0, 0.1) / math.cos(math.radians(lat))
+
+    def load_listings(self, rng, count):
+        host = User.objects.create_user('bench-host')
+        today = date.today()
+        started = time.perf_counter()
+        for start in range(0, count, BATCH_SIZE):
+            batch = []
+            for _ in range(min(BATCH_SIZE, count - start)):
+                lat, lng = self.random_point(rng)
+                lng = (lng + 180) % 360 - 180
+                batch.append(Listing(
+                    host_id=host.pk, title='Listing', description='Listing', location='Somewhere',
+                    price_per_night=Decimal(rng.randint(50, 500)), max_guests=4,
+                    latitude=lat, longitude=lng, geohash=geo.encode(lat, lng),
+                    available_from=today, available_to=today + timedelta(days=365),
+                ))
+            # Geo queries never touch the search index
+            Listing.objects.bulk_create(batch, index=False)
+        self.stdout.write(f'{count} listings inserted in {time.perf_counter() - started:.1f}s')
+
+    def run_queries(self, rng, options):
+        # One JSON line per request would dominate the timings
+        logging.getLogger('listings.requests').setLevel(logging.WARNING)
+        client = Client()
+        self.stdout.write(
+            f"{'radius km':>9} {'matches':>8} {'index p50':>10} {'index p95':>10} {'scan p50':>9} "
+            f"{'near p50':>9} {'near p95':>9} {'bbox p50':>9} {'bbox p95':>9}"
+        )
+        for radius in RADII_KM:
+            matches = []
+            index, scan, near, bbox = [], [], [], []
+            for query in range(options['queries']):
+                lat, lng = self.random_point(rng)
+                started = time.perf_counter()
+                count = geo.within_radius(Listing.objects.all(), lat, lng, radius).count()
+                index.append(time.perf_counter() - started)
+                matches.append(count)
+                if query < options['baseline']:
+                    started = time.perf_counter()
+                    expected = geo.haversine_filter(Listing.objects.all(), lat, lng, radius).count()
+                    scan.append(time.perf_counter() - started)
+                    assert count == expected, (lat, lng, radius, count, expected)
+
+                started = time.perf_counter()
+                response = client.get('/api/listings/', {'near': f'{lat},{lng}', 'radius': radius})
+                near.append(time.perf_counter() - started)
+                assert response.status_code == 200 and response.json()['count'] == count, response.content
+
+                delta_lat = math.degrees(radius / geo.EARTH_RADIUS_KM)
+                delta_lng = min(delta_lat / math.cos(math.radians(lat)), 179)
+                box = [
+                    max(lat - delta_lat, -90), (lng - delta_lng + 180) % 360 - 180,
+                    min(lat + delta_lat, 90), (lng + delta_lng + 180) % 360 - 180,
+                ]
+                started = time.perf_counter()
+                response = client.get('/api/listings/', {'bbox': ','.join(map(str, box))})
+                bbox.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.content
+
+            index, scan, near, bbox = (summarize(samples) for samples in (index, scan, near, bbox))
+            self.stdout.write(
+                f"{radius:>9} {sorted(matches)[len(matches) // 2]:>8} {index['p50_ms']:>10} {index['p95_ms']:>10} "
+                f"{scan['p50_ms']:>9} {near['p50_ms']:>9} {near['p95_ms']:>9} {bbox['p50_ms']:>9} {bbox['p95_ms']:>9}"
+            )
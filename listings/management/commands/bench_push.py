@@ -0,0 +1,252 @@
+"""
+Management command load-testing the booking and payment status streams.
+Run with: python manage.py bench_push [--subscribers 5000] [--changes 200]
+
+Creates a throwaway test database with --bookings bookings, each with a
+pending payment, and opens --subscribers event streams on the ASGI
+application of asgi.py in this process (no HTTP server), spread over the bookings
+and payments, half each. The streams then sit idle for --idle seconds
+with a one second heartbeat, while a ticker measures how late the event
+loop runs its timers. Then --changes payments are completed one at a time
+from a worker thread, each with its booking confirmed in one transaction
+as verify_payment does, and the time from the save to the events
+reaching every subscriber of the payment and its booking is recorded.
+Finally every client disconnects and the broker is checked to be empty.
+
+Reported: time to the first event after connecting, Python memory
+allocated per open stream (tracemalloc) and threads alive while the
+streams are open, event loop lag while idle, and save-to-event latency.
+"""
+
+import asyncio
+import gc
+import os
+import threading
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from listings import push
+from listings.benchmarking import summarize
+from listings.models import Booking, Listing, Payment
+
+
+def rss():
+    """
+    Resident memory of this process in bytes (Linux).
+    """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class Client:
+    """
+    One EventSource connection driven straight through the ASGI callable.
+    """
+
+    def __init__(self, application, path):
+        self.application = application
+        self.path = path
+        self.status = None
+        self.events = 0
+        self.heartbeats = 0
+        self.received = asyncio.Event()
+        self.disconnect = asyncio.Event()
+        self.body_sent = False
+
+    async def receive(self):
+        if not self.body_sent:
+            self.body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body':
+            body = message.get('body', b'')
+            if b'event:' in body:
+                self.events += 1
+                self.received.set()
+            elif body.startswith(b':'):
+                self.heartbeats += 1
+
+    def run(self):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': self.path,
+            'raw_path': self.path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'accept', b'text/event-stream')],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        return self.application(scope, self.receive, self.send)
+
+
+class Command(BaseCommand):
+    help = 'Load-tests the booking and payment status streams with many idle subscribers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=5000)
+        parser.add_argument('--bookings', type=int, default=1000)
+        parser.add_argument('--changes', type=int, default=200, help='Payments completed while subscribed')
+        parser.add_argument('--idle', type=float, default=5.0, help='Seconds the streams stay idle')
+        parser.add_argument('--connect-concurrency', type=int, default=200, help='Connections opened at once')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=['*'],
+                PUSH_BROKER_URL='memory://bench',
+                PUSH_HEARTBEAT_SECONDS=1,
+                PUSH_STREAM_SECONDS=3600,
+                PUSH_MAX_SUBSCRIBERS=options['subscribers'],
+            ):
+                payments = self.load_bookings(options['bookings'])
+                asyncio.run(self.run(payments, options))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def load_bookings(self, count):
+        host = User.objects.create_user('bench-host')
+        guest = User.objects.create_user('bench-guest')
+        listing = Listing.objects.create(
+            host=host, title='Listing', description='Listing', location='Somewhere',
+            price_per_night=Decimal(100), max_guests=4,
+            available_from=date.today(), available_to=date.today() + timedelta(days=365),
+        )
+        check_in = date.today() + timedelta(days=10)
+        bookings = Booking.objects.bulk_create([
+            Booking(
+                listing=listing, user=guest, check_in_date=check_in, check_out_date=check_in + timedelta(days=2),
+                number_of_guests=2, total_price=Decimal(200),
+            )
+            for _ in range(count)
+        ])
+        return Payment.objects.bulk_create([
+            Payment(booking=booking, amount=booking.total_price, chapa_reference=f'tx-bench-{number}')
+            for number, booking in enumerate(bookings)
+        ])
+
+    async def run(self, payments, options):
+        from django.core.asgi import get_asgi_application
+
+        application = push.StatusStreamApplication(get_asgi_application())
+        broker = push.get_broker()
+        clients = []
+        for number in range(options['subscribers']):
+            payment = payments[number // 2 % len(payments)]
+            if number % 2:
+                clients.append(Client(application, f'/api/bookings/{payment.booking_id}/events/'))
+            else:
+                clients.append(Client(application, f'/api/payments/{payment.pk}/events/'))
+
+        gc.collect()
+        rss_before = rss()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        connect, tasks = [], []
+        slots = asyncio.Semaphore(options['connect_concurrency'])
+        started = time.perf_counter()
+
+        async def open_stream(client):
+            async with slots:
+                start = time.perf_counter()
+                tasks.append(asyncio.create_task(client.run()))
+                await client.received.wait()
+                connect.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(open_stream(client) for client in clients))
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        allocated = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        rss_growth = rss() - rss_before
+        if broker.subscriber_count() != len(clients) or any(client.status != 200 for client in clients):
+            raise CommandError(f'{broker.subscriber_count()} of {len(clients)} streams opened')
+        self.report('connect', summarize(connect, elapsed))
+        self.stdout.write(
+            f'{len(clients)} open streams: {allocated / len(clients) / 1024:.1f} KiB each (tracemalloc), '
+            f'{rss_growth / len(clients) / 1024:.1f} KiB each (RSS), {threading.active_count()} threads'
+        )
+
+        heartbeats = -sum(client.heartbeats for client in clients)
+        lag = await self.idle(options['idle'])
+        heartbeats += sum(client.heartbeats for client in clients)
+        self.report('idle loop lag', summarize(lag))
+        self.stdout.write(f'{heartbeats} heartbeats in {options["idle"]:g}s')
+
+        by_object = {}
+        for client in clients:
+            by_object.setdefault(client.path.split('/')[3], []).append(client)
+        delivery = []
+        for payment in payments[:options['changes']]:
+            subscribers = by_object.get(str(payment.pk), []) + by_object.get(str(payment.booking_id), [])
+            for client in subscribers:
+                client.received.clear()
+            start = time.perf_counter()
+            await sync_to_async(self.complete)(payment)
+            await asyncio.gather(*(client.received.wait() for client in subscribers))
+            delivery.append(time.perf_counter() - start)
+        self.report('save to event', summarize(delivery))
+
+        for client in clients:
+            client.disconnect.set()
+        await asyncio.gather(*tasks)
+        if broker.subscriber_count():
+            raise CommandError(f'{broker.subscriber_count()} subscriptions left after disconnecting')
+        self.stdout.write('All subscriptions closed after the clients disconnected')
+
+    def complete(self, payment):
+        # As verify_payment does
+        with transaction.atomic():
+            payment.payment_status = 'completed'
+            payment.save()
+            booking = Booking.objects.get(pk=payment.booking_id)
+            booking.status = 'confirmed'
+            booking.save()
+
+    async def idle(self, seconds):
+        """
+        Sleep in 10 ms steps for `seconds`, returning how late each wake-up was.
+        """
+        loop = asyncio.get_running_loop()
+        lag = []
+        deadline = loop.time() + seconds
+        while loop.time() < deadline:
+            start = loop.time()
+            await asyncio.sleep(0.01)
+            lag.append(loop.time() - start - 0.01)
+        return lag
+
+    def report(self, name, summary):
+        line = (
+            f"{name:<14} p50 {summary['p50_ms']:>8} ms  p95 {summary['p95_ms']:>8} ms  "
+            f"p99 {summary['p99_ms']:>8} ms  max {summary['max_ms']:>8} ms"
+        )
+        if 'throughput_rps' in summary:
+            line += f"  {summary['throughput_rps']}/s"
+        self.stdout.write(line)
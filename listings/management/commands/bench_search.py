@@ -0,0 +1,116 @@
+"""
+Management command measuring the relevance and latency of listing search.
+Run with: python manage.py bench_search [--listings 100000] [--requests 50]
+
+Creates a throwaway test database with a synthetic corpus
+(listings.benchmarking.synthetic_listings), indexes it, and requests
+/api/listings/?search= for each query in SEARCH_QUERIES, alone and
+combined with price and availability filters. For each query it reports
+the latency and the precision of the first page: the share of
+results whose title contains every query term. The same precision is
+reported for the substring matching the plain SearchFilter did, ordered
+by -created_at, as a baseline.
+"""
+
+import logging
+import time
+from datetime import date, timedelta
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.test import Client, override_settings
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from listings.benchmarking import SEARCH_QUERIES, summarize, synthetic_listings, title_matches
+from listings.models import Listing
+from listings.search import tokenize
+
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the relevance and latency of the ranked listing search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100_000)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per query and scenario')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with override_settings(RESPONSE_CACHE_ENABLED=False, THROTTLE_ENABLED=False, ALLOWED_HOSTS=['*']):
+                self.load_corpus(options)
+                self.run_queries(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def load_corpus(self, options):
+        host = User.objects.create_user('bench-host')
+        listings = synthetic_listings(options['listings'], host.pk, seed=options['seed'])
+        started = time.perf_counter()
+        for start in range(0, len(listings), BATCH_SIZE):
+            # bulk_create also indexes the batch
+            Listing.objects.bulk_create(listings[start:start + BATCH_SIZE])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{len(listings)} listings inserted and indexed in {elapsed:.1f}s '
+            f'({len(listings) / elapsed:,.0f} listings/s)'
+        )
+
+    def run_queries(self, options):
+        # One JSON line per request would dominate the timings
+        logging.getLogger('listings.requests').setLevel(logging.WARNING)
+        client = Client()
+        check_in = date.today() + timedelta(days=10)
+        scenarios = {
+            'search': {},
+            'search+filters': {
+                'min_price': 100, 'max_price': 300,
+                'check_in': check_in, 'check_out': check_in + timedelta(days=3),
+            },
+        }
+        self.stdout.write(
+            f"{'query':<18} {'scenario':<16} {'matches':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'precision':>13} {'baseline':>9}"
+        )
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        for query in SEARCH_QUERIES:
+            for scenario, filters in scenarios.items():
+                params = {'search': query, **filters}
+                samples = []
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    response = client.get('/api/listings/', params, HTTP_ACCEPT='application/json')
+                    samples.append(time.perf_counter() - started)
+                data = response.json()
+                results = data['results']
+                precision = sum(title_matches(Listing(title=result['title']), query) for result in results)
+                summary = summarize(samples)
+                self.stdout.write(
+                    f"{query:<18} {scenario:<16} {data['count']:>8} {summary['p50_ms']:>8} {summary['p95_ms']:>8} "
+                    f"{precision / max(len(results), 1):>13.2f} {self.baseline_precision(query, page_size):>9.2f}"
+                )
+
+    def baseline_precision(self, query, page_size):
+        """
+        First-page precision of every term matching any field with icontains, newest first.
+        """
+        matches = reduce(and_, (
+            reduce(or_, (Q(**{f'{field}__icontains': term}) for field in ('title', 'description', 'location')))
+            for term in tokenize(query)
+        ))
+        results = list(Listing.objects.filter(matches).order_by('-created_at')[:page_size])
+        return sum(title_matches(listing, query) for listing in results) / max(len(results), 1)
@@ -0,0 +1,74 @@
+"""
+Management command measuring the similar-listings build on synthetic data.
+Run with: python manage.py bench_similar [--listings 1000000] [--bookings 5000000]
+
+Generates random listings (8 locations, log-normal prices) and bookings
+in memory, without touching the database, and times each stage of a full
+build:
+- build_features: numeric features and the co-booking projection
+- top_k_neighbours: blocked similarity and top-k selection
+- encode: packing every row into the SimilarListings byte format
+plus an incremental refresh of --changed listings.
+"""
+
+import time
+import tracemalloc
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from listings.recommendations import BLOCK_SIZE, build_features, encode, refresh_neighbours, top_k_neighbours
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the similar-listings build at scale on synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=1_000_000)
+        parser.add_argument('--bookings', type=int, default=5_000_000)
+        parser.add_argument('--users', type=int, default=500_000)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--block-size', type=int, default=BLOCK_SIZE)
+        parser.add_argument('--changed', type=int, default=1000, help='Listings in the incremental refresh')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        count = options['listings']
+        rng = np.random.default_rng(options['seed'])
+        ids = [uuid.UUID(int=int(value)) for value in rng.integers(0, 2 ** 63, count)]
+        locations = rng.integers(0, 8, count)
+        prices = rng.lognormal(np.log(150), 0.6, count).round(2)
+        guests = rng.integers(1, 11, count)
+        ratings = np.where(rng.random(count) < 0.7, rng.uniform(1, 5, count), np.nan)
+        booking_listings = rng.integers(0, count, options['bookings'])
+        booking_users = rng.integers(1, options['users'] + 1, options['bookings'])
+        self.stdout.write(
+            f"{count} listings, {options['bookings']} bookings, {options['users']} users, "
+            f"k={options['k']}, block size {options['block_size']}"
+        )
+
+        tracemalloc.start()
+        features = self.timed('build_features', build_features,
+                              ids, locations, prices, guests, ratings, booking_listings, booking_users)
+        neighbours, similarities = self.timed('top_k_neighbours', top_k_neighbours,
+                                              features, options['k'], options['block_size'])
+        rows = self.timed('encode', lambda: [
+            encode(features, neighbours[row], similarities[row]) for row in range(count)
+        ])
+        changed = rng.choice(count, min(options['changed'], count), replace=False)
+        self.timed(f'incremental ({len(changed)})', refresh_neighbours, features, changed, options['k'])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        stored = sum(len(ids) + len(scores) for ids, scores in rows)
+        self.stdout.write(
+            f'Stored neighbours: {stored / 2 ** 20:.1f} MiB ({stored / count:.0f} bytes per listing); '
+            f'peak NumPy/Python memory {peak / 2 ** 20:.0f} MiB'
+        )
+
+    def timed(self, label, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.stdout.write(f'{label:<20} {time.perf_counter() - start:>8.2f} s')
+        return result
@@ -0,0 +1,167 @@
+"""
+Management command to benchmark concurrent SQLite reads and writes.
+Run with: python manage.py bench_sqlite
+
+Runs the same booking-like workload twice against a scratch database file:
+- default: SQLite defaults (rollback journal, deferred transactions)
+- tuned: SQLITE_PRAGMAS and SQLITE_TRANSACTION_MODE from settings
+
+Writers check for overlapping bookings and then insert, inside one
+transaction, which is the read-then-write pattern that fails with
+"database is locked" under deferred transactions.
+"""
+
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from listings.benchmarking import summarize
+
+
+SCHEMA = """
+CREATE TABLE bookings (
+    id INTEGER PRIMARY KEY,
+    listing_id INTEGER NOT NULL,
+    check_in INTEGER NOT NULL,
+    check_out INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX bookings_listing_check_in ON bookings (listing_id, check_in);
+"""
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'delete',
+    'synchronous': 'full',
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks concurrent SQLite read/write throughput with default and tuned pragmas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Number of reader threads')
+        parser.add_argument('--writers', type=int, default=4, help='Number of writer threads')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+        parser.add_argument('--listings', type=int, default=1000, help='Number of listings to spread bookings over')
+
+    def handle(self, *args, **options):
+        tuned_pragmas = getattr(settings, 'SQLITE_PRAGMAS', {
+            'journal_mode': 'wal', 'synchronous': 'normal', 'mmap_size': 268435456,
+            'cache_size': -64000, 'busy_timeout': 5000, 'temp_store': 'memory',
+        })
+        runs = [
+            ('default', DEFAULT_PRAGMAS, 'DEFERRED', 5.0),
+            ('tuned', tuned_pragmas, getattr(settings, 'SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+             tuned_pragmas.get('busy_timeout', 5000) / 1000),
+        ]
+        for name, pragmas, transaction_mode, timeout in runs:
+            with tempfile.TemporaryDirectory() as scratch:
+                result = self.run_workload(
+                    os.path.join(scratch, 'bench.sqlite3'),
+                    pragmas,
+                    transaction_mode,
+                    timeout,
+                    options,
+                )
+            self.stdout.write(f"{name} ({transaction_mode}, journal_mode={pragmas.get('journal_mode')})")
+            for role in ('reads', 'writes'):
+                summary = result[role]
+                self.stdout.write(
+                    f"  {role:<6} {summary.get('throughput_rps', 0):>9} ops/s  "
+                    f"p50 {summary['p50_ms']:>8} ms  p99 {summary['p99_ms']:>8} ms"
+                )
+            self.stdout.write(f"  locked errors: {result['locked']}")
+
+    def run_workload(self, path, pragmas, transaction_mode, timeout, options):
+        setup = sqlite3.connect(path)
+        setup.executescript(SCHEMA)
+        setup.close()
+
+        samples = {'reads': [], 'writes': []}
+        locked = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+        listings = options['listings']
+
+        def connect():
+            conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+            for pragma, value in pragmas.items():
+                conn.execute(f'PRAGMA {pragma}={value}')
+            return conn
+
+        def reader():
+            conn = connect()
+            local = []
+            while time.perf_counter() < deadline:
+                listing_id = random.randrange(listings)
+                start = time.perf_counter()
+                try:
+                    conn.execute(
+                        'SELECT id, check_in, check_out, status FROM bookings '
+                        'WHERE listing_id = ? ORDER BY check_in LIMIT 20',
+                        (listing_id,)
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    with lock:
+                        locked[0] += 1
+                    continue
+                local.append(time.perf_counter() - start)
+            conn.close()
+            with lock:
+                samples['reads'].extend(local)
+
+        def writer():
+            conn = connect()
+            local = []
+            while time.perf_counter() < deadline:
+                listing_id = random.randrange(listings)
+                check_in = random.randrange(365)
+                check_out = check_in + random.randint(1, 14)
+                start = time.perf_counter()
+                try:
+                    conn.execute(f'BEGIN {transaction_mode}')
+                    overlapping = conn.execute(
+                        'SELECT COUNT(*) FROM bookings WHERE listing_id = ? '
+                        'AND check_in < ? AND check_out > ?',
+                        (listing_id, check_out, check_in)
+                    ).fetchone()[0]
+                    if not overlapping:
+                        conn.execute(
+                            'INSERT INTO bookings (listing_id, check_in, check_out, status) '
+                            'VALUES (?, ?, ?, ?)',
+                            (listing_id, check_in, check_out, 'pending')
+                        )
+                    conn.execute('COMMIT')
+                except sqlite3.OperationalError:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    with lock:
+                        locked[0] += 1
+                    continue
+                local.append(time.perf_counter() - start)
+            conn.close()
+            with lock:
+                samples['writes'].extend(local)
+
+        threads = (
+            [threading.Thread(target=reader) for _ in range(options['readers'])]
+            + [threading.Thread(target=writer) for _ in range(options['writers'])]
+        )
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'reads': summarize(samples['reads'], elapsed),
+            'writes': summarize(samples['writes'], elapsed),
+            'locked': locked[0],
+        }
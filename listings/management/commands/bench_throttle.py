@@ -0,0 +1,90 @@
+"""
+Management command measuring the cost of the rate limiter.
+Run with: python manage.py bench_throttle [--iterations 20000] [--threads 8]
+
+Reports, against the THROTTLE_CACHE_ALIAS cache:
+- TokenBucket.consume() latency when the request is allowed and when it is
+  rejected
+- the full throttle check DRF runs per request (SearchRateThrottle:
+  scope test, client key, bucket update) compared with THROTTLE_ENABLED=False
+- how many requests a bucket lets through when --threads threads race on it
+"""
+
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from listings.benchmarking import run_concurrently, summarize
+from listings.throttling import SearchRateThrottle, get_bucket
+
+
+class ListView:
+    action = 'list'
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the token-bucket rate limiter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        bucket = get_bucket()
+        self.stdout.write(f'Cache backend: {type(bucket.cache).__module__}.{type(bucket.cache).__name__}')
+
+        prefix = uuid.uuid4().hex
+        self.report('consume, allowed', self.time_calls(
+            lambda: bucket.consume(f'{prefix}:allowed', iterations * 2, 1000.0), iterations,
+        ))
+        bucket.consume(f'{prefix}:denied', 1, 0.001)
+        self.report('consume, rejected', self.time_calls(
+            lambda: bucket.consume(f'{prefix}:denied', 1, 0.001), iterations,
+        ))
+
+        factory = APIRequestFactory()
+        view = ListView()
+
+        def check():
+            request = Request(factory.get('/api/listings/', REMOTE_ADDR='10.1.2.3'))
+            request.user = None
+            # A budget large enough never to reject during the run
+            throttle = SearchRateThrottle()
+            throttle.num_requests, throttle.duration = iterations * 2, 60
+            throttle.allow_request(request, view)
+
+        for label, enabled in (('throttle check, disabled', False), ('throttle check, enabled', True)):
+            with override_settings(THROTTLE_ENABLED=enabled):
+                self.report(label, self.time_calls(check, iterations))
+
+        capacity = 100
+        key = f'{prefix}:race'
+        allowed = []
+        samples, elapsed, errors = run_concurrently(
+            lambda: allowed.append(bucket.consume(key, capacity, 0.001)[0]),
+            capacity * 10, options['threads'],
+        )
+        self.stdout.write(
+            f"{options['threads']} threads, {capacity * 10} requests on a {capacity}-token bucket: "
+            f'{sum(allowed)} allowed, {summarize(samples, elapsed)["throughput_rps"]} checks/s'
+        )
+
+    def time_calls(self, call, iterations):
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    def report(self, label, samples):
+        result = summarize(samples)
+        self.stdout.write(
+            f"{label:<28} p50 {result['p50_ms'] * 1000:>7.1f} us  "
+            f"p95 {result['p95_ms'] * 1000:>7.1f} us  p99 {result['p99_ms'] * 1000:>7.1f} us"
+        )
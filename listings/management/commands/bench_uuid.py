@@ -0,0 +1,94 @@
+"""
+Management command to compare uuid4 and uuid7 primary keys.
+Run with: python manage.py bench_uuid [--rows 2000000]
+
+Inserts the same number of rows into two scratch SQLite tables laid out
+like the listings tables (char(32) UUID primary key plus created_at) and
+reports insert throughput, primary key index size and the cost of the
+`ORDER BY created_at DESC` page query used by the list endpoints.
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+
+from listings.uuids import uuid7
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks insert throughput and index size of uuid4 vs uuid7 primary keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2_000_000, help='Rows inserted per key type')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per insert transaction')
+
+    def handle(self, *args, **options):
+        generators = [
+            ('uuid4', lambda _timestamp_ms: uuid.uuid4()),
+            ('uuid7', uuid7),
+        ]
+        for name, generate in generators:
+            with tempfile.TemporaryDirectory() as scratch:
+                result = self.run(os.path.join(scratch, 'bench.sqlite3'), generate, options)
+            self.stdout.write(
+                f"{name}: {result['rows_per_s']:>10,.0f} rows/s  "
+                f"pk index {result['index_mb']:>8.1f} MB  "
+                f"db file {result['file_mb']:>8.1f} MB  "
+                f"latest page {result['page_ms']:.3f} ms"
+            )
+
+    def run(self, path, generate, options):
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=wal')
+        conn.execute('PRAGMA synchronous=normal')
+        conn.execute(
+            'CREATE TABLE listings (listing_id char(32) NOT NULL PRIMARY KEY, created_at datetime NOT NULL)'
+        )
+
+        rows = options['rows']
+        batch_size = options['batch_size']
+        created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        step = timedelta(milliseconds=3)
+
+        started = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            batch = []
+            for _ in range(min(batch_size, rows - offset)):
+                created += step
+                timestamp_ms = int(created.timestamp() * 1000)
+                batch.append((generate(timestamp_ms).hex, created.isoformat(' ')))
+            conn.execute('BEGIN')
+            conn.executemany('INSERT INTO listings VALUES (?, ?)', batch)
+            conn.execute('COMMIT')
+        elapsed = time.perf_counter() - started
+
+        try:
+            index_bytes = conn.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = 'sqlite_autoindex_listings_1'"
+            ).fetchone()[0]
+        except sqlite3.OperationalError:
+            # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+            index_bytes = 0
+
+        conn.execute('CREATE INDEX listings_created_at ON listings (created_at)')
+        page_started = time.perf_counter()
+        for _ in range(100):
+            conn.execute(
+                'SELECT listing_id FROM listings ORDER BY created_at DESC LIMIT 10'
+            ).fetchall()
+        page_ms = (time.perf_counter() - page_started) / 100 * 1000
+
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.close()
+
+        return {
+            'rows_per_s': rows / elapsed,
+            'index_mb': index_bytes / 1024 / 1024,
+            'file_mb': os.path.getsize(path) / 1024 / 1024,
+            'page_ms': page_ms,
+        }
@@ -0,0 +1,36 @@
+"""
+Management command to write the autocomplete snapshot.
+Run with: python manage.py build_autocomplete [--force]
+
+Without --force the snapshot is only rebuilt when the listings changed
+since it was written, as the periodic refresh_autocomplete task does.
+Title terms come from the search index, so run build_search_index first
+after a bulk load.
+"""
+
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from listings.autocomplete import PrefixIndex, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Writes the prefix index served by /api/listings/autocomplete/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild even if no listing changed')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        path = settings.AUTOCOMPLETE_SNAPSHOT_PATH
+        if not refresh_snapshot(force=options['force']):
+            self.stdout.write(f'{path} is up to date')
+            return
+        index = PrefixIndex.open(path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(index)} suggestions ({index.key_count} keys, {os.path.getsize(path) / 1e6:.1f} MB) '
+            f'to {path} in {time.perf_counter() - start:.1f}s'
+        ))
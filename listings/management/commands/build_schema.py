@@ -0,0 +1,54 @@
+"""
+Management command to prebuild the OpenAPI schema served on /swagger.json/.
+Run with: python manage.py build_schema [--measure 20]
+
+Writes swagger.json and swagger.yaml to OPENAPI_SCHEMA_DIR. Run it as part
+of each deployment (next to collectstatic). --measure compares the cost of
+a schema request with live generation and with the prebuilt file.
+"""
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from listings import schema
+from listings.benchmarking import summarize
+
+
+class Command(BaseCommand):
+    help = 'Generates the OpenAPI schema files served by the schema endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--measure', type=int, default=0, metavar='N',
+                            help='Time N schema requests with live generation and with the prebuilt file')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        for path in schema.build_schema_files():
+            self.stdout.write(f'Wrote {path}')
+        self.stdout.write(self.style.SUCCESS(f'Schema built in {(time.perf_counter() - start) * 1000:.0f} ms'))
+
+        if options['measure']:
+            self.measure(options['measure'])
+
+    def measure(self, iterations):
+        logging.getLogger('listings.requests').setLevel(logging.WARNING)
+        client = Client()
+        for label, live, headers in (
+            ('live generation', True, {}),
+            ('prebuilt', False, {}),
+            ('prebuilt, If-None-Match', False, {'HTTP_IF_NONE_MATCH': f'"{schema.get_schema("json")[1]}"'}),
+        ):
+            samples = []
+            with override_settings(OPENAPI_LIVE=live, ALLOWED_HOSTS=['*']):
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    response = client.get('/swagger.json/', **headers)
+                    samples.append(time.perf_counter() - started)
+            result = summarize(samples)
+            self.stdout.write(
+                f"{label:<26} HTTP {response.status_code}  p50 {result['p50_ms']:>8} ms  "
+                f"p95 {result['p95_ms']:>8} ms  {len(response.content):>7} bytes"
+            )
@@ -0,0 +1,29 @@
+"""
+Management command to recompute the precomputed similar listings.
+Run with: python manage.py build_similar [--full]
+
+Without --full only listings that changed since their neighbours were
+computed (or that have none yet) are recomputed, as the periodic
+refresh_similar_listings task does.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.recommendations import refresh_similar_listings
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the similar listings served by /api/listings/{id}/similar/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every listing')
+        parser.add_argument('--k', type=int, help='Neighbours per listing (default SIMILAR_LISTINGS_K)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = refresh_similar_listings(full=options['full'], k=options['k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed similar listings of {count} listings in {time.perf_counter() - start:.1f}s'
+        ))
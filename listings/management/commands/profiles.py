@@ -0,0 +1,67 @@
+"""
+Management command to list and summarize stored request profiles.
+Run with:
+    python manage.py profiles                      # recent profiles
+    python manage.py profiles <id> [--sort tottime] [--limit 40]
+    python manage.py profiles --clear
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.profiling import delete_profile, format_stats, list_profiles, load_profile
+
+
+class Command(BaseCommand):
+    help = 'Lists recent request profiles or summarizes one of them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?', help='Profile to summarize')
+        parser.add_argument('--sort', default='cumulative',
+                            choices=['cumulative', 'tottime', 'ncalls'], help='pstats sort key')
+        parser.add_argument('--limit', type=int, default=25, help='Functions (or profiles) to show')
+        parser.add_argument('--clear', action='store_true', help='Delete every stored profile')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            profiles = list_profiles()
+            for metadata in profiles:
+                delete_profile(metadata['id'])
+            self.stdout.write(self.style.SUCCESS(f'Deleted {len(profiles)} profiles'))
+        elif options['profile_id']:
+            self.show(options['profile_id'], options['sort'], options['limit'])
+        else:
+            self.list(options['limit'])
+
+    def list(self, limit):
+        profiles = list_profiles()
+        if not profiles:
+            self.stdout.write('No profiles stored')
+            return
+        for metadata in profiles[:limit]:
+            self.stdout.write(
+                f"{metadata['id']}  {metadata['status']}  {metadata['duration_ms']:>9.1f} ms  "
+                f"{metadata['sql']['count']:>3} queries {metadata['sql']['time_ms']:>8.1f} ms  "
+                f"{metadata['method']} {metadata['path']}"
+            )
+
+    def show(self, profile_id, sort, limit):
+        try:
+            metadata, stats = load_profile(profile_id)
+        except FileNotFoundError:
+            raise CommandError(f'Profile {profile_id} not found')
+
+        sql = metadata['sql']
+        self.stdout.write(f"{metadata['method']} {metadata['path']} -> {metadata['status']}")
+        self.stdout.write(
+            f"{metadata['duration_ms']:.1f} ms total, {sql['count']} queries in {sql['time_ms']:.1f} ms"
+        )
+        if sql['duplicates']:
+            self.stdout.write('\nRepeated statements:')
+            for statement, count in sql['duplicates'].items():
+                self.stdout.write(f'  {count}x {statement}')
+        if sql['slowest']:
+            self.stdout.write('\nSlowest queries:')
+            for query in sql['slowest'][:10]:
+                self.stdout.write(f"  {query['time_ms']:>8.2f} ms  [{query['alias']}] {query['sql']}")
+        self.stdout.write('')
+        self.stdout.write(format_stats(stats, sort, limit))
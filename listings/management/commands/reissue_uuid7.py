@@ -0,0 +1,133 @@
+"""
+Management command to rewrite existing uuid4 primary keys as time-ordered uuid7.
+Run with: python manage.py reissue_uuid7 [--dry-run]
+
+Each new id embeds the row's created_at timestamp, so after the rewrite the
+primary key order matches creation order. Rows are read in keyset pages of
+--batch-size and each page is rewritten in one transaction, with one
+UPDATE per table: the rows' own keys, and the foreign keys pointing at
+them (Django creates them as DEFERRABLE INITIALLY DEFERRED on SQLite and
+PostgreSQL).
+
+Delta sync clients (listings.sync) see the rewrite as a deletion of the
+old id, through a Tombstone, and a change of the new one: the rewritten
+rows and the rows referencing them get a new updated_at. Stored similar
+listings point at the old listing ids, so they are cleared and
+recomputed by the next refresh_similar_listings run, and every cached
+API response is dropped.
+
+Rows that already have a version 7 id are skipped, so the command can be
+interrupted and re-run.
+
+WARNING: ids change. Clients holding old listing/booking/review/payment ids
+(bookmarks, emails, Chapa tx_ref prefixes) will no longer resolve them.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from listings.cache import USERS_TAG, invalidate_tags
+from listings.models import Listing, Booking, Review, Payment, SimilarListings, Tombstone
+from listings.uuids import uuid7
+
+
+MODELS = [Listing, Booking, Review, Payment]
+# Models whose deletions the delta sync feed reports
+TOMBSTONE_KINDS = {Listing, Booking, Review}
+
+
+def pending_pages(model, batch_size):
+    """
+    Yield the (pk, created_at, user_id) rows of `model` that do not have a
+    uuid7 id yet, one keyset page at a time.
+    """
+    pk_name = model._meta.pk.name
+    with_user = model is Booking
+    rows = model._base_manager.order_by(pk_name).values_list(pk_name, 'created_at', *(['user_id'] if with_user else []))
+    last = None
+    while True:
+        page = list((rows if last is None else rows.filter(pk__gt=last))[:batch_size])
+        if not page:
+            return
+        last = page[-1][0]
+        # Rewritten ids sorting after `last` come round again and are skipped
+        yield [(row[0], row[1], row[2] if with_user else None) for row in page if row[0].version != 7]
+
+
+def replace(field, new_ids):
+    """
+    Expression mapping each old id of `new_ids` to its new id in `field`.
+    """
+    return Case(*(When(**{field: old}, then=Value(new)) for old, new in new_ids.items()), default=field)
+
+
+class Command(BaseCommand):
+    help = 'Rewrites existing uuid4 primary keys as uuid7 derived from created_at'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows rewritten per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would change')
+
+    def handle(self, *args, **options):
+        rewritten_listings = 0
+        for model in MODELS:
+            label = model._meta.verbose_name_plural
+            pages = pending_pages(model, options['batch_size'])
+
+            if options['dry_run']:
+                self.stdout.write(f'{label}: {sum(len(page) for page in pages)} rows would be rewritten')
+                continue
+
+            count = 0
+            for page in pages:
+                if page:
+                    self.rewrite(model, page)
+                    count += len(page)
+            if model is Listing:
+                rewritten_listings = count
+            self.stdout.write(self.style.SUCCESS(f'{label}: rewrote {count} ids'))
+
+        if options['dry_run']:
+            return
+        if rewritten_listings:
+            # Neighbour lists hold the old listing ids; rows are rebuilt for
+            # listings without one by the next refresh_similar_listings run
+            SimilarListings.objects.all().delete()
+            self.stdout.write('Cleared the similar listings; the next refresh_similar_listings run rebuilds them')
+        # Cached responses hold the old ids
+        invalidate_tags(USERS_TAG)
+
+    def rewrite(self, model, page):
+        """
+        Give the rows of `page` uuid7 ids, updating the foreign keys that
+        reference them, in one transaction.
+        """
+        pk_name = model._meta.pk.name
+        now = timezone.now()
+        new_ids = {pk: uuid7(int(created_at.timestamp() * 1000)) for pk, created_at, _ in page}
+        with transaction.atomic():
+            for relation in model._meta.related_objects:
+                if not relation.field.concrete:
+                    continue
+                related_model, attname = relation.related_model, relation.field.attname
+                changes = {attname: replace(attname, new_ids)}
+                if any(field.name == 'updated_at' for field in related_model._meta.concrete_fields):
+                    # The referencing rows changed too, for the delta sync feed
+                    changes['updated_at'] = now
+                related_model._base_manager.filter(**{f'{attname}__in': list(new_ids)}).update(**changes)
+            model._base_manager.filter(pk__in=list(new_ids)).update(
+                **{pk_name: replace(pk_name, new_ids)}, updated_at=now,
+            )
+            if model in TOMBSTONE_KINDS:
+                Tombstone.objects.bulk_create([
+                    Tombstone(
+                        kind=model._meta.model_name,
+                        object_id=pk,
+                        # Only the booking's user syncs its bookings
+                        user_id=user_id,
+                        deleted_at=now,
+                    )
+                    for pk, _, user_id in page
+                ])
@@ -0,0 +1,57 @@
+"""
+Management command running the occupancy-driven pricing job.
+Run with: python manage.py reprice [--dry-run] [--diff prices.csv] [--top 20]
+
+Prints the occupancy and price changes per location and the largest
+individual changes. --dry-run computes everything without writing,
+--diff writes one CSV row per changed listing.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.pricing import apply_prices, load_and_price
+
+
+class Command(BaseCommand):
+    help = 'Reprices listings with dynamic pricing bounds from their occupancy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them')
+        parser.add_argument('--diff', help='Write every change to this CSV file')
+        parser.add_argument('--top', type=int, default=20, help='Largest changes to print')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        run = load_and_price()
+        priced_in = time.perf_counter() - start
+
+        self.stdout.write(f"{'location':<24} {'listings':>9} {'priced':>9} {'changed':>9} {'occupancy':>10} {'change':>8}")
+        for row in run.location_summary():
+            self.stdout.write(
+                f"{row['location']:<24} {row['listings']:>9} {row['priced']:>9} {row['changed']:>9} "
+                f"{row['occupancy']:>10.1%} {row['mean_change']:>+8.1%}"
+            )
+
+        largest = list(run.diff(limit=options['top']))
+        if largest:
+            self.stdout.write(f'\nLargest {len(largest)} changes:')
+            for row in largest:
+                self.stdout.write(
+                    f"  {row['listing_id']}  {row['location']:<24} occupancy {row['occupancy']:>6.1%}  "
+                    f"{row['old_price']:>10} -> {row['new_price']:>10} ({row['change']:+.1%})"
+                )
+        if options['diff']:
+            run.write_diff(options['diff'])
+            self.stdout.write(f"Diff written to {options['diff']}")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'Dry run: {len(run.changed)} prices would change (computed in {priced_in:.1f}s)'
+            ))
+            return
+        updated = apply_prices(run)
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {updated} prices in {time.perf_counter() - start:.1f}s (computed in {priced_in:.1f}s)'
+        ))
@@ -0,0 +1,24 @@
+"""
+Management command to show the API response cache hit/miss counters.
+Run with: python manage.py response_cache_stats [--reset]
+"""
+
+from django.core.management.base import BaseCommand
+
+from listings.cache import response_cache_stats, reset_response_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Shows hit/miss counters of the listing and review response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing')
+
+    def handle(self, *args, **options):
+        stats = response_cache_stats()
+        self.stdout.write(
+            f"hits: {stats['hits']}  misses: {stats['misses']}  hit ratio: {stats['hit_ratio']:.2%}"
+        )
+        if options['reset']:
+            reset_response_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
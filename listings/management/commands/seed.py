@@ -1,127 +1,312 @@
 """
 Management command to seed the database with sample listing data.
 Run with: python manage.py seed
+
+Generates users, listings, bookings and reviews with bulk_create in chunks.
+Sizes come from --scale presets or explicit counts, e.g.:
+
+    python manage.py seed                          # demo data (5 users, 20 listings)
+    python manage.py seed --scale large --workers 8
+    python manage.py seed --users 1000 --listings 50000 --bookings 200000 --seed 42
+
+Generation is deterministic for a given --seed: every listing uses its
+own random stream, so the data is identical whatever the --chunk-size
+or number of --workers. Bookings of a listing never overlap.
 """
 
-from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from listings.models import Listing, Booking, Review
+import hashlib
+import math
+import multiprocessing
+import random
 from datetime import datetime, timedelta
 from decimal import Decimal
-import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from listings import geo
+from listings.cache import USERS_TAG, invalidate_tags
+from listings.models import Listing, Booking, Review, Payment, SearchDocument, SearchPosting, SimilarListings
+from listings.uuids import uuid7
+
+
+SCALES = {
+    'demo': {'users': 5, 'listings': 20, 'bookings': 30},
+    'small': {'users': 1_000, 'listings': 10_000, 'bookings': 50_000},
+    'medium': {'users': 10_000, 'listings': 100_000, 'bookings': 1_000_000},
+    'large': {'users': 100_000, 'listings': 1_000_000, 'bookings': 10_000_000},
+}
+
+LOCATIONS = [
+    'New York, USA',
+    'Paris, France',
+    'Tokyo, Japan',
+    'London, UK',
+    'Sydney, Australia',
+    'Barcelona, Spain',
+    'Dubai, UAE',
+    'Amsterdam, Netherlands'
+]
+
+PROPERTY_TYPES = [
+    'Cozy Studio Apartment',
+    'Luxury Penthouse',
+    'Beachfront Villa',
+    'Mountain Cabin',
+    'City Center Loft',
+    'Historic Cottage',
+    'Modern Condo',
+    'Spacious Family Home'
+]
+
+STATUSES = ['pending', 'confirmed', 'cancelled', 'completed']
+
+# Seeded ids embed a fixed timestamp plus the row index, so they are both
+# reproducible and ordered by generation order.
+BASE_TIMESTAMP_MS = 1735689600000  # 2025-01-01T00:00:00Z
+
+# Tables cleared before seeding, children first
+SEEDED_MODELS = [SearchPosting, SearchDocument, SimilarListings, Payment, Review, Booking, Listing]
+
+
+def stable_int(seed, *parts, bits=64):
+    """
+    Deterministic pseudo-random integer for (seed, *parts), independent of chunking.
+    """
+    digest = hashlib.blake2b(f"{seed}:{':'.join(map(str, parts))}".encode(), digest_size=16).digest()
+    return int.from_bytes(digest, 'big') >> (128 - bits)
+
+
+def seeded_uuid(seed, kind, index):
+    return uuid7(BASE_TIMESTAMP_MS + index, random_bits=stable_int(seed, kind, index, bits=80))
+
+
+def generate_chunk(params, start, stop):
+    """
+    Create listings [start, stop) with their bookings and reviews.
+    Runs in the main process or in a worker process.
+
+    Returns:
+        tuple: (listings, bookings, reviews) created
+    """
+    seed = params['seed']
+    user_ids = params['user_ids']
+    batch_size = params['batch_size']
+    today = params['today']
+
+    listings = []
+    bookings = []
+    reviews = []
+    bookings_per_listing, extra_bookings = divmod(params['bookings'], params['listings'])
+
+    for index in range(start, stop):
+        # Per-listing stream: output does not depend on chunk size or workers
+        rng = random.Random(stable_int(seed, 'listing', index))
+        location = rng.choice(LOCATIONS)
+        host_index = stable_int(seed, 'host', index) % len(user_ids)
+        # Scattered within about 10 km of the city centre, from a separate
+        # stream so the other fields stay as they were before coordinates
+        spread = random.Random(stable_int(seed, 'coordinates', index))
+        centre_lat, centre_lng = geo.geocode(location)
+        latitude = round(centre_lat + spread.uniform(-0.09, 0.09), 6)
+        longitude = round(centre_lng + spread.uniform(-0.09, 0.09) / math.cos(math.radians(centre_lat)), 6)
+        listing = Listing(
+            listing_id=seeded_uuid(seed, 'listing', index),
+            host_id=user_ids[host_index],
+            title=f"{rng.choice(PROPERTY_TYPES)} in {rng.choice(LOCATIONS).split(',')[0]}",
+            description=(
+                f"Beautiful property with amazing amenities. Perfect for your next vacation. "
+                f"Property {index + 1} offers comfort and style."
+            ),
+            location=location,
+            price_per_night=Decimal(rng.randint(50, 500)),
+            max_guests=rng.randint(1, 8),
+            latitude=latitude,
+            longitude=longitude,
+            # bulk_create skips the signal that sets it
+            geohash=geo.encode(latitude, longitude),
+            available_from=today,
+            available_to=today + timedelta(days=365)
+        )
+        listings.append(listing)
+
+        # Walk the listing's calendar so its bookings never overlap
+        check_in = today + timedelta(days=rng.randint(1, 30))
+        reviewers = set()
+        count = bookings_per_listing + (1 if index < extra_bookings else 0)
+        for number in range(count):
+            nights = rng.randint(1, 14)
+            check_out = check_in + timedelta(days=nights)
+            user_index = rng.randrange(len(user_ids))
+            if user_index == host_index and len(user_ids) > 1:
+                user_index = (user_index + 1) % len(user_ids)
+            status = rng.choice(STATUSES)
+            booking_index = index * (bookings_per_listing + 1) + number
+            bookings.append(Booking(
+                booking_id=seeded_uuid(seed, 'booking', booking_index),
+                listing=listing,
+                user_id=user_ids[user_index],
+                check_in_date=check_in,
+                check_out_date=check_out,
+                number_of_guests=rng.randint(1, listing.max_guests),
+                total_price=listing.price_per_night * nights,
+                status=status
+            ))
+
+            # One review per user per listing, for about half the completed stays
+            if status == 'completed' and user_index not in reviewers and rng.random() < 0.5:
+                reviewers.add(user_index)
+                reviews.append(Review(
+                    review_id=seeded_uuid(seed, 'review', booking_index),
+                    listing=listing,
+                    user_id=user_ids[user_index],
+                    rating=rng.randint(3, 5),
+                    comment=f"Great stay at {listing.title}! Would definitely recommend."
+                ))
+
+            check_in = check_out + timedelta(days=rng.randint(0, 5))
+
+    with transaction.atomic():
+        Listing.objects.bulk_create(listings, batch_size=batch_size)
+        Booking.objects.bulk_create(bookings, batch_size=batch_size)
+        Review.objects.bulk_create(reviews, batch_size=batch_size)
+
+    return len(listings), len(bookings), len(reviews)
+
+
+def _generate_chunk_star(args):
+    return generate_chunk(*args)
 
 
 class Command(BaseCommand):
     help = 'Seeds the database with sample listing, booking, and review data'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='demo',
+                            help='Preset sizes: ' + ', '.join(
+                                f"{name} ({size['users']}/{size['listings']}/{size['bookings']})"
+                                for name, size in SCALES.items()
+                            ) + ' users/listings/bookings')
+        parser.add_argument('--users', type=int, help='Number of users (overrides --scale)')
+        parser.add_argument('--listings', type=int, help='Number of listings (overrides --scale)')
+        parser.add_argument('--bookings', type=int, help='Number of bookings (overrides --scale)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for reproducible data')
+        parser.add_argument('--chunk-size', type=int, default=10_000,
+                            help='Listings generated per chunk (with their bookings and reviews)')
+        parser.add_argument('--batch-size', type=int, default=5_000, help='Rows per bulk_create batch')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes generating chunks in parallel (best with PostgreSQL)')
+        parser.add_argument('--no-clear', action='store_true', help='Keep existing data')
+
+    def handle(self, *args, **options):
+        sizes = dict(SCALES[options['scale']])
+        for name in ('users', 'listings', 'bookings'):
+            if options[name] is not None:
+                sizes[name] = options[name]
+        if sizes['users'] < 1 or sizes['listings'] < 1:
+            raise CommandError('At least one user and one listing are required')
+
         self.stdout.write('Seeding database...')
 
-        # Clear existing data
-        self.stdout.write('Clearing existing data...')
-        Review.objects.all().delete()
-        Booking.objects.all().delete()
-        Listing.objects.all().delete()
-        User.objects.filter(is_superuser=False).delete()
-
-        # Create sample users
-        self.stdout.write('Creating users...')
-        users = []
-        for i in range(5):
-            user = User.objects.create_user(
-                username=f'user{i+1}',
-                email=f'user{i+1}@example.com',
-                password='password123',
-                first_name=f'FirstName{i+1}',
-                last_name=f'LastName{i+1}'
-            )
-            users.append(user)
-
-        # Create sample listings
-        self.stdout.write('Creating listings...')
-        locations = [
-            'New York, USA',
-            'Paris, France',
-            'Tokyo, Japan',
-            'London, UK',
-            'Sydney, Australia',
-            'Barcelona, Spain',
-            'Dubai, UAE',
-            'Amsterdam, Netherlands'
-        ]
+        if not options['no_clear']:
+            self.stdout.write('Clearing existing data...')
+            self.clear()
+
+        self.stdout.write(f"Creating {sizes['users']} users...")
+        user_ids = self.create_users(sizes['users'], options['batch_size'])
 
-        property_types = [
-            'Cozy Studio Apartment',
-            'Luxury Penthouse',
-            'Beachfront Villa',
-            'Mountain Cabin',
-            'City Center Loft',
-            'Historic Cottage',
-            'Modern Condo',
-            'Spacious Family Home'
+        self.stdout.write(
+            f"Creating {sizes['listings']} listings and {sizes['bookings']} bookings..."
+        )
+        params = {
+            **sizes,
+            'seed': options['seed'],
+            'user_ids': user_ids,
+            'batch_size': options['batch_size'],
+            'today': datetime.now().date(),
+        }
+        chunk_size = options['chunk_size']
+        chunks = [
+            (params, start, min(start + chunk_size, sizes['listings']))
+            for start in range(0, sizes['listings'], chunk_size)
         ]
 
-        listings = []
-        for i in range(20):
-            listing = Listing.objects.create(
-                host=random.choice(users),
-                title=f"{random.choice(property_types)} in {random.choice(locations).split(',')[0]}",
-                description=f"Beautiful property with amazing amenities. Perfect for your next vacation. Property {i+1} offers comfort and style.",
-                location=random.choice(locations),
-                price_per_night=Decimal(random.randint(50, 500)),
-                max_guests=random.randint(1, 8),
-                available_from=datetime.now().date(),
-                available_to=datetime.now().date() + timedelta(days=365)
-            )
-            listings.append(listing)
+        totals = [0, 0, 0]
+        if options['workers'] > 1:
+            if connection.vendor == 'sqlite':
+                self.stdout.write(self.style.WARNING(
+                    'SQLite serializes writers; extra workers mostly help generation, not inserts'
+                ))
+            # Children must open their own database connections
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+                for counts in pool.imap_unordered(_generate_chunk_star, chunks):
+                    totals = [total + count for total, count in zip(totals, counts)]
+                    self.report_progress(totals, sizes)
+        else:
+            for chunk in chunks:
+                counts = generate_chunk(*chunk)
+                totals = [total + count for total, count in zip(totals, counts)]
+                self.report_progress(totals, sizes)
 
-        self.stdout.write(self.style.SUCCESS(f'Created {len(listings)} listings'))
+        # bulk_create does not send signals, so drop every cached API response
+        invalidate_tags(USERS_TAG)
 
-        # Create sample bookings
-        self.stdout.write('Creating bookings...')
-        statuses = ['pending', 'confirmed', 'cancelled', 'completed']
-        bookings_count = 0
+        self.stdout.write(self.style.SUCCESS(f'Created {totals[0]} listings'))
+        self.stdout.write(self.style.SUCCESS(f'Created {totals[1]} bookings'))
+        self.stdout.write(self.style.SUCCESS(f'Created {totals[2]} reviews'))
+        self.stdout.write(self.style.SUCCESS('Database seeding completed successfully!'))
 
-        for _ in range(30):
-            listing = random.choice(listings)
-            user = random.choice([u for u in users if u != listing.host])
+    def report_progress(self, totals, sizes):
+        if sizes['listings'] > 10_000:
+            self.stdout.write(f"  {totals[0]}/{sizes['listings']} listings, {totals[1]} bookings")
 
-            check_in = datetime.now().date() + timedelta(days=random.randint(1, 90))
-            check_out = check_in + timedelta(days=random.randint(1, 14))
-            num_guests = random.randint(1, listing.max_guests)
-            nights = (check_out - check_in).days
-            total = listing.price_per_night * nights
+    def clear(self):
+        """
+        Empty the seeded tables with set-based SQL instead of ORM deletes,
+        which would load every cascaded row into memory.
+        """
+        quote = connection.ops.quote_name
+        tables = [model._meta.db_table for model in SEEDED_MODELS]
+        user_table = User._meta.db_table
+        non_superusers = f'SELECT id FROM {quote(user_table)} WHERE NOT is_superuser'
+        user_references = [
+            (User.groups.through._meta.db_table, 'user_id'),
+            (User.user_permissions.through._meta.db_table, 'user_id'),
+            ('django_admin_log', 'user_id'),
+        ]
 
-            Booking.objects.create(
-                listing=listing,
-                user=user,
-                check_in_date=check_in,
-                check_out_date=check_out,
-                number_of_guests=num_guests,
-                total_price=total,
-                status=random.choice(statuses)
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('TRUNCATE {}'.format(', '.join(quote(table) for table in tables)))
+            else:
+                # An unqualified DELETE uses SQLite's truncate optimization
+                for table in tables:
+                    cursor.execute(f'DELETE FROM {quote(table)}')
+            for table, column in user_references:
+                cursor.execute(f'DELETE FROM {quote(table)} WHERE {quote(column)} IN ({non_superusers})')
+            cursor.execute(f'DELETE FROM {quote(user_table)} WHERE NOT is_superuser')
+
+    def create_users(self, count, batch_size):
+        # Hash the shared password once instead of running PBKDF2 per user
+        password = make_password('password123')
+        for start in range(0, count, batch_size):
+            User.objects.bulk_create(
+                [
+                    User(
+                        username=f'user{i + 1}',
+                        email=f'user{i + 1}@example.com',
+                        password=password,
+                        first_name=f'FirstName{i + 1}',
+                        last_name=f'LastName{i + 1}'
+                    )
+                    for i in range(start, min(start + batch_size, count))
+                ],
+                batch_size=batch_size,
+                ignore_conflicts=True
             )
-            bookings_count += 1
-
-        self.stdout.write(self.style.SUCCESS(f'Created {bookings_count} bookings'))
-
-        # Create sample reviews
-        self.stdout.write('Creating reviews...')
-        reviews_count = 0
-
-        completed_bookings = Booking.objects.filter(status='completed')[:15]
-        for booking in completed_bookings:
-            try:
-                Review.objects.create(
-                    listing=booking.listing,
-                    user=booking.user,
-                    rating=random.randint(3, 5),
-                    comment=f"Great stay at {booking.listing.title}! Would definitely recommend."
-                )
-                reviews_count += 1
-            except:
-                # Skip if review already exists for this user-listing combo
-                pass
-
-        self.stdout.write(self.style.SUCCESS(f'Created {reviews_count} reviews'))
-        self.stdout.write(self.style.SUCCESS('Database seeding completed successfully!'))
\ No newline at end of file
+        return list(
+            User.objects.filter(is_superuser=False).order_by('id').values_list('id', flat=True)[:count]
+        )
@@ -0,0 +1,115 @@
+"""
+Management command reporting worker cold-start costs.
+Run with: python manage.py startup_report [--path /api/listings/] [--runs 5]
+
+Starts fresh Python processes that import wsgi.py the way a worker does
+and reports:
+- import time per top-level package (python -X importtime)
+- boot time (settings, app registry, URLconf, warm-up)
+- latency of the first and second request, with and without warm-up
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+WORKER_SCRIPT = '''
+import json, os, sys, time
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+from wsgi import application
+boot = time.perf_counter() - start
+
+def call(path):
+    path, _, query = path.partition('?')
+    environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'wsgi.input': BytesIO()}
+    setup_testing_defaults(environ)
+    status = []
+    started = time.perf_counter()
+    b''.join(application(environ, lambda line, headers, exc_info=None: status.append(line)))
+    return time.perf_counter() - started, status[0]
+
+first, first_status = call(sys.argv[1])
+second, _ = call(sys.argv[1])
+print(json.dumps({
+    'boot_ms': boot * 1000,
+    'first_request_ms': first * 1000,
+    'second_request_ms': second * 1000,
+    'status': first_status,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Reports import time, boot time and first-request latency of a fresh worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/listings/', help='Request path to time')
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode (median is reported)')
+        parser.add_argument('--top', type=int, default=15, help='Packages to list in the import report')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        report = {
+            'imports_ms': self.import_report(options['path'], options['top']),
+            'modes': {},
+        }
+        for label, mode in (('without warm-up', 'off'), ('with warm-up', 'import')):
+            runs = [self.run_worker(options['path'], mode) for _ in range(options['runs'])]
+            report['modes'][label] = {
+                key: round(statistics.median(run[key] for run in runs), 3)
+                for key in ('boot_ms', 'first_request_ms', 'second_request_ms')
+            }
+            report['modes'][label]['status'] = runs[-1]['status']
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write('Import time by package (self time, ms):')
+        for package, ms in report['imports_ms'].items():
+            self.stdout.write(f'  {ms:>8.1f}  {package}')
+        self.stdout.write('')
+        self.stdout.write(f"{'':<18}{'boot':>10}{'1st request':>14}{'2nd request':>14}")
+        for label, result in report['modes'].items():
+            self.stdout.write(
+                f"{label:<18}{result['boot_ms']:>8.1f}ms{result['first_request_ms']:>12.1f}ms"
+                f"{result['second_request_ms']:>12.1f}ms   ({result['status']})"
+            )
+
+    def run_worker(self, path, warmup, importtime=False):
+        command = [sys.executable]
+        if importtime:
+            command += ['-X', 'importtime']
+        command += ['-c', WORKER_SCRIPT, path]
+        environ = {**os.environ, 'DJANGO_WARMUP': warmup}
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=environ, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f'Worker process failed:\n{result.stderr[-2000:]}')
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        if importtime:
+            data['stderr'] = result.stderr
+        return data
+
+    def import_report(self, path, top):
+        stderr = self.run_worker(path, 'off', importtime=True)['stderr']
+        packages = Counter()
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, _, name = line[len('import time:'):].split('|')
+            packages[name.strip().split('.')[0]] += int(self_us)
+        total = sum(packages.values())
+        report = {package: round(us / 1000, 1) for package, us in packages.most_common(top)}
+        report['(total)'] = round(total / 1000, 1)
+        return report
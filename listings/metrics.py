@@ -0,0 +1,167 @@
+"""
+Prometheus metrics for the travel booking application.
+
+Covers HTTP latency per route and status, SQL queries and database time
+per request, Chapa API latency and errors, Celery task duration and
+failures, rate-limited requests, and booking/payment business counters.
+They are exposed in the Prometheus text format on /metrics.
+
+Under gunicorn every worker is a separate process. When the
+PROMETHEUS_MULTIPROC_DIR environment variable is set (gunicorn.conf.py
+does it) prometheus_client writes the values to memory-mapped files in
+that directory and /metrics aggregates all workers. The Celery task
+metrics are recorded in the Celery worker, so it must run with the same
+PROMETHEUS_MULTIPROC_DIR, or they never reach /metrics.
+"""
+
+import os
+import time
+
+from celery.signals import task_failure, task_postrun, task_prerun
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from .timing import timed
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route and status',
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+db_queries_per_request = Histogram(
+    'db_queries_per_request',
+    'SQL queries executed per HTTP request',
+    ['route'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+db_time_per_request = Histogram(
+    'db_time_per_request_seconds',
+    'Time spent in the database per HTTP request',
+    ['route'],
+    buckets=LATENCY_BUCKETS,
+)
+chapa_request_duration = Histogram(
+    'chapa_request_duration_seconds',
+    'Latency of Chapa API calls',
+    ['operation'],
+    buckets=LATENCY_BUCKETS,
+)
+chapa_errors = Counter(
+    'chapa_errors_total',
+    'Chapa API calls that failed or returned an error status',
+    ['operation', 'reason'],
+)
+celery_task_duration = Histogram(
+    'celery_task_duration_seconds',
+    'Celery task run time',
+    ['task', 'state'],
+    buckets=LATENCY_BUCKETS,
+)
+celery_task_failures = Counter(
+    'celery_task_failures_total',
+    'Celery tasks that raised or reported an error',
+    ['task'],
+)
+bookings_created = Counter(
+    'bookings_created_total',
+    'Bookings created',
+    ['status'],
+)
+bookings_confirmed = Counter(
+    'bookings_confirmed_total',
+    'Bookings confirmed, by a verified payment (payment) or by an admin (admin)',
+    ['source'],
+)
+payments = Counter(
+    'payments_total',
+    'Payment state changes (initiated, completed, failed)',
+    ['status'],
+)
+payment_amount = Counter(
+    'payment_amount_total',
+    'Amount of completed payments',
+    ['currency'],
+)
+throttled_requests = Counter(
+    'throttled_requests_total',
+    'Requests rejected by the rate limiter',
+    ['scope'],
+)
+
+
+def route_name(request):
+    """
+    Low-cardinality route label: the URL name, not the raw path.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return match.view_name or match.route
+
+
+def observe_chapa(operation, call, *args, **kwargs):
+    """
+    Run a Chapa HTTP call (e.g. requests.post) and record its latency and errors.
+    """
+    start = time.perf_counter()
+    try:
+        with timed('external'):
+            response = call(*args, **kwargs)
+    except Exception as e:
+        chapa_errors.labels(operation, type(e).__name__).inc()
+        raise
+    finally:
+        chapa_request_duration.labels(operation).observe(time.perf_counter() - start)
+    if response.status_code >= 400:
+        chapa_errors.labels(operation, f'http_{response.status_code}').inc()
+    return response
+
+
+def render_metrics():
+    """
+    Return (body, content type) for the /metrics endpoint.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+_task_started = {}
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    # Tasks such as send_payment_confirmation_email catch their own
+    # exceptions and return {'status': 'error'}: count those as failures too
+    reported_error = isinstance(retval, dict) and retval.get('status') == 'error'
+    if reported_error and state == 'SUCCESS':
+        celery_task_failures.labels(task.name).inc()
+        state = 'ERROR'
+    if started is not None:
+        celery_task_duration.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+@task_failure.connect
+def _task_failure(sender=None, **kwargs):
+    celery_task_failures.labels(sender.name).inc()
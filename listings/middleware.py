@@ -0,0 +1,286 @@
+"""
+Middleware for the travel booking application.
+
+Except for ProfilingMiddleware, they run natively in both the sync (WSGI)
+and async (ASGI) handler, so that under ASGI a request only moves to a
+thread where Django needs one and async views stay on the event loop.
+"""
+
+import cProfile
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import db_queries_per_request, db_time_per_request, http_request_duration, route_name
+from .profiling import new_profile_id, save_profile
+from .querycount import QueryCounter, QueryRecorder, observe_queries
+from .routers import read_from_replica
+from .timing import RequestTimings, current_timings
+
+
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger('listings.requests')
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class AsyncCapableMiddleware:
+    """
+    Base for middleware that works the same in sync and async mode.
+
+    Subclasses implement around(request): a context manager that yields an
+    object whose `response` attribute is set once the rest of the chain
+    has run. Code after the yield can inspect or replace it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.around(request) as outcome:
+            outcome.response = self.get_response(request)
+        return outcome.response
+
+    async def __acall__(self, request):
+        with self.around(request) as outcome:
+            outcome.response = await self.get_response(request)
+        return outcome.response
+
+    def around(self, request):
+        raise NotImplementedError
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Decides per request whether reads may be served by a read replica.
+
+    Reads go to a replica only for safe methods, when the view is not marked
+    with @primary_db and when the client has not written recently. After an
+    unsafe request the client receives a short-lived pin cookie so that it
+    reads its own writes from the primary.
+    """
+    pin_cookie = 'db_primary_pin'
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def around(self, request):
+        outcome = SimpleNamespace(response=None)
+        # process_view may set the flag in a sync_to_async thread whose
+        # context changes are copied back, so restore it from a token
+        # taken here rather than one taken there
+        token = read_from_replica.set(read_from_replica.get())
+        try:
+            yield outcome
+        finally:
+            read_from_replica.reset(token)
+
+        if request.method not in SAFE_METHODS:
+            outcome.response.set_cookie(
+                self.pin_cookie,
+                '1',
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        use_replica = (
+            request.method in SAFE_METHODS
+            and self.pin_cookie not in request.COOKIES
+            and not getattr(view_func, 'use_primary_db', False)
+        )
+        read_from_replica.set(use_replica)
+
+
+class NPlusOneError(Exception):
+    """
+    Raised by QueryCountMiddleware when N_PLUS_ONE_RAISE is set.
+    """
+
+
+class QueryCountMiddleware(AsyncCapableMiddleware):
+    """
+    Development middleware recording the SQL each request executes.
+
+    Adds X-DB-Queries and X-DB-Time-ms response headers and logs a warning
+    (or raises NPlusOneError) when one normalized statement runs at least
+    N_PLUS_ONE_THRESHOLD times in a request, the usual sign of a related
+    object being loaded lazily per row.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def around(self, request):
+        outcome = SimpleNamespace(response=None)
+        with QueryRecorder() as recorder:
+            yield outcome
+
+        response = outcome.response
+        response['X-DB-Queries'] = str(recorder.count)
+        response['X-DB-Time-ms'] = f'{recorder.total_time * 1000:.2f}'
+
+        repeated = recorder.duplicates(minimum=settings.N_PLUS_ONE_THRESHOLD)
+        if repeated:
+            message = 'Possible N+1 in {} {}: {}'.format(
+                request.method,
+                request.path,
+                '; '.join(f'{count}x {sql}' for sql, count in repeated.items()),
+            )
+            if settings.N_PLUS_ONE_RAISE:
+                raise NPlusOneError(message)
+            logger.warning(message)
+
+
+class ProfilingMiddleware:
+    """
+    Runs selected requests under cProfile and stores the profile with the
+    request's SQL timings (see listings.profiling).
+
+    A request is profiled when a staff user sends the PROFILING_HEADER
+    header, or at random with probability PROFILING_SAMPLE_RATE. The
+    response then carries an X-Profile-Id header. When PROFILING_ENABLED
+    is off the middleware removes itself from the chain.
+
+    cProfile follows one thread, so this middleware is sync only: while
+    it is enabled, ASGI requests are handled in a worker thread.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+
+    def should_profile(self, request):
+        if self.header in request.META:
+            user = getattr(request, 'user', None)
+            return bool(user and user.is_staff)
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        try:
+            with QueryRecorder() as recorder:
+                response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - start
+
+        profile_id = new_profile_id()
+        slowest = sorted(recorder.queries, key=lambda query: query['time'], reverse=True)
+        save_profile(profile_id, profiler, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'sampled': self.header not in request.META,
+            'sql': {
+                **recorder.summary(),
+                'slowest': [
+                    {'alias': query['alias'], 'sql': query['sql'], 'time_ms': round(query['time'] * 1000, 3)}
+                    for query in slowest[:20]
+                ],
+            },
+        })
+        response['X-Profile-Id'] = profile_id
+        return response
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Records Prometheus request latency per route and status, and the SQL
+    query count and database time of each request (see listings.metrics).
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def around(self, request):
+        outcome = SimpleNamespace(response=None)
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with observe_queries(counter):
+            yield outcome
+        duration = time.perf_counter() - start
+
+        route = route_name(request)
+        http_request_duration.labels(request.method, route, str(outcome.response.status_code)).observe(duration)
+        db_queries_per_request.labels(route).observe(counter.count)
+        db_time_per_request.labels(route).observe(counter.total_time)
+
+
+class RequestTimingMiddleware(AsyncCapableMiddleware):
+    """
+    Breaks each request into phases (see listings.timing), returns them in a
+    Server-Timing header and writes one JSON log line per request to the
+    "listings.requests" logger. Removed from the chain when
+    REQUEST_TIMING_ENABLED is off.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def around(self, request):
+        outcome = SimpleNamespace(response=None)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            with observe_queries(timings.on_query):
+                yield outcome
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - start
+
+        response = outcome.response
+        response['Server-Timing'] = timings.server_timing(total)
+        if request_logger.isEnabledFor(logging.INFO):
+            request_logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'route': route_name(request),
+                'status': response.status_code,
+                'duration_ms': round(total * 1000, 3),
+                'phases_ms': {phase: round(seconds * 1000, 3) for phase, seconds in timings.phases.items()},
+                'db_queries': timings.counts.get('db', 0),
+                **timings.fields,
+            }, default=str))
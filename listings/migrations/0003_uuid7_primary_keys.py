@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:28
+
+import listings.uuids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Switch primary key defaults from uuid4 to time-ordered uuid7.
+
+    Defaults are applied by Django, not the database, so this is a
+    state-only change; it avoids SQLite rebuilding every table.
+    Existing rows keep their ids; see the reissue_uuid7 command to
+    rewrite them.
+    """
+
+    dependencies = [
+        ('listings', '0002_payment'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='booking',
+                    name='booking_id',
+                    field=models.UUIDField(default=listings.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='listing',
+                    name='listing_id',
+                    field=models.UUIDField(default=listings.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='payment',
+                    name='payment_id',
+                    field=models.UUIDField(default=listings.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='review',
+                    name='review_id',
+                    field=models.UUIDField(default=listings.uuids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-19 08:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+
+def search_indexes():
+    """
+    PostgreSQL indexes behind the admin search: UPPER(col) text_pattern_ops
+    for ^prefix (istartswith) lookups and GIN tsvector indexes for the
+    full-text fields. They match the expressions Django compiles for those
+    lookups, which other backends do not support, so they are kept out of
+    the model state.
+    """
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+    from django.contrib.postgres.search import SearchVector
+
+    return [
+        ('listing', models.Index(OpClass(Upper('title'), name='text_pattern_ops'), name='listings_title_prefix_idx')),
+        ('listing', models.Index(OpClass(Upper('location'), name='text_pattern_ops'), name='listings_location_prefix_idx')),
+        ('listing', GinIndex(SearchVector('description', config='english'), name='listings_description_fts_idx')),
+        ('review', GinIndex(SearchVector('comment', config='english'), name='reviews_comment_fts_idx')),
+    ]
+
+
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in search_indexes():
+        schema_editor.add_index(apps.get_model('listings', model_name), index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in search_indexes():
+        schema_editor.remove_index(apps.get_model('listings', model_name), index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_uuid7_primary_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['check_in_date'], name='bookings_check_i_04c000_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at'], name='bookings_created_118d3e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['created_at'], name='listings_created_ac7d1b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='reviews_created_53b5d6_idx'),
+        ),
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_admin_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['listing', '-created_at', '-review_id'], name='reviews_listing_ed1965_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='review',
+            name='reviews_listing_f440ca_idx',
+        ),
+    ]
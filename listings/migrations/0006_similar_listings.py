@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_review_listing_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarListings',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similar_listings', serialize=False, to='listings.listing')),
+                ('neighbours', models.BinaryField()),
+                ('scores', models.BinaryField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'similar_listings',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:27
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_similar_listings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='max_price_per_night',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='min_price_per_night',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_listing_price_bounds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='listings.listing')),
+                ('title_length', models.PositiveIntegerField()),
+                ('location_length', models.PositiveIntegerField()),
+                ('description_length', models.PositiveIntegerField()),
+                ('indexed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'search_documents',
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('title_tf', models.PositiveSmallIntegerField(default=0)),
+                ('location_tf', models.PositiveSmallIntegerField(default=0)),
+                ('description_tf', models.PositiveSmallIntegerField(default=0)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='listings.listing')),
+            ],
+            options={
+                'db_table': 'search_postings',
+                'constraints': [models.UniqueConstraint(fields=('term', 'listing'), name='search_posting_term_listing')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:15
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+
+def has_postgis(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")
+        return cursor.fetchone() is not None
+
+
+def add_geography_index(apps, schema_editor):
+    """
+    GiST index on the listing's point for ST_DWithin (listings.geo), when
+    the postgis extension is installed. The expression must stay the same
+    as geo.POSTGIS_POINT for the planner to use it.
+    """
+    if has_postgis(schema_editor.connection):
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS listings_geography_gist_idx ON listings '
+            'USING gist ((ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography))'
+        )
+
+
+def remove_geography_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS listings_geography_gist_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['geohash', 'latitude', 'longitude'], name='listings_geohash_81ea9d_idx'),
+        ),
+        migrations.RunPython(add_geography_index, remove_geography_index),
+    ]
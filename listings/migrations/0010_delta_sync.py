@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:26
+
+import django.utils.timezone
+import listings.uuids
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_listing_coordinates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('tombstone_id', models.UUIDField(default=listings.uuids.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('listing', 'Listing'), ('booking', 'Booking'), ('review', 'Review')], max_length=10)),
+                ('object_id', models.UUIDField()),
+                ('user_id', models.IntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'tombstones',
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'updated_at', 'booking_id'], name='bookings_user_id_6bceab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['updated_at', 'listing_id'], name='listings_updated_7e3c22_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['updated_at', 'review_id'], name='reviews_updated_6a6bf2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at', 'tombstone_id'], name='tombstones_deleted_2e1e1f_idx'),
+        ),
+    ]
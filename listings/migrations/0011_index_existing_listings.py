@@ -0,0 +1,49 @@
+from django.db import migrations
+from django.utils import timezone
+
+from listings.search import FIELDS, document_terms
+
+
+BATCH_SIZE = 2000
+
+
+def index_existing_listings(apps, schema_editor):
+    """
+    Index the listings written before the search index existed, or since
+    without signals, so ?search= finds them right after migrating.
+    """
+    Listing = apps.get_model('listings', 'Listing')
+    SearchPosting = apps.get_model('listings', 'SearchPosting')
+    SearchDocument = apps.get_model('listings', 'SearchDocument')
+    db = schema_editor.connection.alias
+    listings = Listing.objects.using(db).filter(search_document__isnull=True).only('pk', *FIELDS).order_by('pk')
+    last = None
+    while True:
+        page = listings if last is None else listings.filter(pk__gt=last)
+        chunk = list(page[:BATCH_SIZE])
+        if not chunk:
+            break
+        indexed_at = timezone.now()
+        postings = []
+        documents = []
+        for listing in chunk:
+            frequencies, lengths = document_terms(listing)
+            postings.extend(
+                SearchPosting(term=term, listing_id=listing.pk, **{f'{field}_tf': count for field, count in zip(FIELDS, counts)})
+                for term, counts in frequencies.items()
+            )
+            documents.append(SearchDocument(listing_id=listing.pk, indexed_at=indexed_at, **lengths))
+        SearchPosting.objects.using(db).bulk_create(postings, batch_size=BATCH_SIZE)
+        SearchDocument.objects.using(db).bulk_create(documents, batch_size=BATCH_SIZE)
+        last = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_delta_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_existing_listings, migrations.RunPython.noop),
+    ]
@@ -3,10 +3,33 @@ Models for the travel booking application.
 Defines Listing, Booking, and Review models with proper relationships.
 """
 
+import struct
 import uuid
-from django.db import models
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+from .uuids import uuid7
+
+
+class ListingQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, index=True, **kwargs):
+        """
+        bulk_create() sends no post_save, so do what its receivers would:
+        index the new listings for search (listings.search) unless
+        index=False, and invalidate the cached listing lists.
+        """
+        from .cache import invalidate_tags
+        from .search import index_listings
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            if index:
+                # With ignore_conflicts, some of objs may not have been inserted
+                index_listings(self.filter(pk__in=[obj.pk for obj in objs]) if kwargs.get('ignore_conflicts') else objs)
+        invalidate_tags('listings', *{f'listings:location:{obj.location}' for obj in objs})
+        return objs
 
 
 class Listing(models.Model):
@@ -15,7 +38,7 @@ class Listing(models.Model):
     """
     listing_id = models.UUIDField(
         primary_key=True,
-        default=uuid.uuid4,
+        default=uuid7,
         editable=False
     )
     host = models.ForeignKey(
@@ -31,20 +54,56 @@ class Listing(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(0.00)]
     )
+    # Host-defined bounds for dynamic pricing (listings.pricing); listings
+    # without both keep a fixed price
+    min_price_per_night = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0.00)]
+    )
+    max_price_per_night = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0.00)]
+    )
     max_guests = models.PositiveIntegerField(
         validators=[MinValueValidator(1)]
     )
+    # Optional coordinates for map search (listings.geo); geohash is
+    # derived from them on save
+    latitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
     available_from = models.DateField()
     available_to = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ListingQuerySet.as_manager()
+
     class Meta:
         db_table = 'listings'
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['location']),
             models.Index(fields=['price_per_night']),
+            models.Index(fields=['created_at']),
+            # Covers the box test of geo queries, so it needs no table reads
+            models.Index(fields=['geohash', 'latitude', 'longitude']),
+            # Keyset pages of the delta sync feed (listings.sync)
+            models.Index(fields=['updated_at', 'listing_id']),
         ]
 
     def __str__(self):
@@ -64,7 +123,7 @@ class Booking(models.Model):
 
     booking_id = models.UUIDField(
         primary_key=True,
-        default=uuid.uuid4,
+        default=uuid7,
         editable=False
     )
     listing = models.ForeignKey(
@@ -102,6 +161,10 @@ class Booking(models.Model):
             models.Index(fields=['listing', 'check_in_date']),
             models.Index(fields=['user']),
             models.Index(fields=['status']),
+            models.Index(fields=['check_in_date']),
+            models.Index(fields=['created_at']),
+            # Keyset pages of a user's bookings in the delta sync feed
+            models.Index(fields=['user', 'updated_at', 'booking_id']),
         ]
 
     def __str__(self):
@@ -114,7 +177,7 @@ class Review(models.Model):
     """
     review_id = models.UUIDField(
         primary_key=True,
-        default=uuid.uuid4,
+        default=uuid7,
         editable=False
     )
     listing = models.ForeignKey(
@@ -138,8 +201,12 @@ class Review(models.Model):
         db_table = 'reviews'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['listing']),
+            # Keyset pagination of a listing's reviews, newest first
+            models.Index(fields=['listing', '-created_at', '-review_id']),
             models.Index(fields=['rating']),
+            models.Index(fields=['created_at']),
+            # Keyset pages of the delta sync feed
+            models.Index(fields=['updated_at', 'review_id']),
         ]
         # Ensure one review per user per listing
         unique_together = ['listing', 'user']
@@ -162,7 +229,7 @@ class Payment(models.Model):
 
     payment_id = models.UUIDField(
         primary_key=True,
-        default=uuid.uuid4,
+        default=uuid7,
         editable=False
     )
     booking = models.ForeignKey(
@@ -228,4 +295,123 @@ class Payment(models.Model):
         ]
 
     def __str__(self):
-        return f"Payment {self.payment_id} for Booking {self.booking.booking_id} - {self.payment_status}"
\ No newline at end of file
+        return f"Payment {self.payment_id} for Booking {self.booking.booking_id} - {self.payment_status}"
+
+class SimilarListings(models.Model):
+    """
+    Precomputed most similar listings of a listing (listings.recommendations).
+
+    neighbours holds the listing ids as consecutive 16-byte UUIDs, most
+    similar first, and scores their similarities as little-endian float16
+    values.
+    """
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='similar_listings'
+    )
+    neighbours = models.BinaryField()
+    scores = models.BinaryField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'similar_listings'
+
+    def __str__(self):
+        return f"Similar listings of {self.listing_id}"
+
+    def ranked(self):
+        """
+        Return [(listing id, similarity)], most similar first.
+        """
+        neighbours = bytes(self.neighbours)
+        return [
+            (uuid.UUID(bytes=neighbours[offset * 16:(offset + 1) * 16]), score)
+            for offset, (score,) in enumerate(struct.iter_unpack('<e', bytes(self.scores)))
+        ]
+
+
+class SearchDocument(models.Model):
+    """
+    Indexed length, in terms, of each searchable field of a listing
+    (listings.search). Listings without a row are not searchable.
+    """
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+    title_length = models.PositiveIntegerField()
+    location_length = models.PositiveIntegerField()
+    description_length = models.PositiveIntegerField()
+    indexed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'search_documents'
+
+    def __str__(self):
+        return f"Search document of {self.listing_id}"
+
+
+class SearchPosting(models.Model):
+    """
+    Occurrences of one term in one listing, per searchable field
+    (listings.search).
+    """
+    term = models.CharField(max_length=64)
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name='search_postings'
+    )
+    title_tf = models.PositiveSmallIntegerField(default=0)
+    location_tf = models.PositiveSmallIntegerField(default=0)
+    description_tf = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        db_table = 'search_postings'
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'listing'], name='search_posting_term_listing'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} in {self.listing_id}"
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted listing, booking or review, so that the delta sync
+    feed (listings.sync) can tell clients to drop their copy. Written by
+    the delete signals, one bulk insert per delete, and purged after
+    SYNC_TOMBSTONE_RETENTION_DAYS.
+    """
+    KIND_CHOICES = [
+        ('listing', 'Listing'),
+        ('booking', 'Booking'),
+        ('review', 'Review'),
+    ]
+
+    tombstone_id = models.UUIDField(
+        primary_key=True,
+        default=uuid7,
+        editable=False
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.UUIDField()
+    # The booking's user, who alone receives its tombstone. Not a foreign
+    # key: deleting a user deletes their bookings, writing tombstones that
+    # would point to the user being deleted
+    user_id = models.IntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'tombstones'
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['deleted_at', 'tombstone_id']),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.kind} {self.object_id}"
@@ -0,0 +1,16 @@
+"""
+Pagination classes for the API viewsets.
+"""
+
+from rest_framework.pagination import CursorPagination
+
+
+class ReviewCursorPagination(CursorPagination):
+    """
+    Keyset pagination over one listing's reviews, newest first.
+
+    Each page is a range scan of the (listing, -created_at, -review_id)
+    index starting after the cursor position, and no COUNT(*) is run, so
+    deep pages cost the same as the first one.
+    """
+    ordering = ('-created_at', '-review_id')
@@ -0,0 +1,257 @@
+"""
+Occupancy-driven dynamic pricing.
+
+A batch job reprices every listing whose host set both
+min_price_per_night and max_price_per_night. For each listing it
+measures demand over the coming weeks:
+- listing occupancy: booked nights / nights in each of WINDOWS (days from
+  today), combined with WINDOW_WEIGHTS
+- location occupancy: the same over all listings in the location
+- demand = LISTING_WEIGHT * listing + (1 - LISTING_WEIGHT) * location
+
+The price moves by SENSITIVITY * (demand - PRICING_TARGET_OCCUPANCY) of
+itself. The change is capped at PRICING_MAX_CHANGE per run, the result is
+clamped to the host's bounds and rounded to cents. Run nightly, this
+moves each listing towards the target occupancy.
+
+Pending and confirmed bookings are loaded once into NumPy arrays, and
+every listing is priced with array operations. Changed prices are
+written in chunks of PRICING_CHUNK_SIZE, one transaction per chunk. The
+writes send no signals, so the job drops the cached API responses itself.
+"""
+
+import csv
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import USERS_TAG, invalidate_tags
+from .models import Booking, Listing
+
+
+logger = logging.getLogger(__name__)
+
+# Days ahead of today over which occupancy is measured, and their weights
+WINDOWS = (7, 30, 90)
+WINDOW_WEIGHTS = np.array([0.5, 0.3, 0.2])
+# Share of the listing's own occupancy in its demand, the rest is its location's
+LISTING_WEIGHT = 0.6
+# Relative price change per unit of demand above or below the target
+SENSITIVITY = 0.5
+DEMAND_STATUSES = ('pending', 'confirmed')
+
+
+class PricingRun:
+    """
+    Current and suggested prices of every listing, as parallel arrays.
+    """
+
+    def __init__(self, ids, locations, location_names, prices, suggested, occupancy, location_occupancy, priced):
+        self.ids = ids
+        self.locations = locations
+        self.location_names = location_names
+        self.prices = prices
+        self.suggested = suggested
+        self.occupancy = occupancy
+        self.location_occupancy = location_occupancy
+        self.priced = priced
+        self.changed = np.flatnonzero(priced & (suggested != prices))
+
+    def location_summary(self):
+        """
+        Per location: listings, repriced listings, occupancy and mean price change.
+        """
+        summary = []
+        for code, name in enumerate(self.location_names):
+            in_location = self.locations == code
+            changed = self.changed[self.locations[self.changed] == code]
+            change = self.suggested[changed] / self.prices[changed] - 1
+            summary.append({
+                'location': name,
+                'listings': int(in_location.sum()),
+                'priced': int((in_location & self.priced).sum()),
+                'changed': len(changed),
+                'occupancy': round(float(self.location_occupancy[code]), 3),
+                'mean_change': round(float(change.mean()), 4) if len(changed) else 0.0,
+            })
+        return summary
+
+    def diff(self, limit=None):
+        """
+        Yield one dict per changed listing, or only the `limit` largest
+        relative changes, largest first.
+        """
+        indexes = self.changed
+        if limit is not None:
+            change = np.abs(self.suggested[indexes] / self.prices[indexes] - 1)
+            indexes = indexes[np.argsort(-change, kind='stable')[:limit]]
+        for index in indexes:
+            yield {
+                'listing_id': self.ids[index],
+                'location': self.location_names[self.locations[index]],
+                'occupancy': round(float(self.occupancy[index]), 3),
+                'old_price': f'{self.prices[index]:.2f}',
+                'new_price': f'{self.suggested[index]:.2f}',
+                'change': round(float(self.suggested[index] / self.prices[index] - 1), 4),
+            }
+
+    def write_diff(self, path):
+        with open(path, 'w', newline='') as diff_file:
+            writer = csv.DictWriter(
+                diff_file, ['listing_id', 'location', 'occupancy', 'old_price', 'new_price', 'change'],
+            )
+            writer.writeheader()
+            writer.writerows(self.diff())
+
+
+def booked_nights(listing_rows, check_in, check_out, count, window):
+    """
+    Booked nights per listing in the `window` days from today. Dates are
+    day offsets from today; bookings may start before or end after it.
+    """
+    nights = np.clip(check_out, 0, window) - np.clip(check_in, 0, window)
+    return np.bincount(listing_rows, weights=nights, minlength=count)
+
+
+def suggest_prices(prices, lower, upper, locations, listing_rows, check_in, check_out, target=None):
+    """
+    Vectorized pricing of N listings.
+
+    Args:
+        prices, lower, upper (ndarray): Current price and bounds (NaN without)
+        locations (ndarray): Location code per listing
+        listing_rows, check_in, check_out (ndarray): Per booking, the listing's
+            row and the stay as day offsets from today
+        target (float): Target occupancy (default PRICING_TARGET_OCCUPANCY)
+
+    Returns:
+        tuple: (suggested prices, listing occupancy, occupancy per location code, priced mask)
+    """
+    target = settings.PRICING_TARGET_OCCUPANCY if target is None else target
+    count = len(prices)
+    listings_per_location = np.bincount(locations, minlength=locations.max() + 1 if count else 0)
+    occupancy = np.zeros(count)
+    location_occupancy = np.zeros(len(listings_per_location))
+    for window, weight in zip(WINDOWS, WINDOW_WEIGHTS):
+        nights = booked_nights(listing_rows, check_in, check_out, count, window)
+        # Overlapping bookings of one listing can exceed the window
+        occupancy += weight * np.minimum(nights / window, 1.0)
+        location_nights = np.bincount(locations, weights=nights, minlength=len(listings_per_location))
+        location_occupancy += weight * np.minimum(
+            location_nights / (np.maximum(listings_per_location, 1) * window), 1.0,
+        )
+
+    demand = LISTING_WEIGHT * occupancy + (1 - LISTING_WEIGHT) * location_occupancy[locations]
+    change = np.clip(SENSITIVITY * (demand - target), -settings.PRICING_MAX_CHANGE, settings.PRICING_MAX_CHANGE)
+    priced = ~np.isnan(lower) & ~np.isnan(upper)
+    suggested = np.where(priced, np.clip(prices * (1 + change), lower, upper), prices)
+    suggested = np.round(suggested, 2)
+    return suggested, occupancy, location_occupancy, priced
+
+
+def load_and_price(today=None):
+    """
+    Load every listing and the bookings in the longest window, and price them.
+    """
+    today = today or timezone.localdate()
+    ids, locations, prices, lower, upper = [], [], [], [], []
+    location_codes = {}
+    for pk, location, price, min_price, max_price in Listing.objects.order_by().values_list(
+        'pk', 'location', 'price_per_night', 'min_price_per_night', 'max_price_per_night',
+    ).iterator(chunk_size=10_000):
+        ids.append(pk)
+        locations.append(location_codes.setdefault(location, len(location_codes)))
+        prices.append(float(price))
+        lower.append(float(min_price) if min_price is not None else np.nan)
+        upper.append(float(max_price) if max_price is not None else np.nan)
+    index = {pk: row for row, pk in enumerate(ids)}
+
+    listing_rows, check_in, check_out = [], [], []
+    for listing_id, start, end in Booking.objects.filter(
+        status__in=DEMAND_STATUSES,
+        check_in_date__lt=today + timedelta(days=max(WINDOWS)),
+        check_out_date__gt=today,
+    ).order_by().values_list('listing_id', 'check_in_date', 'check_out_date').iterator(chunk_size=10_000):
+        # Listings created since the listing query are priced by the next run
+        if listing_id not in index:
+            continue
+        listing_rows.append(index[listing_id])
+        check_in.append((start - today).days)
+        check_out.append((end - today).days)
+
+    prices = np.array(prices)
+    locations = np.array(locations, dtype=np.int64)
+    suggested, occupancy, location_occupancy, priced = suggest_prices(
+        prices, np.array(lower), np.array(upper), locations,
+        np.array(listing_rows, dtype=np.int64), np.array(check_in), np.array(check_out),
+    )
+    return PricingRun(
+        ids, locations, list(location_codes), prices, suggested, occupancy, location_occupancy, priced,
+    )
+
+
+def _update_from_values(prices, now):
+    """
+    Set the price of each (listing id, Decimal price) pair with one
+    UPDATE ... FROM (VALUES ...) statement (PostgreSQL, SQLite 3.33+).
+    """
+    table = connection.ops.quote_name(Listing._meta.db_table)
+    pk_column = connection.ops.quote_name(Listing._meta.pk.column)
+    row = '(CAST(%s AS uuid), CAST(%s AS numeric))' if connection.vendor == 'postgresql' else '(%s, %s)'
+    params = [Listing._meta.get_field('updated_at').get_db_prep_value(now, connection)]
+    for pk, price in prices:
+        params += [
+            Listing._meta.pk.get_db_prep_value(pk, connection),
+            connection.ops.adapt_decimalfield_value(price, 10, 2),
+        ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET price_per_night = v.column2, updated_at = %s '
+            f'FROM (VALUES {", ".join([row] * len(prices))}) AS v WHERE {table}.{pk_column} = v.column1',
+            params,
+        )
+
+
+def _supports_update_from():
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 33)
+
+
+def apply_prices(run):
+    """
+    Write the changed prices in chunks of PRICING_CHUNK_SIZE.
+
+    On PostgreSQL and SQLite a chunk is a single UPDATE ... FROM (VALUES
+    ...). Other databases use bulk_update, whose CASE WHEN expressions
+    take about 30 times longer to build than the statement takes to run.
+
+    Returns:
+        int: Number of listings updated
+    """
+    now = timezone.now()
+    chunk_size = settings.PRICING_CHUNK_SIZE
+    update_from = _supports_update_from()
+    for start in range(0, len(run.changed), chunk_size):
+        prices = [
+            (run.ids[index], Decimal(f'{run.suggested[index]:.2f}'))
+            for index in run.changed[start:start + chunk_size]
+        ]
+        with transaction.atomic():
+            if update_from:
+                _update_from_values(prices, now)
+            else:
+                Listing.objects.bulk_update(
+                    [Listing(pk=pk, price_per_night=price, updated_at=now) for pk, price in prices],
+                    ['price_per_night', 'updated_at'],
+                )
+    if len(run.changed):
+        # Listing data is in most cached responses; every entry depends on USERS_TAG
+        invalidate_tags(USERS_TAG)
+    logger.info('Dynamic pricing updated %d listings', len(run.changed))
+    return len(run.changed)
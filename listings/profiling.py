@@ -0,0 +1,84 @@
+"""
+On-demand request profiles stored on disk.
+
+Each profiled request produces two files in PROFILING_DIR sharing an id:
+<id>.prof, a cProfile dump readable with pstats/snakeviz, and <id>.json
+with the request line, status, duration and SQL timings. Ids start with
+a UTC timestamp so that they sort chronologically. Only the newest
+PROFILING_KEEP profiles are kept.
+"""
+
+import io
+import json
+import os
+import pstats
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+
+def _path(profile_id, extension):
+    return os.path.join(settings.PROFILING_DIR, f'{profile_id}.{extension}')
+
+
+def new_profile_id():
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def save_profile(profile_id, profiler, metadata):
+    """
+    Write the cProfile stats and the metadata of one request, then prune old profiles.
+    """
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    profiler.dump_stats(_path(profile_id, 'prof'))
+    with open(_path(profile_id, 'json'), 'w') as metadata_file:
+        json.dump({'id': profile_id, **metadata}, metadata_file, indent=2)
+    prune_profiles(settings.PROFILING_KEEP)
+
+
+def list_profiles():
+    """
+    Return the metadata of the stored profiles, newest first.
+    """
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(settings.PROFILING_DIR), reverse=True):
+        if name.endswith('.json'):
+            with open(os.path.join(settings.PROFILING_DIR, name)) as metadata_file:
+                profiles.append(json.load(metadata_file))
+    return profiles
+
+
+def load_profile(profile_id):
+    """
+    Return (metadata, pstats.Stats) for a stored profile.
+    """
+    with open(_path(profile_id, 'json')) as metadata_file:
+        metadata = json.load(metadata_file)
+    return metadata, pstats.Stats(_path(profile_id, 'prof'), stream=io.StringIO())
+
+
+def format_stats(stats, sort='cumulative', limit=25):
+    """
+    Render the top `limit` functions of a profile as text.
+    """
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def prune_profiles(keep):
+    profiles = list_profiles()
+    for metadata in profiles[keep:]:
+        delete_profile(metadata['id'])
+
+
+def delete_profile(profile_id):
+    for extension in ('prof', 'json'):
+        try:
+            os.remove(_path(profile_id, extension))
+        except FileNotFoundError:
+            pass
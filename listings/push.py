@@ -0,0 +1,473 @@
+"""
+Server-sent booking and payment status changes for the ASGI application.
+
+After the Chapa redirect a client opens /api/payments/{id}/events/ (or
+/api/bookings/{id}/events/) with an EventSource instead of polling
+/api/payments/verify/ and /api/bookings/{id}/. The stream starts with the
+current status and then sends every status change as an event:
+
+    event: payment
+    data: {"type": "payment", "id": "...", "status": "completed", "updated_at": "..."}
+
+Comment lines are sent every PUSH_HEARTBEAT_SECONDS so proxies do not drop
+an idle connection, and the stream ends after PUSH_STREAM_SECONDS; the
+browser reconnects on its own and gets the status again, so a change is
+never missed across reconnects.
+
+Changes are published by the Booking and Payment save signals and by the
+set-based operations in listings.bulk, once their transaction commits.
+The broker is chosen by PUSH_BROKER_URL:
+- memory:// delivers to the subscribers of the publishing process. Enough
+  for a single worker, or when writes and streams are served by the same
+  process.
+- redis://host:port/db publishes through Redis pub/sub, so every worker
+  and node receives every change. Requires the redis package.
+
+The streams are served by StatusStreamApplication in front of the Django
+ASGI application (asgi.py); under WSGI these paths are not found. An
+open stream is a suspended coroutine and a small queue; it holds no
+thread and no database connection.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import threading
+import uuid
+import weakref
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from corsheaders.conf import conf as cors_conf
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Booking, Payment
+
+
+logger = logging.getLogger(__name__)
+
+# Event type -> (model, status field)
+KINDS = {
+    'booking': (Booking, 'status'),
+    'payment': (Payment, 'payment_status'),
+}
+
+STREAM_PATH = re.compile(
+    r'^/api/(?P<kind>booking|payment)s/(?P<pk>[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})/events/$'
+)
+# Milliseconds the browser waits before reconnecting
+RETRY_MS = 3000
+REDIS_RECONNECT_SECONDS = 1
+# Statuses read per query
+READ_BATCH_SIZE = 500
+
+
+def channel_name(kind, pk):
+    return f'{kind}:{pk}'
+
+
+def encode_event(kind, pk, status, updated_at):
+    return JSONEncoder(separators=(',', ':')).encode({
+        'type': kind, 'id': pk, 'status': status, 'updated_at': updated_at,
+    })
+
+
+class Subscription:
+    """
+    The events of some channels for one client, queued on its event loop.
+    """
+
+    def __init__(self, broker, channels, loop):
+        self.broker = broker
+        self.channels = channels
+        self.loop = loop
+        # A full queue drops its oldest message: a client this far behind
+        # only needs the latest statuses
+        self.messages = deque(maxlen=settings.PUSH_QUEUE_SIZE)
+        self.waiter = None
+        self.closed = False
+
+    def put(self, message):
+        self.messages.append(message)
+        if self.waiter is not None:
+            _wake(self.waiter)
+
+    async def get(self, timeout):
+        """
+        The next message, or None after `timeout` seconds without one.
+
+        A future and a timer rather than asyncio.wait_for, which creates a
+        task per call: with thousands of idle streams every heartbeat
+        goes through here.
+        """
+        if not self.messages:
+            self.waiter = self.loop.create_future()
+            timer = self.loop.call_later(timeout, _wake, self.waiter)
+            try:
+                await self.waiter
+            finally:
+                timer.cancel()
+                self.waiter = None
+        return self.messages.popleft() if self.messages else None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class InProcessBroker:
+    """
+    Delivers a published message to the subscribers of this process.
+
+    publish() may be called from any thread; the message is handed to each
+    subscriber's event loop with one call_soon_threadsafe per loop.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+        self.count = 0
+
+    def subscribe(self, *channels):
+        """
+        Subscribe to `channels`; call from the event loop that reads the
+        subscription.
+        """
+        subscription = Subscription(self, channels, asyncio.get_running_loop())
+        with self.lock:
+            for channel in channels:
+                self.subscribers[channel].add(subscription)
+            self.count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            for channel in subscription.channels:
+                subscribers = self.subscribers[channel]
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[channel]
+            self.count -= 1
+
+    async def ready(self):
+        """
+        Wait until messages published from now on reach the subscribers.
+        """
+
+    def subscriber_count(self):
+        return self.count
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        by_loop = defaultdict(list)
+        for subscription in subscribers:
+            by_loop[subscription.loop].append(subscription)
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_put_all, group, message)
+            except RuntimeError:
+                # The loop is closed; its subscribers are gone with it
+                for subscription in group:
+                    subscription.close()
+
+
+def _put_all(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.put(message)
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Publishes through Redis pub/sub. Each process runs one listener per
+    event loop on a pattern subscription to every channel and hands the
+    messages to its local subscribers, so the number of Redis connections
+    does not grow with the number of clients.
+    """
+
+    def __init__(self, url, prefix='push:'):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as error:
+            raise ImproperlyConfigured('PUSH_BROKER_URL=redis:// requires the redis package') from error
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+        self.async_redis = redis.asyncio
+        # Event loop -> (listener task, set once it is subscribed)
+        self.listeners = {}
+
+    def subscribe(self, *channels):
+        loop = asyncio.get_running_loop()
+        listener = self.listeners.get(loop)
+        if listener is None or listener[0].done():
+            subscribed = asyncio.Event()
+            self.listeners[loop] = (loop.create_task(self.listen(subscribed)), subscribed)
+        return super().subscribe(*channels)
+
+    async def ready(self):
+        await self.listeners[asyncio.get_running_loop()][1].wait()
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, message)
+
+    async def listen(self, subscribed):
+        while True:
+            client = self.async_redis.Redis.from_url(self.url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(self.prefix + '*')
+                    subscribed.set()
+                    async for message in pubsub.listen():
+                        if message['type'] == 'pmessage':
+                            channel = message['channel'].decode()[len(self.prefix):]
+                            self.deliver(channel, message['data'].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Streams opened meanwhile wait for the new subscription
+                subscribed.clear()
+                logger.exception('Push listener lost its Redis connection')
+            finally:
+                await client.aclose()
+            await asyncio.sleep(REDIS_RECONNECT_SECONDS)
+
+
+_brokers = {}
+
+
+def get_broker():
+    url = settings.PUSH_BROKER_URL
+    if url not in _brokers:
+        scheme = urlsplit(url).scheme
+        if scheme == 'memory':
+            _brokers[url] = InProcessBroker()
+        elif scheme in ('redis', 'rediss', 'unix'):
+            _brokers[url] = RedisBroker(url)
+        else:
+            raise ImproperlyConfigured(f'Unsupported PUSH_BROKER_URL scheme: {scheme}')
+    return _brokers[url]
+
+
+def _publish(events):
+    broker = get_broker()
+    for channel, message in events:
+        try:
+            broker.publish(channel, message)
+        except Exception:
+            # Clients get the status when they reconnect
+            logger.exception('Could not publish %s', channel)
+
+
+def publish_statuses(kind, changes, using=None):
+    """
+    Publish `changes`, [(pk, status, updated_at)] of `kind` objects, once
+    the current transaction commits.
+    """
+    events = [
+        (channel_name(kind, pk), encode_event(kind, pk, status, updated_at))
+        for pk, status, updated_at in changes
+    ]
+    if events:
+        transaction.on_commit(lambda: _publish(events), using=using)
+
+
+def read_statuses(keys):
+    """
+    {(kind, pk): (status, updated_at)} for the (kind, pk) `keys` that exist.
+    """
+    statuses = {}
+    pks = defaultdict(list)
+    for kind, pk in keys:
+        pks[kind].append(pk)
+    for kind, kind_pks in pks.items():
+        model, field = KINDS[kind]
+        for start in range(0, len(kind_pks), READ_BATCH_SIZE):
+            rows = model.objects.filter(pk__in=kind_pks[start:start + READ_BATCH_SIZE])
+            for pk, status, updated_at in rows.values_list('pk', field, 'updated_at'):
+                statuses[kind, pk] = (status, updated_at)
+        # No request_finished follows to apply CONN_MAX_AGE
+        connection = connections[rows.db]
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+    return statuses
+
+
+class StatusReader:
+    """
+    Reads the statuses streams start with. The streams of one event loop
+    that open while a read is running are read together by the next one,
+    so a burst of connections, such as every client reconnecting after a
+    deploy, takes a few queries rather than one sync_to_async round trip
+    per stream.
+    """
+
+    def __init__(self):
+        # (kind, pk) -> future of its status
+        self.pending = {}
+        self.reading = None
+
+    async def read(self, kind, pk):
+        """
+        (status, updated_at) of the `kind` object `pk`, or None if there is none.
+        """
+        future = self.pending.get((kind, pk))
+        if future is None:
+            future = self.pending[kind, pk] = asyncio.get_running_loop().create_future()
+            if self.reading is None or self.reading.done():
+                self.reading = asyncio.ensure_future(self.read_pending())
+        # Other streams wait for the same future
+        return await asyncio.shield(future)
+
+    async def read_pending(self):
+        while self.pending:
+            batch, self.pending = self.pending, {}
+            try:
+                statuses = await sync_to_async(read_statuses)(list(batch))
+            except Exception as error:
+                for future in batch.values():
+                    future.set_exception(error)
+            else:
+                for key, future in batch.items():
+                    future.set_result(statuses.get(key))
+
+
+_readers = weakref.WeakKeyDictionary()
+
+
+def read_status(kind, pk):
+    """
+    Await the status of the `kind` object `pk` through the reader of the
+    running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _readers:
+        _readers[loop] = StatusReader()
+    return _readers[loop].read(kind, pk)
+
+
+def format_event(kind, message):
+    return f'event: {kind}\ndata: {message}\n\n'.encode()
+
+
+def cors_headers(origin):
+    """
+    The CORS response headers django-cors-headers would add for `origin`.
+    """
+    if origin is None:
+        return []
+    origin = origin.decode('latin-1')
+    if not (cors_conf.CORS_ALLOW_ALL_ORIGINS or origin in cors_conf.CORS_ALLOWED_ORIGINS):
+        return []
+    headers = [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'origin')]
+    if cors_conf.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'access-control-allow-credentials', b'true'))
+    return headers
+
+
+class StatusStreamApplication:
+    """
+    ASGI application serving GET /api/bookings/{id}/events/ and
+    /api/payments/{id}/events/ and passing every other request to
+    `application`, the Django ASGI application (see asgi.py).
+
+    The streams bypass Django's request handling: Django runs the
+    synchronous parts of each request (the request signals and most
+    middleware) in a thread of its own that lives as long as the request,
+    so a stream served by a view would hold a thread until it closes.
+    Here the status reads are batched by StatusReader and an open stream
+    holds no thread. There is no session or user to load; the CORS
+    headers are added here.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        match = STREAM_PATH.match(scope['path']) if scope['type'] == 'http' else None
+        if match is None:
+            return await self.application(scope, receive, send)
+        return await self.serve(scope, receive, send, match['kind'], uuid.UUID(match['pk']))
+
+    async def serve(self, scope, receive, send, kind, pk):
+        headers = cors_headers(dict(scope['headers']).get(b'origin'))
+        if scope['method'] != 'GET':
+            detail = f'Method "{scope["method"]}" not allowed.'
+            return await respond(send, 405, detail, headers + [(b'allow', b'GET')])
+        broker = get_broker()
+        if broker.subscriber_count() >= settings.PUSH_MAX_SUBSCRIBERS:
+            retry_after = str(RETRY_MS // 1000).encode()
+            return await respond(send, 503, 'Too many open event streams, retry later.',
+                                 headers + [(b'retry-after', retry_after)])
+
+        subscription = broker.subscribe(channel_name(kind, pk))
+        try:
+            await broker.ready()
+            # Read after subscribing, so a change committed meanwhile is
+            # either in the snapshot or queued
+            current = await read_status(kind, pk)
+            if current is None:
+                model = KINDS[kind][0]
+                return await respond(send, 404, f'No {model._meta.object_name} matches the given query.', headers)
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': headers + [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    # Tells nginx not to buffer the events
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            first = f'retry: {RETRY_MS}\n\n'.encode() + format_event(kind, encode_event(kind, pk, *current))
+            events = asyncio.ensure_future(self.send_events(send, kind, subscription, first))
+            disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+            try:
+                await asyncio.wait((events, disconnect), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                events.cancel()
+                disconnect.cancel()
+            if events.done() and not events.cancelled() and events.exception() is None:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            subscription.close()
+
+    async def send_events(self, send, kind, subscription, first):
+        await send({'type': 'http.response.body', 'body': first, 'more_body': True})
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.PUSH_STREAM_SECONDS
+        while (remaining := deadline - loop.time()) > 0:
+            message = await subscription.get(min(settings.PUSH_HEARTBEAT_SECONDS, remaining))
+            body = b': keep-alive\n\n' if message is None else format_event(kind, message)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def respond(send, status, detail, headers):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers + [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'detail': detail}).encode()})
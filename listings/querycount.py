@@ -0,0 +1,154 @@
+"""
+SQL query instrumentation.
+
+Every database connection gets one permanent execute wrapper that reports
+each statement and its duration to the observers registered in the
+current context with observe_queries(). The observers live in a context
+variable rather than on the connection: under ASGI, the ORM runs queries
+for many concurrent requests on the same thread and connection, and the
+context is what tells them apart.
+
+QueryRecorder is such an observer. It records each statement without
+needing DEBUG=True, and groups statements by their normalized SQL
+(literals and IN lists collapsed), which is how N+1 patterns show up: the
+same SELECT repeated once per row.
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """
+    Reduce a statement to its shape: literals become ?, IN lists become IN (...).
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+_observers = ContextVar('query_observers', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    observers = _observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        alias = context['connection'].alias
+        for observer in observers:
+            observer(alias, sql, duration)
+
+
+def install(connection):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+@receiver(connection_created)
+def install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+@contextmanager
+def observe_queries(observer):
+    """
+    Call observer(alias, sql, seconds) for every statement executed in the
+    current context (including sync_to_async calls made from it) while
+    the block runs.
+    """
+    # Connections opened before this module was imported
+    for alias in connections:
+        install(connections[alias])
+    token = _observers.set(_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        _observers.reset(token)
+
+
+class QueryCounter:
+    """
+    Observer for observe_queries() that only counts the statements and sums
+    their time, in seconds, without keeping them like QueryRecorder.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+
+    def __call__(self, alias, sql, duration):
+        self.count += 1
+        self.total_time += duration
+
+
+class QueryRecorder:
+    """
+    Records the SQL executed on the given database aliases (all by default).
+
+    Usage:
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.total_time, recorder.duplicates()
+    """
+
+    def __init__(self, using=None):
+        self.using = using
+        self.queries = []
+        self._observing = None
+
+    def __enter__(self):
+        self.queries = []
+        self._observing = observe_queries(self._record)
+        self._observing.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._observing.__exit__(*exc_info)
+
+    def _record(self, alias, sql, duration):
+        if self.using is None or alias in self.using:
+            self.queries.append({'alias': alias, 'sql': sql, 'time': duration})
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        """
+        Total time spent in the database, in seconds.
+        """
+        return sum(query['time'] for query in self.queries)
+
+    def duplicates(self, minimum=2):
+        """
+        Return {normalized sql: count} for statements executed at least `minimum` times.
+        """
+        counts = Counter(normalize_sql(query['sql']) for query in self.queries)
+        return {sql: count for sql, count in counts.most_common() if count >= minimum}
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'time_ms': round(self.total_time * 1000, 3),
+            'duplicates': self.duplicates(),
+        }
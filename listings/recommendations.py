@@ -0,0 +1,309 @@
+"""
+Similar-listing recommendations ("guests also viewed").
+
+Each listing is described by NumPy feature arrays:
+- numeric: log price, log capacity and average rating, standardized and
+  weighted (NUMERIC_WEIGHTS)
+- co-booking: a random projection of the users who booked the listing.
+  Every user gets a random Gaussian vector; a listing's vector is the
+  normalized sum of its guests' vectors, so the dot product of two
+  listings estimates the cosine of their guest sets.
+
+Similarity is W_NUMERIC * exp(-|a - b|^2 / 2) + W_COBOOKING * cos(a, b),
+between 0 and 1. The neighbours of a listing are taken from its own
+location only. A full build sorts every location by price and scores
+each listing against its price block and the two adjacent ones
+(BLOCK_SIZE listings each), so the cost grows linearly with the number
+of listings instead of quadratically. An incremental refresh scores the
+changed listings against every listing in their location.
+
+The top K per listing are stored in SimilarListings rows, as 16-byte ids
+and float16 scores, by refresh_similar_listings(). It runs from the
+periodic refresh_similar_listings Celery task and `manage.py
+build_similar`. A refresh recomputes only the listings that changed
+since their row was computed: the listing itself, its bookings or its
+reviews. Other listings' lists are brought up to date by the next full
+build.
+"""
+
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg, F, Q
+from django.utils import timezone
+
+from .cache import invalidate_tags
+from .models import Booking, Listing, Review, SimilarListings
+
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_TAG = 'similar'
+
+# Weight of log price, log capacity and average rating in the distance
+NUMERIC_WEIGHTS = np.array([1.0, 0.5, 0.5], dtype=np.float32)
+W_NUMERIC = 0.6
+W_COBOOKING = 0.4
+# Dimensions of the co-booking projection
+COBOOKING_DIMS = 32
+# Listings per price block in a full build
+BLOCK_SIZE = 1024
+# Rows scored at once in an incremental refresh
+ROW_CHUNK = 256
+# An incremental refresh of more than this share of the listings (and
+# more than ROW_CHUNK of them), e.g. after the nightly repricing, runs as
+# a full build, which is cheaper
+FULL_BUILD_SHARE = 0.05
+WRITE_BATCH_SIZE = 1000
+
+
+class ListingFeatures:
+    """
+    Feature arrays of N listings, row i describing ids[i].
+    """
+
+    def __init__(self, ids, locations, numeric, cobooking):
+        self.ids = ids
+        self.locations = locations
+        self.numeric = numeric
+        self.cobooking = cobooking
+        self.squared_norms = (numeric ** 2).sum(axis=1)
+        # Ids as 16-byte strings, so a row of neighbours packs with tobytes()
+        self.id_bytes = np.array([pk.bytes for pk in ids], dtype='S16')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def similarity(self, rows, candidates):
+        """
+        Similarity matrix of `rows` (index array) against `candidates`.
+        """
+        distance = (
+            self.squared_norms[rows, None]
+            + self.squared_norms[None, candidates]
+            - 2 * self.numeric[rows] @ self.numeric[candidates].T
+        )
+        np.maximum(distance, 0, out=distance)
+        scores = W_NUMERIC * np.exp(-distance / 2)
+        scores += W_COBOOKING * (self.cobooking[rows] @ self.cobooking[candidates].T)
+        return scores
+
+
+def build_features(ids, locations, prices, guests, ratings, booking_listings, booking_users, seed=0):
+    """
+    Build ListingFeatures from per-listing arrays.
+
+    Args:
+        ids (list): Listing ids, in row order
+        locations (ndarray): Integer location code per listing
+        prices, guests (ndarray): Price per night and capacity per listing
+        ratings (ndarray): Average rating per listing, NaN without reviews
+        booking_listings (ndarray): Row index of the listing of each booking
+        booking_users (ndarray): User id of each booking
+        seed (int): Seed of the users' random vectors
+    """
+    ratings = np.where(np.isnan(ratings), np.nanmean(ratings) if np.isfinite(ratings).any() else 0.0, ratings)
+    numeric = np.column_stack([
+        np.log1p(np.asarray(prices, dtype=np.float32)),
+        np.log1p(np.asarray(guests, dtype=np.float32)),
+        np.asarray(ratings, dtype=np.float32),
+    ])
+    std = numeric.std(axis=0)
+    numeric = (numeric - numeric.mean(axis=0)) / np.where(std > 0, std, 1)
+    numeric = (numeric * NUMERIC_WEIGHTS).astype(np.float32)
+
+    cobooking = np.zeros((len(ids), COBOOKING_DIMS), dtype=np.float32)
+    if len(booking_listings):
+        # One (listing, user) pair per guest, however often they booked it
+        pairs = np.unique(np.column_stack([booking_listings, booking_users]), axis=0)
+        users, user_rows = np.unique(pairs[:, 1], return_inverse=True)
+        user_vectors = np.random.default_rng(seed).standard_normal(
+            (len(users), COBOOKING_DIMS), dtype=np.float32,
+        )
+        # One dimension at a time keeps memory at one float per booking
+        for dim in range(COBOOKING_DIMS):
+            cobooking[:, dim] = np.bincount(pairs[:, 0], weights=user_vectors[user_rows, dim], minlength=len(ids))
+        norms = np.linalg.norm(cobooking, axis=1, keepdims=True)
+        np.divide(cobooking, norms, out=cobooking, where=norms > 0)
+
+    return ListingFeatures(ids, np.asarray(locations), numeric, cobooking)
+
+
+def load_features():
+    """
+    Build ListingFeatures for every listing in the database.
+    """
+    ids, locations, prices, guests = [], [], [], []
+    location_codes = {}
+    for pk, location, price, max_guests in (
+        Listing.objects.order_by().values_list('pk', 'location', 'price_per_night', 'max_guests').iterator()
+    ):
+        ids.append(pk)
+        locations.append(location_codes.setdefault(location, len(location_codes)))
+        prices.append(float(price))
+        guests.append(max_guests)
+    index = {pk: row for row, pk in enumerate(ids)}
+
+    ratings = np.full(len(ids), np.nan)
+    for listing_id, rating in Review.objects.order_by().values('listing_id').annotate(
+        rating=Avg('rating'),
+    ).values_list('listing_id', 'rating'):
+        # Listings created since the listing query are left for the next run
+        if listing_id in index:
+            ratings[index[listing_id]] = rating
+
+    booking_listings, booking_users = [], []
+    for listing_id, user_id in (
+        Booking.objects.exclude(status='cancelled').order_by().values_list('listing_id', 'user_id').iterator()
+    ):
+        if listing_id in index:
+            booking_listings.append(index[listing_id])
+            booking_users.append(user_id)
+
+    return build_features(
+        ids, locations, prices, guests, ratings,
+        np.array(booking_listings, dtype=np.int64), np.array(booking_users, dtype=np.int64),
+    )
+
+
+def _top_k(scores, rows, candidates, k):
+    """
+    Top-k candidates per row of a similarity matrix, excluding the row itself.
+    Returns (indexes, scores), padded with -1 and 0 when there are fewer.
+    """
+    scores[rows[:, None] == candidates[None, :]] = -np.inf
+    take = min(k, len(candidates) - 1)
+    neighbours = np.full((len(rows), k), -1, dtype=np.int64)
+    similarities = np.zeros((len(rows), k), dtype=np.float32)
+    if take <= 0:
+        return neighbours, similarities
+    best = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    neighbours[:, :take] = candidates[np.take_along_axis(best, order, axis=1)]
+    similarities[:, :take] = np.take_along_axis(best_scores, order, axis=1)
+    return neighbours, similarities
+
+
+def top_k_neighbours(features, k, block_size=BLOCK_SIZE):
+    """
+    Top-k neighbours of every listing (full build).
+
+    Listings of each location are sorted by price (the first numeric
+    column) and split into blocks; a block is scored against itself and
+    the adjacent blocks.
+
+    Returns:
+        tuple: (N x k neighbour row indexes, N x k float32 similarities)
+    """
+    neighbours = np.full((len(features), k), -1, dtype=np.int64)
+    similarities = np.zeros((len(features), k), dtype=np.float32)
+    order = np.lexsort((features.numeric[:, 0], features.locations))
+    boundaries = np.flatnonzero(np.diff(features.locations[order])) + 1
+    for group in np.split(order, boundaries):
+        blocks = [group[start:start + block_size] for start in range(0, len(group), block_size)]
+        for position, rows in enumerate(blocks):
+            candidates = np.concatenate(blocks[max(0, position - 1):position + 2])
+            neighbours[rows], similarities[rows] = _top_k(
+                features.similarity(rows, candidates), rows, candidates, k,
+            )
+    return neighbours, similarities
+
+
+def refresh_neighbours(features, rows, k):
+    """
+    Top-k neighbours of the listings at `rows`, each scored against every
+    listing in its location (incremental refresh).
+    """
+    neighbours = np.full((len(rows), k), -1, dtype=np.int64)
+    similarities = np.zeros((len(rows), k), dtype=np.float32)
+    rows = np.asarray(rows, dtype=np.int64)
+    for location in np.unique(features.locations[rows]):
+        positions = np.flatnonzero(features.locations[rows] == location)
+        candidates = np.flatnonzero(features.locations == location)
+        for start in range(0, len(positions), ROW_CHUNK):
+            chunk = positions[start:start + ROW_CHUNK]
+            neighbours[chunk], similarities[chunk] = _top_k(
+                features.similarity(rows[chunk], candidates), rows[chunk], candidates, k,
+            )
+    return neighbours, similarities
+
+
+def encode(features, neighbours, similarities):
+    """
+    Pack one row of neighbour indexes and scores into the SimilarListings
+    byte format, dropping the -1 padding.
+    """
+    keep = neighbours >= 0
+    return features.id_bytes[neighbours[keep]].tobytes(), similarities[keep].astype('<f2').tobytes()
+
+
+def changed_listing_ids():
+    """
+    Listings without a SimilarListings row, or whose row predates a change
+    to the listing, its bookings or its reviews.
+
+    One query per table rather than an OR across both reverse joins, which
+    would multiply each listing's bookings by its reviews before DISTINCT.
+    """
+    changed = set(
+        Listing.objects.filter(
+            Q(similar_listings__isnull=True) | Q(updated_at__gt=F('similar_listings__computed_at'))
+        ).order_by().values_list('pk', flat=True)
+    )
+    for model in (Booking, Review):
+        changed.update(
+            model.objects.filter(updated_at__gt=F('listing__similar_listings__computed_at'))
+            .order_by().values_list('listing_id', flat=True).distinct()
+        )
+    return changed
+
+
+def refresh_similar_listings(full=False, k=None):
+    """
+    Recompute and store the top-k similar listings.
+
+    Args:
+        full (bool): Recompute every listing instead of the changed ones
+        k (int): Neighbours per listing (default SIMILAR_LISTINGS_K)
+
+    Returns:
+        int: Number of listings recomputed
+    """
+    k = k or settings.SIMILAR_LISTINGS_K
+    computed_at = timezone.now()
+    changed = None if full else changed_listing_ids()
+    if changed is not None and not changed:
+        return 0
+
+    features = load_features()
+    if changed is not None and len(changed) > max(ROW_CHUNK, len(features) * FULL_BUILD_SHARE):
+        changed = None
+    if changed is None:
+        rows = np.arange(len(features))
+        neighbours, similarities = top_k_neighbours(features, k)
+    else:
+        rows = np.array([row for row, pk in enumerate(features.ids) if pk in changed], dtype=np.int64)
+        neighbours, similarities = refresh_neighbours(features, rows, k)
+
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        batch = []
+        for position in range(start, min(start + WRITE_BATCH_SIZE, len(rows))):
+            ids, scores = encode(features, neighbours[position], similarities[position])
+            batch.append(SimilarListings(
+                listing_id=features.ids[rows[position]],
+                neighbours=ids,
+                scores=scores,
+                computed_at=computed_at,
+            ))
+        SimilarListings.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['listing'],
+            update_fields=['neighbours', 'scores', 'computed_at'],
+        )
+
+    invalidate_tags(SIMILAR_TAG)
+    logger.info('Recomputed similar listings of %d listings (full=%s)', len(rows), changed is None)
+    return len(rows)
@@ -0,0 +1,104 @@
+"""
+Database routers for the travel booking application.
+Sends safe-method API reads to read replicas and everything else to the primary.
+"""
+
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+# Set per request by listings.middleware.ReplicaRoutingMiddleware.
+# Reads outside a request (shell, Celery tasks, management commands) always
+# use the primary.
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+class ReplicaPool:
+    """
+    Round-robin selection over the configured replicas with periodic health checks.
+    A replica that fails its check is skipped for one health check interval.
+    """
+
+    def __init__(self):
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._checked_at = {}
+        self._down_until = {}
+
+    def reset(self):
+        with self._lock:
+            self._checked_at.clear()
+            self._down_until.clear()
+
+    def choose(self, aliases):
+        """
+        Return the next healthy replica alias, or None if none is healthy.
+        """
+        for _ in range(len(aliases)):
+            alias = aliases[next(self._counter) % len(aliases)]
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        interval = settings.DB_REPLICA_HEALTH_CHECK_INTERVAL
+
+        if self._down_until.get(alias, 0) > now:
+            return False
+        if now - self._checked_at.get(alias, float('-inf')) < interval:
+            return True
+
+        try:
+            connection = connections[alias]
+            connection.ensure_connection()
+            healthy = connection.is_usable()
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            if healthy:
+                self._checked_at[alias] = now
+                self._down_until.pop(alias, None)
+            else:
+                self._down_until[alias] = now + interval
+        return healthy
+
+
+replica_pool = ReplicaPool()
+
+
+class PrimaryReplicaRouter:
+    """
+    Routes reads to a healthy replica while the current request allows it.
+
+    Writes, reads during unsafe requests, reads by clients pinned to the
+    primary after a write and reads from views marked with @primary_db all
+    go to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not read_from_replica.get():
+            return None
+        return replica_pool.choose(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+def primary_db(view):
+    """
+    Mark a view so that all of its reads go to the primary database.
+    """
+    view.use_primary_db = True
+    return view
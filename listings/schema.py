@@ -0,0 +1,119 @@
+"""
+Pre-generated OpenAPI schema.
+
+Generating the schema introspects every viewset and serializer, which is
+far too slow to repeat on each request. `python manage.py build_schema`
+writes it once to OPENAPI_SCHEMA_DIR (swagger.json and swagger.yaml) and
+the schema endpoints serve those bytes from memory with an ETag and a
+long Cache-Control max-age. Live generation is only used with OPENAPI_LIVE
+(on by default in DEBUG).
+
+drf_yasg's generator, inspectors and codecs are imported on first use
+only, so that workers that never serve the docs do not load them.
+"""
+
+import functools
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from drf_yasg import openapi
+
+
+logger = logging.getLogger(__name__)
+
+API_INFO = openapi.Info(
+    title="ALX Travel App API",
+    default_version='v1',
+    description="API documentation for ALX Travel App - A comprehensive travel listing platform",
+    terms_of_service="https://www.alxafrica.com/terms/",
+    contact=openapi.Contact(email="contact@alxtravelapp.com"),
+    license=openapi.License(name="MIT License"),
+)
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+
+# format -> (content bytes, etag), filled on first use in each process
+_loaded = {}
+
+
+@functools.lru_cache(maxsize=None)
+def get_schema_view_class():
+    """
+    drf_yasg view class for the Swagger UI/ReDoc pages and live generation.
+    """
+    from drf_yasg.views import get_schema_view
+    from rest_framework import permissions
+
+    return get_schema_view(
+        API_INFO,
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def lazy_schema_view(method, *args, **kwargs):
+    """
+    Return a view that builds get_schema_view_class().<method>(*args, **kwargs)
+    on its first request, e.g. lazy_schema_view('with_ui', 'redoc', cache_timeout=0).
+    """
+    @csrf_exempt
+    def view(request, *view_args, **view_kwargs):
+        if view.target is None:
+            view.target = getattr(get_schema_view_class(), method)(*args, **kwargs)
+        return view.target(request, *view_args, **view_kwargs)
+
+    view.target = None
+    return view
+
+
+def generate_schema(fmt):
+    """
+    Introspect the API and return the encoded public schema.
+    """
+    from drf_yasg.app_settings import swagger_settings
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+
+    codecs = {'json': OpenAPICodecJson, 'yaml': OpenAPICodecYaml}
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(info=API_INFO)
+    schema = generator.get_schema(request=None, public=True)
+    return codecs[fmt](validators=[]).encode(schema)
+
+
+def schema_path(fmt):
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, f'swagger.{fmt}')
+
+
+def build_schema_files():
+    """
+    Write every format to OPENAPI_SCHEMA_DIR and return the written paths.
+    """
+    os.makedirs(settings.OPENAPI_SCHEMA_DIR, exist_ok=True)
+    paths = []
+    for fmt in CONTENT_TYPES:
+        with open(schema_path(fmt), 'wb') as schema_file:
+            schema_file.write(generate_schema(fmt))
+        paths.append(schema_path(fmt))
+    _loaded.clear()
+    return paths
+
+
+def get_schema(fmt):
+    """
+    Return (content, etag) of the prebuilt schema, reading it once per process.
+    Falls back to generating it if build_schema has not been run.
+    """
+    if fmt not in _loaded:
+        try:
+            with open(schema_path(fmt), 'rb') as schema_file:
+                content = schema_file.read()
+        except FileNotFoundError:
+            logger.warning('%s not found, generating the schema; run manage.py build_schema', schema_path(fmt))
+            content = generate_schema(fmt)
+        _loaded[fmt] = (content, hashlib.sha256(content).hexdigest()[:32])
+    return _loaded[fmt]
@@ -0,0 +1,225 @@
+"""
+Relevance-ranked listing search.
+
+Listings are indexed into SearchPosting rows, one per (term, listing),
+holding the term's frequency in the title, location and description, and
+a SearchDocument row with each field's length. The index is kept up to
+date by the Listing post_save signal, which queues the reindex_listings
+task once the save commits and only when a searched field changed.
+Listing.objects.bulk_create() indexes the listings it inserts, and
+`manage.py build_search_index` those written by raw SQL.
+
+A query is tokenized like the listings. Each query term matches the same
+index term and, from MIN_PREFIX_LENGTH characters, up to MAX_PREFIX_TERMS
+longer terms starting with it ("beach" -> "beachfront") at PREFIX_WEIGHT.
+A term matching no index term falls back to the substring match of
+SearchFilter ("par" in "Paris"). As with SearchFilter, a listing must
+match every query term. Matches are scored in SQL with BM25F: per term,
+the field frequencies are normalized by field length (B), weighted by
+FIELD_WEIGHTS, summed, saturated (K1) and multiplied by the term's IDF.
+So a term in a short title counts for more than the same term once in a
+long description.
+
+rank() annotates any Listing queryset, so the ranking combines with the
+viewset's filters, pagination and the async views.
+"""
+
+import math
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Avg, Case, Count, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import SearchDocument, SearchPosting
+
+
+FIELDS = ('title', 'location', 'description')
+FIELD_WEIGHTS = {'title': 5.0, 'location': 2.0, 'description': 0.5}
+# BM25 term frequency saturation and length normalization
+K1 = 1.2
+B = 0.75
+MIN_PREFIX_LENGTH = 4
+MAX_PREFIX_TERMS = 10
+PREFIX_WEIGHT = 0.5
+MAX_TERM_LENGTH = 64
+STOPWORDS = frozenset(['a', 'an', 'and', 'at', 'by', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with'])
+STATS_CACHE_KEY = 'search:stats'
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens of `text`, without stopwords.
+    """
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(text.casefold())
+        if token not in STOPWORDS
+    ]
+
+
+def document_terms(listing):
+    """
+    The index entries of a listing: {term: (frequency per field, as in
+    FIELDS)} and {"<field>_length": number of terms}.
+    """
+    frequencies = {}
+    lengths = {}
+    for position, field in enumerate(FIELDS):
+        tokens = tokenize(getattr(listing, field))
+        lengths[f'{field}_length'] = len(tokens)
+        for token in tokens:
+            counts = frequencies.setdefault(token, [0] * len(FIELDS))
+            counts[position] += 1
+    # PositiveSmallIntegerField range
+    return {term: tuple(min(count, 32767) for count in counts) for term, counts in frequencies.items()}, lengths
+
+
+def index_listings(listings):
+    """
+    (Re)index the given listings, replacing their postings.
+
+    Postings are inserted with executemany: a listing has dozens of them,
+    and bulk_create spends more time preparing each value than the
+    database spends inserting it.
+    """
+    listings = list(listings)
+    if not listings:
+        return 0
+    indexed_at = timezone.now()
+    pk_field = SearchPosting._meta.get_field('listing')
+    postings = []
+    documents = []
+    for listing in listings:
+        frequencies, lengths = document_terms(listing)
+        listing_id = pk_field.get_db_prep_value(listing.pk, connection)
+        postings.extend((term, listing_id, *counts) for term, counts in frequencies.items())
+        documents.append(SearchDocument(listing_id=listing.pk, indexed_at=indexed_at, **lengths))
+
+    quote = connection.ops.quote_name
+    columns = ['term', pk_field.column, *(f'{field}_tf' for field in FIELDS)]
+    insert = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(SearchPosting._meta.db_table),
+        ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    with transaction.atomic():
+        SearchPosting.objects.filter(listing_id__in=[listing.pk for listing in listings]).delete()
+        with connection.cursor() as cursor:
+            cursor.executemany(insert, postings)
+        SearchDocument.objects.bulk_create(
+            documents,
+            batch_size=5000,
+            update_conflicts=True,
+            unique_fields=['listing'],
+            update_fields=[*(f'{field}_length' for field in FIELDS), 'indexed_at'],
+        )
+    return len(listings)
+
+
+def corpus_stats():
+    """
+    Number of indexed listings and average length of each field, cached
+    for SEARCH_STATS_TIMEOUT seconds.
+    """
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = SearchDocument.objects.aggregate(
+            count=Count('pk'),
+            **{field: Avg(f'{field}_length') for field in FIELDS},
+        )
+        cache.set(STATS_CACHE_KEY, stats, settings.SEARCH_STATS_TIMEOUT)
+    return stats
+
+
+def idf(count, document_frequency):
+    return math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def query_terms(query):
+    """
+    Pair each term of the query with the index terms it matches, as
+    (term, {index term: weight}), weight being the index term's IDF, times
+    PREFIX_WEIGHT for prefix matches. A term matching nothing maps to {}.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    frequencies = dict(
+        SearchPosting.objects.filter(term__in=tokens).order_by()
+        .values('term').annotate(df=Count('pk')).values_list('term', 'df')
+    )
+    groups = []
+    for token in tokens:
+        weights = {token: 1.0} if token in frequencies else {}
+        if len(token) >= MIN_PREFIX_LENGTH:
+            # A range rather than LIKE, so the (term, listing) index is used
+            expansions = (
+                SearchPosting.objects.filter(term__gt=token, term__lt=token + '\U0010ffff').order_by()
+                .values('term').annotate(df=Count('pk')).order_by('-df')[:MAX_PREFIX_TERMS]
+            )
+            for term, df in expansions.values_list('term', 'df'):
+                frequencies[term] = df
+                weights[term] = PREFIX_WEIGHT
+        groups.append(weights)
+
+    count = corpus_stats()['count']
+    return [
+        (token, {term: weight * idf(max(count, frequencies[term]), frequencies[term]) for term, weight in weights.items()})
+        for token, weights in zip(tokens, groups)
+    ]
+
+
+def contains(token):
+    """
+    Listings whose title, location or description contains `token`
+    anywhere, as the plain SearchFilter matched.
+    """
+    return reduce(or_, (Q(**{f'{field}__icontains': token}) for field in FIELDS))
+
+
+def rank(queryset, terms):
+    """
+    Restrict a Listing queryset to listings matching every term of
+    query_terms() and annotate their BM25F score as `relevance`.
+
+    A term is matched through the index with an IN filter on the (term,
+    listing) index, and the score is a correlated subquery over the
+    listing's postings, so only matching listings are scored. As a join and
+    GROUP BY, the planners start from the listings table instead.
+
+    A term with no index match ("par" in "Paris", "front" in "Beachfront")
+    is matched with contains() instead and adds nothing to the score.
+    """
+    weights = {}
+    for token, matches in terms:
+        if not matches:
+            queryset = queryset.filter(contains(token))
+            continue
+        for term, weight in matches.items():
+            weights[term] = max(weight, weights.get(term, 0.0))
+        queryset = queryset.filter(pk__in=SearchPosting.objects.filter(term__in=list(matches)).values('listing'))
+    if not weights:
+        return queryset.annotate(relevance=Value(0.0))
+    stats = corpus_stats()
+    frequency = sum(
+        FIELD_WEIGHTS[field]
+        * Cast(f'{field}_tf', FloatField())
+        / (Value(1 - B) + Value(B / (stats[field] or 1)) * Cast(OuterRef(f'search_document__{field}_length'), FloatField()))
+        for field in FIELDS
+    )
+    term_weight = Case(
+        *(When(term=term, then=Value(weight)) for term, weight in weights.items()),
+        output_field=FloatField(),
+    )
+    scores = SearchPosting.objects.filter(listing=OuterRef('pk'), term__in=list(weights)).order_by().values(
+        'listing',
+    ).annotate(
+        score=Sum(term_weight * frequency * Value(K1 + 1) / (frequency + Value(K1)), output_field=FloatField()),
+    ).values('score')
+    return queryset.annotate(relevance=Subquery(scores, output_field=FloatField()))
@@ -5,10 +5,11 @@ Handles serialization of Listing and Booking models for API responses.
 
 from rest_framework import serializers
 from .models import Listing, Booking, Review, Payment
+from .timing import TimedSerializerMixin
 from django.contrib.auth.models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the User model.
     """
@@ -18,7 +19,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class ListingSerializer(serializers.ModelSerializer):
+class ListingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Listing model.
     Includes host information and validation for dates.
@@ -40,7 +41,11 @@ class ListingSerializer(serializers.ModelSerializer):
             'description',
             'location',
             'price_per_night',
+            'min_price_per_night',
+            'max_price_per_night',
             'max_guests',
+            'latitude',
+            'longitude',
             'available_from',
             'available_to',
             'created_at',
@@ -50,17 +55,36 @@ class ListingSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         """
-        Validate that available_to is after available_from.
+        Validate that available_to is after available_from, that the
+        dynamic pricing bounds are both set or both empty, min <= max, and
+        that latitude and longitude are both set or both empty.
         """
         if 'available_from' in data and 'available_to' in data:
             if data['available_to'] <= data['available_from']:
                 raise serializers.ValidationError(
                     "available_to must be after available_from"
                 )
+        bounds = [
+            data.get(field, getattr(self.instance, field, None))
+            for field in ('min_price_per_night', 'max_price_per_night')
+        ]
+        if (bounds[0] is None) != (bounds[1] is None):
+            raise serializers.ValidationError(
+                "min_price_per_night and max_price_per_night must be set together"
+            )
+        if bounds[0] is not None and bounds[0] > bounds[1]:
+            raise serializers.ValidationError(
+                "min_price_per_night must not exceed max_price_per_night"
+            )
+        coordinates = [data.get(field, getattr(self.instance, field, None)) for field in ('latitude', 'longitude')]
+        if (coordinates[0] is None) != (coordinates[1] is None):
+            raise serializers.ValidationError(
+                "latitude and longitude must be set together"
+            )
         return data
 
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Booking model.
     Includes nested listing and user information with validation.
@@ -118,7 +142,7 @@ class BookingSerializer(serializers.ModelSerializer):
         return data
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Review model.
     """
@@ -0,0 +1,167 @@
+"""
+Signal handlers for the travel booking application.
+Invalidates cached API responses when listings, bookings, reviews or
+users change, keeps the listing search index and geohash up to date,
+records deletions for the delta sync feed, publishes booking and payment
+status changes to the push streams and counts new bookings for the
+metrics endpoint.
+"""
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import geo, push
+from .cache import AVAILABILITY_TAG, RATINGS_TAG, USERS_TAG, invalidate_tags
+from .metrics import bookings_created
+from .models import Booking, Listing, Payment, Review, Tombstone
+from .tasks import reindex_listings
+from .search import FIELDS as SEARCH_FIELDS
+
+
+def listing_tags(listing_id, *locations):
+    return [
+        f'listing:{listing_id}',
+        'listings',
+        *(f'listings:location:{location}' for location in locations if location),
+    ]
+
+
+def review_tags(review):
+    return [
+        f'review:{review.pk}',
+        'reviews',
+        f'reviews:listing:{review.listing_id}',
+        RATINGS_TAG,
+    ]
+
+
+@receiver(pre_save, sender=Listing)
+def remember_listing_location(sender, instance, **kwargs):
+    """
+    Remember the stored location so a move invalidates both location lists,
+    and the other searched fields so only their changes are reindexed.
+    """
+    if instance._state.adding:
+        instance._previous_search_fields = None
+    else:
+        instance._previous_search_fields = Listing.objects.filter(pk=instance.pk).values(*SEARCH_FIELDS).first()
+    instance._previous_location = (instance._previous_search_fields or {}).get('location')
+
+
+@receiver(pre_save, sender=Listing)
+def set_listing_geohash(sender, instance, **kwargs):
+    if instance.latitude is None or instance.longitude is None:
+        instance.geohash = ''
+    else:
+        instance.geohash = geo.encode(instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=Listing)
+def invalidate_listing_on_save(sender, instance, **kwargs):
+    invalidate_tags(*listing_tags(
+        instance.pk,
+        instance.location,
+        getattr(instance, '_previous_location', None),
+    ))
+
+
+@receiver(post_save, sender=Listing)
+def index_listing_on_save(sender, instance, using=None, **kwargs):
+    previous = getattr(instance, '_previous_search_fields', None)
+    if previous is not None and all(previous[field] == getattr(instance, field) for field in SEARCH_FIELDS):
+        return
+    listing_id = str(instance.pk)
+    transaction.on_commit(lambda: reindex_listings.delay([listing_id]), using=using)
+
+
+@receiver(post_delete, sender=Listing)
+def invalidate_listing_on_delete(sender, instance, **kwargs):
+    invalidate_tags(*listing_tags(instance.pk, instance.location))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review(sender, instance, **kwargs):
+    invalidate_tags(*review_tags(instance))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_availability(sender, instance, **kwargs):
+    invalidate_tags(AVAILABILITY_TAG)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, created=False, update_fields=None, **kwargs):
+    # New users appear in no response yet, and logins only update
+    # last_login, which no API response includes
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_tags(USERS_TAG)
+
+
+@receiver(post_save, sender=Booking)
+def count_new_booking(sender, instance, created=False, **kwargs):
+    if created:
+        bookings_created.labels(instance.status).inc()
+
+
+def tombstone(sender, instance):
+    return Tombstone(
+        kind=sender._meta.model_name,
+        object_id=instance.pk,
+        # Only the booking's user syncs its bookings
+        user_id=instance.user_id if sender is Booking else None,
+    )
+
+
+@receiver(pre_delete, sender=Listing)
+@receiver(pre_delete, sender=Booking)
+@receiver(pre_delete, sender=Review)
+def collect_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Collect the tombstones of a delete on its origin (the instance or
+    queryset delete() was called on): the pre_delete signals of every
+    cascaded row are sent before any post_delete, so the first post_delete
+    writes them all with one INSERT. Keyed by row, so a delete retried
+    after a failure does not record a row twice.
+    """
+    if origin is not None:
+        origin.__dict__.setdefault('_tombstones', {})[sender, instance.pk] = tombstone(sender, instance)
+
+
+@receiver(post_delete, sender=Listing)
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=Review)
+def record_tombstones(sender, instance, origin=None, using=None, **kwargs):
+    if origin is None:
+        tombstone(sender, instance).save(using=using, force_insert=True)
+        return
+    tombstones = origin.__dict__.pop('_tombstones', None)
+    if tombstones:
+        Tombstone.objects.using(using).bulk_create(tombstones.values())
+
+
+@receiver(post_init, sender=Booking)
+@receiver(post_init, sender=Payment)
+def remember_status(sender, instance, **kwargs):
+    """
+    Remember the loaded status so only actual changes are published,
+    without a query per save. A deferred status is not loaded for this.
+    """
+    instance._previous_status = instance.__dict__.get(push.KINDS[sender._meta.model_name][1])
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=Payment)
+def publish_status(sender, instance, created=False, using=None, **kwargs):
+    kind = sender._meta.model_name
+    status = getattr(instance, push.KINDS[kind][1])
+    previous, instance._previous_status = instance._previous_status, status
+    # Nobody can be subscribed to an object that did not exist
+    if created or status == previous:
+        return
+    push.publish_statuses(kind, [(instance.pk, status, instance.updated_at)], using=using)
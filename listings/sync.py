@@ -0,0 +1,220 @@
+"""
+Delta sync feed for mobile clients: GET /api/sync/?cursor=.
+
+A client stores the cursor of its last response and sends it back to get
+what changed since: listings and reviews, the user's own bookings, and
+tombstones for the ones deleted (Tombstone rows, written by the delete
+signals). Without a cursor the feed starts from the first record, which
+is the initial download. Each response holds up to `limit`
+changes, oldest first, with has_more telling the client to call again
+right away.
+
+Every stream is read in keyset order of (updated_at, pk), SYNC_CHUNK_SIZE
+rows at a time, and the streams are merged by time as the response is
+written, so a catch-up of any size holds one chunk per stream in memory.
+The cursor keeps the last (updated_at, pk) sent per stream. An object
+changed again after it was sent moves to the end of its stream and is
+sent again, so clients apply changes as upserts.
+
+Rows are only read up to SYNC_SETTLE_SECONDS ago. updated_at is set
+before the transaction commits, and a row committing after a client read
+past its timestamp would otherwise never be sent.
+
+Tombstones are purged after SYNC_TOMBSTONE_RETENTION_DAYS. A cursor last
+fully synced before that gets HTTP 410 and the client starts over
+without a cursor.
+"""
+
+import base64
+import heapq
+import json
+import uuid
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Booking, Listing, Review, Tombstone
+from .serializers import BookingSerializer, ListingSerializer, ReviewSerializer
+
+
+CURSOR_VERSION = 1
+# Flush the streamed response in pieces of about this many characters
+BUFFER_SIZE = 64 * 1024
+
+
+class CursorExpired(Exception):
+    """
+    The cursor is older than the tombstone retention.
+    """
+
+
+def encode_cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Raises ValueError for a cursor this module did not write.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError, UnicodeError) as error:
+        raise ValueError('Invalid cursor') from error
+    if not isinstance(data, dict) or data.get('v') != CURSOR_VERSION:
+        raise ValueError('Invalid cursor')
+    return data
+
+
+def _position(value):
+    """
+    A (timestamp, pk) cursor position from its JSON form; pk None means
+    everything after the timestamp.
+    """
+    if value is None:
+        return None
+    at, pk = value
+    return datetime.fromisoformat(at), uuid.UUID(pk) if pk else None
+
+
+def _after(queryset, field, position, horizon, chunk_size):
+    """
+    Rows of `queryset` after `position` in (field, pk) order, up to
+    `horizon`, fetched `chunk_size` rows per query.
+    """
+    queryset = queryset.filter(**{f'{field}__lte': horizon}).order_by(field, 'pk')
+    while True:
+        page = queryset
+        if position is not None:
+            at, pk = position
+            if pk is None:
+                page = page.filter(**{f'{field}__gt': at})
+            else:
+                # A range on the (field, pk) index, minus the rows already
+                # sent at the same timestamp
+                page = page.filter(**{f'{field}__gte': at}).exclude(**{field: at, 'pk__lte': pk})
+        rows = list(page[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        position = (getattr(rows[-1], field), rows[-1].pk)
+
+
+class ChangeFeed:
+    """
+    One page of the change feed for `user`, starting at `cursor`.
+    """
+
+    def __init__(self, user, cursor=None, limit=None):
+        self.user_id = user.pk if user.is_authenticated else None
+        self.limit = limit or settings.SYNC_PAGE_SIZE
+        self.horizon = timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+        if cursor:
+            data = decode_cursor(cursor)
+            if data.get('user') != self.user_id:
+                raise ValueError('The cursor belongs to another user')
+            try:
+                self.synced = datetime.fromisoformat(data['synced'])
+                self.positions = {kind: _position(data['positions'].get(kind)) for kind in self.streams()}
+            except (KeyError, TypeError, ValueError) as error:
+                raise ValueError('Invalid cursor') from error
+            if self.synced < timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+                raise CursorExpired('The cursor has expired, sync again without one')
+        else:
+            # A first download needs no tombstones of what it never had
+            self.synced = self.horizon
+            self.positions = dict.fromkeys(self.streams())
+            self.positions['tombstone'] = (self.horizon, None)
+        self.has_more = False
+
+    def streams(self):
+        """
+        {kind: (queryset, timestamp field, serializer)}.
+        """
+        streams = {
+            'listing': (Listing.objects.select_related('host'), 'updated_at', ListingSerializer()),
+            'review': (Review.objects.select_related('user'), 'updated_at', ReviewSerializer()),
+            'tombstone': (
+                Tombstone.objects.filter(Q(user_id__isnull=True) | Q(user_id=self.user_id)),
+                'deleted_at',
+                None,
+            ),
+        }
+        if self.user_id is not None:
+            streams['booking'] = (
+                Booking.objects.filter(user_id=self.user_id).select_related('listing__host', 'user'),
+                'updated_at',
+                BookingSerializer(),
+            )
+        return streams
+
+    def _stream(self, kind, queryset, field, serializer):
+        for row in _after(queryset, field, self.positions[kind], self.horizon, settings.SYNC_CHUNK_SIZE):
+            yield getattr(row, field), kind, row, serializer
+
+    def changes(self):
+        """
+        Yield up to `limit` changes, oldest first, advancing the cursor
+        positions as they are consumed.
+        """
+        merged = heapq.merge(
+            *(self._stream(kind, *stream) for kind, stream in self.streams().items()),
+            key=itemgetter(0),
+        )
+        for count, (at, kind, row, serializer) in enumerate(merged):
+            if count == self.limit:
+                self.has_more = True
+                return
+            self.positions[kind] = (at, row.pk)
+            if kind == 'tombstone':
+                yield {'type': row.kind, 'op': 'delete', 'id': row.object_id, 'at': at}
+            else:
+                yield {'type': kind, 'op': 'upsert', 'id': row.pk, 'at': at, 'data': serializer.to_representation(row)}
+
+    def cursor(self):
+        return encode_cursor({
+            'v': CURSOR_VERSION,
+            'user': self.user_id,
+            # Everything up to here has been sent once has_more is false
+            'synced': (self.synced if self.has_more else self.horizon).isoformat(),
+            'positions': {
+                kind: [position[0].isoformat(), str(position[1]) if position[1] else None]
+                for kind, position in self.positions.items()
+                if position is not None
+            },
+        })
+
+    def stream(self):
+        """
+        The response body, {"changes": [...], "cursor": ..., "has_more": ...},
+        as JSON text chunks.
+        """
+        encoder = JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+        buffer = ['{"changes":[']
+        size = 0
+        for number, change in enumerate(self.changes()):
+            text = encoder.encode(change)
+            buffer.append(f',{text}' if number else text)
+            size += len(text)
+            if size >= BUFFER_SIZE:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+        buffer.append(f'],"cursor":{json.dumps(self.cursor())},"has_more":{json.dumps(self.has_more)}}}')
+        yield ''.join(buffer)
+
+    async def astream(self):
+        """
+        stream() as an async iterator, for ASGI servers: given a sync one,
+        Django reads it whole before sending anything. Each chunk is read in
+        the thread running the request's sync code, which holds its
+        database connection.
+        """
+        chunks = self.stream()
+        read = sync_to_async(next, thread_sensitive=True)
+        while (chunk := await read(chunks, None)) is not None:
+            yield chunk
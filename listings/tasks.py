@@ -3,10 +3,16 @@ Celery tasks for the travel booking application.
 Handles asynchronous operations like sending email notifications.
 """
 
+from collections import Counter
+from datetime import timedelta
+
 from celery import shared_task
 from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
-from .models import Payment, Booking
+from django.utils import timezone
+from . import autocomplete, bulk, search
+from .cache import invalidate_tags
+from .models import Listing, Payment, Booking, Tombstone
 
 
 @shared_task
@@ -220,3 +226,129 @@ Travel Booking Team
             'status': 'error',
             'message': error_msg
         }
+
+
+@shared_task(bind=True)
+def bulk_status_change(self, operation, ids, user_id, *args):
+    """
+    Apply a listings.bulk operation to a large admin selection.
+
+    The ids are processed in chunks of BULK_ACTION_CHUNK_SIZE, each in its
+    own transaction, and the progress is recorded after every chunk (see
+    listings.bulk.get_progress).
+
+    Args:
+        operation (str): Key of listings.bulk.OPERATIONS
+        ids (list): Primary keys of the selected objects
+        user_id (int): Staff user the admin log entries are recorded for
+        *args: Extra arguments of the operation (e.g. the booking status)
+
+    Returns:
+        dict: Number of changed objects per new status
+    """
+    model, function = bulk.OPERATIONS[operation]
+    counts = Counter()
+    progress = {'operation': operation, 'state': 'running', 'done': 0, 'total': len(ids), 'counts': {}}
+    bulk.set_progress(self.request.id, **progress)
+    try:
+        for start in range(0, len(ids), settings.BULK_ACTION_CHUNK_SIZE):
+            chunk = ids[start:start + settings.BULK_ACTION_CHUNK_SIZE]
+            counts.update(function(model.objects.filter(pk__in=chunk), user_id, *args))
+            progress.update(done=start + len(chunk), counts=dict(counts))
+            bulk.set_progress(self.request.id, **progress)
+            if not self.request.is_eager:
+                self.update_state(state='PROGRESS', meta=progress)
+    except Exception:
+        bulk.set_progress(self.request.id, **{**progress, 'state': 'failed'})
+        raise
+
+    bulk.set_progress(self.request.id, **{**progress, 'state': 'finished'})
+    return {
+        'status': 'success',
+        'operation': operation,
+        'total': len(ids),
+        'counts': dict(counts),
+    }
+
+
+@shared_task
+def refresh_similar_listings(full=False):
+    """
+    Recompute the precomputed similar listings (listings.recommendations).
+    Scheduled by CELERY_BEAT_SCHEDULE: incrementally every
+    SIMILAR_LISTINGS_REFRESH_SECONDS and in full once a day.
+
+    Args:
+        full (bool): Recompute every listing instead of the changed ones
+
+    Returns:
+        dict: Number of listings recomputed
+    """
+    # NumPy is only needed by the batch job, not by the web workers
+    from .recommendations import refresh_similar_listings as refresh
+
+    return {'status': 'success', 'full': full, 'listings': refresh(full=full)}
+
+
+@shared_task
+def reindex_listings(listing_ids):
+    """
+    Reindex listings in the search index (listings.search) and invalidate
+    the cached listing lists. Queued by the Listing post_save signal once
+    the save commits, when a searched field changed.
+
+    Args:
+        listing_ids (list): UUIDs of the listings; deleted ones are skipped
+
+    Returns:
+        dict: Number of listings indexed
+    """
+    listings = list(Listing.objects.filter(pk__in=listing_ids).only('pk', *search.FIELDS))
+    indexed = search.index_listings(listings)
+    # Searches served between the save and now were cached with the old index
+    invalidate_tags('listings', *{f'listings:location:{listing.location}' for listing in listings})
+    return {'status': 'success', 'indexed': indexed}
+
+
+@shared_task
+def update_dynamic_prices():
+    """
+    Reprice the listings with dynamic pricing bounds (listings.pricing).
+    Scheduled nightly by CELERY_BEAT_SCHEDULE.
+
+    Returns:
+        dict: Number of listings whose price changed
+    """
+    from .pricing import apply_prices, load_and_price
+
+    return {'status': 'success', 'updated': apply_prices(load_and_price())}
+
+
+@shared_task
+def refresh_autocomplete(force=False):
+    """
+    Rebuild the autocomplete snapshot (listings.autocomplete) if the
+    listings changed since it was written. Scheduled every
+    AUTOCOMPLETE_REFRESH_SECONDS by CELERY_BEAT_SCHEDULE.
+
+    Args:
+        force (bool): Rebuild even if nothing changed
+
+    Returns:
+        dict: Whether the snapshot was rebuilt
+    """
+    return {'status': 'success', 'rebuilt': autocomplete.refresh_snapshot(force=force)}
+
+
+@shared_task
+def purge_tombstones():
+    """
+    Delete the delta sync tombstones (listings.sync) older than
+    SYNC_TOMBSTONE_RETENTION_DAYS. Scheduled daily by CELERY_BEAT_SCHEDULE.
+
+    Returns:
+        dict: Number of tombstones deleted
+    """
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return {'status': 'success', 'deleted': deleted}
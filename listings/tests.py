@@ -1,3 +1,1698 @@
-from django.test import TestCase
+"""
+Tests for the travel booking application.
+"""
 
-# Create your tests here.
+import asyncio
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from rest_framework.throttling import SimpleRateThrottle
+
+from .cache import response_cache_stats
+from . import autocomplete, cache as response_cache, geo, metrics, push, urls as listings_urls
+from .async_views import AsyncReadView
+from .benchmarking import SEARCH_QUERIES, synthetic_listings, title_matches
+from .bulk import expire_payments, transition_bookings
+from .middleware import NPlusOneError
+from .models import Listing, Booking, Review, Payment, SearchDocument, SearchPosting, SimilarListings, Tombstone
+from .pricing import load_and_price
+from .querycount import QueryRecorder, normalize_sql
+from .recommendations import changed_listing_ids, load_features, refresh_similar_listings
+from .routers import PrimaryReplicaRouter, read_from_replica, replica_pool
+from .tasks import purge_tombstones
+from .throttling import TokenBucketThrottle
+from .uuids import uuid7, uuid7_timestamp_ms
+from .warmup import warm_up
+
+
+# URLconf for AsyncViewTests: the API with the async views in front, as
+# under ASGI
+urlpatterns = [
+    path('api/', include(
+        (listings_urls.async_urlpatterns + listings_urls.urlpatterns, 'listings'),
+    )),
+]
+
+
+class FixturesMixin:
+    """
+    Helpers to create the minimal objects the API tests need.
+    Clears the cache so cached API responses never leak between tests.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def create_user(self, username='guest'):
+        return User.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            password='password123'
+        )
+
+    def create_listing(self, host, **kwargs):
+        defaults = {
+            'title': 'Beachfront Villa in Sydney',
+            'description': 'Beautiful property with amazing amenities.',
+            'location': 'Sydney, Australia',
+            'price_per_night': Decimal('150.00'),
+            'max_guests': 4,
+            'available_from': date.today(),
+            'available_to': date.today() + timedelta(days=365),
+        }
+        defaults.update(kwargs)
+        return Listing.objects.create(host=host, **defaults)
+
+    def create_booking(self, listing, user, **kwargs):
+        check_in = date.today() + timedelta(days=10)
+        defaults = {
+            'check_in_date': check_in,
+            'check_out_date': check_in + timedelta(days=3),
+            'number_of_guests': 2,
+            'total_price': listing.price_per_night * 3,
+        }
+        defaults.update(kwargs)
+        return Booking.objects.create(listing=listing, user=user, **defaults)
+
+
+class QueryBudgetMixin:
+    """
+    Assertions on the number of SQL queries a request runs.
+    """
+
+    def assertQueryBudget(self, budget, method, path, **kwargs):
+        with QueryRecorder() as recorder:
+            response = getattr(self.client, method)(path, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+        self.assertLessEqual(
+            recorder.count, budget,
+            f'{method.upper()} {path} ran {recorder.count} queries (budget {budget}): {recorder.duplicates()}'
+        )
+        return recorder.count
+
+    def assertConstantQueries(self, budget, path, add_row, rows=(1, 10)):
+        """
+        Request `path` with rows[0] and then rows[1] objects on the page and
+        check that the query count stays the same and within budget.
+        """
+        counts = []
+        created = 0
+        for target in rows:
+            while created < target:
+                add_row(created)
+                created += 1
+            cache.clear()
+            counts.append(self.assertQueryBudget(budget, 'get', path))
+        self.assertEqual(len(set(counts)), 1, f'{path} query count grows with page size: {counts}')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DB_REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(FixturesMixin, TestCase):
+    """
+    Uses a second SQLite database as the replica. Rows written to the
+    primary are not copied to it, which makes the routing observable.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        super().setUp()
+        replica_pool.reset()
+        self.host = self.create_user('host')
+        self.listing = self.create_listing(self.host)
+
+    def test_router_uses_primary_outside_requests(self):
+        router = PrimaryReplicaRouter()
+        self.assertIsNone(router.db_for_read(Listing))
+        self.assertEqual(router.db_for_write(Listing), 'default')
+
+    def test_router_round_robin_skips_unhealthy_replicas(self):
+        router = PrimaryReplicaRouter()
+        token = read_from_replica.set(True)
+        try:
+            with self.settings(DATABASE_REPLICAS=['replica', 'missing']):
+                chosen = {router.db_for_read(Listing) for _ in range(4)}
+            with self.settings(DATABASE_REPLICAS=['missing']):
+                fallback = router.db_for_read(Listing)
+        finally:
+            read_from_replica.reset(token)
+        self.assertEqual(chosen, {'replica'})
+        self.assertIsNone(fallback)
+
+    def test_safe_reads_go_to_replica(self):
+        response = self.client.get('/api/listings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_client_is_pinned_to_primary_after_write(self):
+        response = self.client.post('/api/listings/', {
+            'host_id': self.host.pk,
+            'title': 'City Center Loft',
+            'description': 'Close to everything.',
+            'location': 'Paris, France',
+            'price_per_night': '120.00',
+            'max_guests': 2,
+            'available_from': str(date.today()),
+            'available_to': str(date.today() + timedelta(days=30)),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.cookies['db_primary_pin']['max-age'], 5)
+
+        response = self.client.get('/api/listings/')
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_payment_views_read_from_primary(self):
+        booking = self.create_booking(self.listing, self.create_user())
+        Payment.objects.create(
+            booking=booking,
+            amount=booking.total_price,
+            chapa_reference='tx-primary-only',
+            payment_status='completed'
+        )
+        response = self.client.get('/api/payments/verify/', {'tx_ref': 'tx-primary-only'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['message'], 'Payment already verified')
+
+
+class UUID7Tests(FixturesMixin, TestCase):
+
+    def test_uuid7_is_version_7_and_time_ordered(self):
+        values = [uuid7() for _ in range(5000)]
+        self.assertTrue(all(value.version == 7 for value in values))
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(len(set(values)), len(values))
+
+    def test_uuid7_embeds_timestamp(self):
+        self.assertEqual(uuid7_timestamp_ms(uuid7(1700000000123)), 1700000000123)
+
+    def test_new_rows_get_uuid7_primary_keys(self):
+        listing = self.create_listing(self.create_user('host'))
+        self.assertEqual(listing.listing_id.version, 7)
+
+    def test_reissue_uuid7_rewrites_keys_and_foreign_keys(self):
+        host = self.create_user('host')
+        guest = self.create_user()
+        listing = self.create_listing(host, listing_id=uuid.uuid4())
+        booking = self.create_booking(listing, guest, booking_id=uuid.uuid4())
+        Review.objects.create(review_id=uuid.uuid4(), listing=listing, user=guest, rating=5, comment='Great')
+        Payment.objects.create(
+            payment_id=uuid.uuid4(), booking=booking, amount=booking.total_price, chapa_reference='tx-1'
+        )
+
+        old_ids = {'listing': listing.pk, 'booking': booking.pk, 'review': Review.objects.get().pk}
+        SimilarListings.objects.create(listing=listing, neighbours=b'', scores=b'', computed_at=timezone.now())
+        before = timezone.now()
+
+        call_command('reissue_uuid7', stdout=StringIO())
+
+        listing = Listing.objects.get()
+        booking = Booking.objects.get()
+        self.assertEqual(listing.listing_id.version, 7)
+        self.assertEqual(booking.booking_id.version, 7)
+        self.assertEqual(booking.listing_id, listing.listing_id)
+        self.assertEqual(Review.objects.get().listing_id, listing.listing_id)
+        self.assertEqual(Payment.objects.get().booking_id, booking.booking_id)
+        self.assertEqual(
+            uuid7_timestamp_ms(listing.listing_id),
+            int(listing.created_at.timestamp() * 1000)
+        )
+        # Delta sync clients drop the old ids and download the new ones
+        self.assertEqual(dict(Tombstone.objects.values_list('kind', 'object_id')), old_ids)
+        self.assertEqual(Tombstone.objects.get(kind='booking').user_id, guest.pk)
+        for model in (Listing, Booking, Review, Payment):
+            self.assertGreaterEqual(model.objects.get().updated_at, before)
+        self.assertFalse(SimilarListings.objects.exists())
+
+    def test_reissue_uuid7_runs_constant_queries_per_batch(self):
+        host = self.create_user('host')
+        counts = []
+        for size in (1, 5):
+            for _ in range(size):
+                self.create_listing(host, listing_id=uuid.uuid4())
+            with QueryRecorder() as recorder:
+                call_command('reissue_uuid7', stdout=StringIO())
+            counts.append(recorder.count)
+        self.assertEqual(counts[0], counts[1])
+
+        for _ in range(5):
+            self.create_listing(host, listing_id=uuid.uuid4())
+        call_command('reissue_uuid7', batch_size=2, stdout=StringIO())
+        self.assertEqual({pk.version for pk in Listing.objects.values_list('pk', flat=True)}, {7})
+        self.assertEqual(Tombstone.objects.filter(kind='listing').count(), 11)
+
+
+class ResponseCacheTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = self.create_user('host')
+        self.listing = self.create_listing(self.host)
+
+    def test_list_is_cached_with_normalized_query(self):
+        first = self.client.get('/api/listings/', {'ordering': '-created_at', 'search': ''})
+        second = self.client.get('/api/listings/?ordering=-created_at&page=1')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(response_cache_stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_listing_save_invalidates_detail_and_lists(self):
+        url = f'/api/listings/{self.listing.listing_id}/'
+        self.client.get(url)
+        self.client.get('/api/listings/')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        self.listing.title = 'Mountain Cabin'
+        self.listing.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['title'], 'Mountain Cabin')
+        self.assertEqual(self.client.get('/api/listings/')['X-Cache'], 'MISS')
+
+    def test_location_lists_are_invalidated_independently(self):
+        self.create_listing(self.host, location='Paris, France')
+        self.client.get('/api/listings/', {'location': 'Paris, France'})
+
+        # A change in another location leaves the Paris list cached
+        self.create_listing(self.host, location='Tokyo, Japan')
+        response = self.client.get('/api/listings/', {'location': 'Paris, France'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        # Moving a listing to Paris invalidates it
+        self.listing.location = 'Paris, France'
+        self.listing.save()
+        response = self.client.get('/api/listings/', {'location': 'Paris, France'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_review_write_invalidates_listing_reviews(self):
+        guest = self.create_user()
+        self.client.get('/api/reviews/', {'listing': str(self.listing.listing_id)})
+        Review.objects.create(listing=self.listing, user=guest, rating=4, comment='Nice')
+        response = self.client.get('/api/reviews/', {'listing': str(self.listing.listing_id)})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_booking_writes_invalidate_availability_lists(self):
+        check_in = date.today() + timedelta(days=10)
+        stay = {'check_in': check_in, 'check_out': check_in + timedelta(days=2)}
+        self.assertEqual(self.client.get('/api/listings/', stay).json()['count'], 1)
+        self.client.get('/api/listings/')
+
+        booking = self.create_booking(self.listing, self.create_user(), status='confirmed')
+        response = self.client.get('/api/listings/', stay)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 0)
+        # Unfiltered lists do not depend on bookings
+        self.assertEqual(self.client.get('/api/listings/')['X-Cache'], 'HIT')
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+        transition_bookings(Booking.objects.filter(pk=booking.pk), admin.pk, 'cancelled')
+        response = self.client.get('/api/listings/', stay)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 1)
+
+        self.create_booking(self.listing, self.create_user('other'), status='pending')
+        self.assertEqual(self.client.get('/api/listings/', stay).json()['count'], 0)
+        Booking.objects.filter(status='pending').delete()
+        self.assertEqual(self.client.get('/api/listings/', stay).json()['count'], 1)
+
+    def test_review_writes_invalidate_rating_lists(self):
+        review = Review.objects.create(listing=self.listing, user=self.create_user(), rating=5)
+        self.assertEqual(self.client.get('/api/listings/', {'min_rating': 4}).json()['count'], 1)
+
+        review.rating = 1
+        review.save()
+        response = self.client.get('/api/listings/', {'min_rating': 4})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['count'], 0)
+
+        review.delete()
+        self.assertEqual(self.client.get('/api/listings/', {'min_rating': 1}).json()['count'], 0)
+        Review.objects.create(listing=self.listing, user=self.create_user('other'), rating=4)
+        self.assertEqual(self.client.get('/api/listings/', {'min_rating': 1}).json()['count'], 1)
+
+    def test_user_change_invalidates_embedded_user_data(self):
+        url = f'/api/listings/{self.listing.listing_id}/'
+        self.client.get(url)
+        self.host.first_name = 'Renamed'
+        self.host.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['host']['first_name'], 'Renamed')
+
+
+
+class ListingReviewsTests(QueryBudgetMixin, FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.listing = self.create_listing(self.create_user('host'))
+        self.url = f'/api/listings/{self.listing.listing_id}/reviews/'
+
+    def add_review(self, index, rating=4):
+        return Review.objects.create(
+            listing=self.listing, user=self.create_user(f'reviewer{index}'), rating=rating, comment='Nice',
+        )
+
+    def test_pages_follow_the_cursor_newest_first(self):
+        reviews = [self.add_review(index, rating=index % 5 + 1) for index in range(23)]
+        response = self.client.get(self.url)
+        data = response.json()
+        self.assertEqual(data['rating_summary'], {
+            'count': 23,
+            'average': 2.87,
+            'distribution': {'5': 4, '4': 4, '3': 5, '2': 5, '1': 5},
+        })
+        self.assertIsNone(data['previous'])
+
+        seen = [review['review_id'] for review in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            seen += [review['review_id'] for review in data['results']]
+        self.assertEqual(seen, [str(review.pk) for review in reversed(reviews)])
+
+    def test_first_page_is_cached_until_a_review_changes(self):
+        self.add_review(0)
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+
+        self.add_review(1, rating=2)
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['rating_summary']['average'], 3.0)
+
+    def test_query_count_does_not_grow_with_reviews(self):
+        # Listing lookup, rating summary and the page
+        self.assertConstantQueries(3, self.url, self.add_review)
+
+    def test_unknown_listing(self):
+        self.assertEqual(self.client.get(f'/api/listings/{uuid.uuid4()}/reviews/').status_code, 404)
+        self.assertEqual(self.client.get('/api/listings/not-a-uuid/reviews/').status_code, 404)
+
+
+class SimilarListingsTests(QueryBudgetMixin, FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        host = self.create_user('host')
+        self.listing = self.create_listing(host)
+        self.close = self.create_listing(host, price_per_night=Decimal('160.00'))
+        self.expensive = self.create_listing(host, price_per_night=Decimal('900.00'))
+        self.elsewhere = self.create_listing(host, location='Paris, France')
+        self.url = f'/api/listings/{self.listing.listing_id}/similar/'
+
+    def similar_ids(self):
+        return [result['listing_id'] for result in self.client.get(self.url).json()['results']]
+
+    def test_neighbours_come_from_the_same_location_most_similar_first(self):
+        self.assertEqual(self.similar_ids(), [])
+        self.assertEqual(refresh_similar_listings(full=True), 4)
+
+        results = self.client.get(self.url).json()['results']
+        self.assertEqual(
+            [result['listing_id'] for result in results],
+            [str(self.close.pk), str(self.expensive.pk)],
+        )
+        self.assertGreater(results[0]['similarity'], results[1]['similarity'])
+
+    def test_shared_guests_raise_similarity(self):
+        refresh_similar_listings(full=True)
+        before = SimilarListings.objects.get(listing=self.listing).ranked()
+        for index in range(3):
+            guest = self.create_user(f'guest{index}')
+            self.create_booking(self.listing, guest)
+            self.create_booking(self.expensive, guest)
+        refresh_similar_listings()
+        after = SimilarListings.objects.get(listing=self.listing).ranked()
+        self.assertGreater(dict(after)[self.expensive.pk], dict(before)[self.expensive.pk])
+
+    def test_refresh_recomputes_changed_listings_only(self):
+        refresh_similar_listings(full=True)
+        self.assertEqual(refresh_similar_listings(), 0)
+        self.close.title = 'Renovated Villa'
+        self.close.save()
+        self.assertEqual(refresh_similar_listings(), 1)
+
+        guest = self.create_user()
+        self.create_booking(self.elsewhere, guest)
+        Review.objects.create(listing=self.expensive, user=guest, rating=2)
+        Review.objects.create(listing=self.expensive, user=self.create_user('reviewer'), rating=3)
+        with self.assertNumQueries(3):
+            self.assertEqual(changed_listing_ids(), {self.elsewhere.pk, self.expensive.pk})
+
+    def test_listings_created_during_a_build_are_skipped(self):
+        guest = self.create_user()
+        self.create_booking(self.close, guest)
+        Review.objects.create(listing=self.close, user=guest, rating=4)
+        # As if self.close had been created after the listing query
+        listings = Listing.objects.exclude(pk=self.close.pk)
+        with mock.patch.object(Listing.objects, 'order_by', listings.order_by):
+            features = load_features()
+        self.assertNotIn(self.close.pk, features.ids)
+        self.assertEqual(len(features), 3)
+
+    def test_response_is_cached_and_budgeted(self):
+        refresh_similar_listings(full=True)
+        # Listing, stored neighbours and the neighbour listings
+        self.assertQueryBudget(3, 'get', self.url)
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(f'/api/listings/{uuid.uuid4()}/similar/').status_code, 404)
+
+
+@override_settings(PRICING_TARGET_OCCUPANCY=0.3, PRICING_MAX_CHANGE=0.1)
+class DynamicPricingTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = self.create_user('host')
+        bounds = {'min_price_per_night': Decimal('100.00'), 'max_price_per_night': Decimal('200.00')}
+        self.busy = self.create_listing(self.host, **bounds)
+        self.quiet = self.create_listing(self.host, price_per_night=Decimal('105.00'), **bounds)
+        self.fixed = self.create_listing(self.host)
+        guest = self.create_user()
+        # Booked for the next 30 nights: above the target, the other two below
+        self.create_booking(self.busy, guest, check_in_date=date.today(),
+                            check_out_date=date.today() + timedelta(days=30), status='confirmed')
+
+    def test_prices_follow_occupancy_within_bounds(self):
+        output = StringIO()
+        call_command('reprice', '--dry-run', stdout=output)
+        self.assertIn('Dry run: 2 prices would change', output.getvalue())
+        self.busy.refresh_from_db()
+        self.assertEqual(self.busy.price_per_night, Decimal('150.00'))
+
+        call_command('reprice', stdout=StringIO())
+        for listing in (self.busy, self.quiet, self.fixed):
+            listing.refresh_from_db()
+        # Capped at PRICING_MAX_CHANGE, and at the host's lower bound
+        self.assertEqual(self.busy.price_per_night, Decimal('165.00'))
+        self.assertEqual(self.quiet.price_per_night, Decimal('100.00'))
+        self.assertEqual(self.fixed.price_per_night, Decimal('150.00'))
+
+    def test_diff_report_and_cache_invalidation(self):
+        url = f'/api/listings/{self.busy.listing_id}/'
+        self.client.get(url)
+        with tempfile.NamedTemporaryFile('r', suffix='.csv') as diff:
+            call_command('reprice', '--diff', diff.name, stdout=StringIO())
+            rows = list(csv.DictReader(diff))
+        self.assertEqual(
+            {(row['listing_id'], row['old_price'], row['new_price']) for row in rows},
+            {(str(self.busy.pk), '150.00', '165.00'), (str(self.quiet.pk), '105.00', '100.00')},
+        )
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['price_per_night'], '165.00')
+
+    def test_listings_created_during_a_run_are_skipped(self):
+        # As if self.busy had been created after the listing query
+        listings = Listing.objects.exclude(pk=self.busy.pk)
+        with mock.patch.object(Listing.objects, 'order_by', listings.order_by):
+            run = load_and_price()
+        self.assertNotIn(self.busy.pk, run.ids)
+
+    def test_bounds_are_validated(self):
+        response = self.client.patch(
+            f'/api/listings/{self.fixed.listing_id}/', {'min_price_per_night': '100.00'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(
+            f'/api/listings/{self.fixed.listing_id}/',
+            {'min_price_per_night': '300.00', 'max_price_per_night': '200.00'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+class ListingSearchTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = self.create_user('host')
+        # Listings are indexed once their save commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beachfront = self.create_listing(self.host, title='Beachfront Villa in Sydney')
+            self.mention = self.create_listing(
+                self.host,
+                title='Cozy Studio Apartment',
+                description='Quiet studio with a villa-style garden, ten minutes from the beach.',
+            )
+            self.exact = self.create_listing(self.host, title='Beach Villa', price_per_night=Decimal('90.00'))
+            self.create_listing(self.host, title='Mountain Cabin', description='Wood stove and a view.')
+
+    def search(self, **params):
+        response = self.client.get('/api/listings/', params)
+        self.assertEqual(response.status_code, 200)
+        return [result['listing_id'] for result in response.json()['results']]
+
+    def test_title_matches_outrank_description_mentions(self):
+        self.assertEqual(
+            self.search(search='beach villa'),
+            [str(self.exact.pk), str(self.beachfront.pk), str(self.mention.pk)],
+        )
+        self.assertEqual(self.search(search='beach villa cabin'), [])
+
+    def test_combines_with_filters_and_ordering(self):
+        self.assertEqual(self.search(search='beach villa', min_price=100), [str(self.beachfront.pk), str(self.mention.pk)])
+        self.assertEqual(
+            self.search(search='beach villa', ordering='price_per_night')[0],
+            str(self.exact.pk),
+        )
+
+        guest = self.create_user()
+        self.create_booking(self.exact, guest, status='confirmed')
+        check_in = date.today() + timedelta(days=11)
+        self.assertNotIn(
+            str(self.exact.pk),
+            self.search(search='villa', check_in=check_in, check_out=check_in + timedelta(days=1)),
+        )
+        Review.objects.create(listing=self.mention, user=guest, rating=5, comment='Great')
+        self.assertEqual(self.search(search='beach villa', min_rating=4), [str(self.mention.pk)])
+
+    def test_index_follows_listing_changes(self):
+        self.client.force_login(self.host)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.patch(
+                f'/api/listings/{self.exact.pk}/', {'title': 'Lakeside Chalet'}, content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.search(search='chalet'), [str(self.exact.pk)])
+        self.assertNotIn(str(self.exact.pk), self.search(search='beach villa'))
+
+        # Only changes to the searched fields are reindexed
+        indexed_at = SearchDocument.objects.get(listing=self.exact).indexed_at
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.patch(f'/api/listings/{self.exact.pk}/', {'max_guests': 6}, content_type='application/json')
+            self.exact.refresh_from_db()
+            self.exact.save()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(SearchDocument.objects.get(listing=self.exact).indexed_at, indexed_at)
+
+        self.exact.delete()
+        self.assertEqual(self.search(search='chalet'), [])
+        self.assertFalse(SearchPosting.objects.filter(listing_id=self.exact.pk).exists())
+
+    def test_reindex_invalidates_searches_cached_in_between(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.exact.title = 'Lakeside Chalet'
+            self.exact.save()
+        # Cached after the save's invalidation, with the old index
+        self.assertIn(str(self.exact.pk), self.search(search='beach villa'))
+        for callback in callbacks:
+            callback()
+        self.assertNotIn(str(self.exact.pk), self.search(search='beach villa'))
+
+    def test_terms_without_index_match_fall_back_to_substrings(self):
+        paris = self.create_listing(self.host, title='Left Bank Flat', location='Paris, France')
+        old_town = self.create_listing(self.host, title='Old Town Flat', location='Paris, France')
+        self.assertCountEqual(self.search(search='par'), [str(paris.pk), str(old_town.pk), str(self.mention.pk)])
+        self.assertEqual(self.search(search='front'), [str(self.beachfront.pk)])
+        self.assertEqual(self.search(search='bank par'), [str(paris.pk)])
+        self.assertEqual(self.search(search='xyzzy'), [])
+
+    def test_bulk_created_listings_are_indexed(self):
+        loft, = Listing.objects.bulk_create([
+            Listing(host=self.host, title='Canal Loft', description='Loft', location='Paris, France',
+                    price_per_night=Decimal('100.00'), max_guests=2,
+                    available_from=date.today(), available_to=date.today() + timedelta(days=30)),
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            paris = self.create_listing(self.host, title='Left Bank Flat', location='Paris, France')
+        self.assertEqual(self.search(search='loft'), [str(loft.pk)])
+        self.assertCountEqual(self.search(search='paris'), [str(loft.pk), str(paris.pk)])
+
+    def test_migration_indexes_existing_listings(self):
+        migration = import_module('listings.migrations.0011_index_existing_listings')
+        loft, = Listing.objects.bulk_create([
+            Listing(host=self.host, title='Beach Loft', description='Loft', location='Paris, France',
+                    price_per_night=Decimal('100.00'), max_guests=2,
+                    available_from=date.today(), available_to=date.today() + timedelta(days=30)),
+        ], index=False)
+        self.assertNotIn(str(loft.pk), self.search(search='beach'))
+
+        migration.index_existing_listings(apps, mock.Mock(connection=connection))
+        cache.clear()
+        self.assertIn(str(loft.pk), self.search(search='beach'))
+        self.assertEqual(SearchDocument.objects.count(), Listing.objects.count())
+
+
+class SearchCorpusTests(FixturesMixin, TestCase):
+    """
+    Relevance and latency of the ranked search on a synthetic corpus.
+    """
+    LISTINGS = 3000
+    LATENCY_BUDGET = 0.5
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user('host')
+        Listing.objects.bulk_create(synthetic_listings(cls.LISTINGS, host.pk), index=False)
+        call_command('build_search_index', stdout=StringIO())
+
+    def test_bulk_loaded_listings_are_indexed(self):
+        self.assertEqual(SearchDocument.objects.count(), self.LISTINGS)
+
+    def test_first_page_is_relevant_and_fast(self):
+        for query in SEARCH_QUERIES:
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                response = self.client.get('/api/listings/', {'search': query})
+                timings.append(time.perf_counter() - started)
+                cache.clear()
+            results = response.json()['results']
+            self.assertEqual(len(results), 10)
+            self.assertTrue(
+                all(title_matches(Listing(title=result['title']), query) for result in results),
+                f'{query}: {[result["title"] for result in results]}',
+            )
+            self.assertLess(sorted(timings)[1], self.LATENCY_BUDGET, query)
+
+
+class AutocompleteTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'snapshot.idx')
+        settings_override = override_settings(AUTOCOMPLETE_SNAPSHOT_PATH=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        host = self.create_user('host')
+        # Title terms come from the search index, written once a save commits
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.create_listing(host, title='Beachfront Villa')
+            self.create_listing(host, title='Beach House', location='São Paulo, Brazil')
+
+    def suggest(self, prefix, **params):
+        response = self.client.get('/api/listings/autocomplete/', {'prefix': prefix, **params})
+        self.assertEqual(response.status_code, 200)
+        return [result['text'] for result in response.json()['results']]
+
+    def test_suggestions_by_popularity(self):
+        call_command('build_autocomplete', stdout=StringIO())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('bea'), ['beachfront', 'beach'])
+            self.assertEqual(self.suggest('sao'), ['São Paulo, Brazil'])
+            self.assertEqual(self.suggest('PAULO'), ['São Paulo, Brazil'])
+            self.assertEqual(self.suggest('s', limit=1), ['Sydney, Australia'])
+            self.assertEqual(self.suggest('xyz'), [])
+            self.assertEqual(self.suggest(''), [])
+
+    def test_snapshot_follows_listing_changes(self):
+        with self.assertLogs('listings.autocomplete', 'WARNING'):
+            self.assertEqual(self.suggest('lake'), [])
+        self.assertFalse(autocomplete.refresh_snapshot())
+
+        listing = Listing.objects.get(title='Beach House')
+        listing.title = 'Lakeside Chalet'
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.save()
+        self.assertTrue(autocomplete.refresh_snapshot())
+        self.assertFalse(autocomplete.refresh_snapshot())
+        with mock.patch.object(autocomplete, 'RELOAD_INTERVAL', 0):
+            self.assertEqual(self.suggest('lake'), ['lakeside'])
+
+    def test_lookup_matches_a_scan(self):
+        rng = random.Random(0)
+        suggestions = [
+            (''.join(rng.choice('abcé ,') for _ in range(rng.randint(1, 8))), rng.choice(autocomplete.KINDS), rng.randint(1, 50))
+            for _ in range(1000)
+        ]
+        index = autocomplete.PrefixIndex(autocomplete.encode_snapshot(suggestions))
+        labels = [index.label(label_id) for label_id in range(len(index))]
+
+        def matches(label, prefix):
+            words = autocomplete.normalize(label['text']).split()
+            starts = range(len(words)) if label['kind'] == 'location' else range(1)
+            return any(' '.join(words[start:]).startswith(prefix) for start in starts)
+
+        for prefix in ['a', 'e', 'ab', 'b c', 'cab', 'abca', 'ac ce', 'z']:
+            expected = [label for label in labels if matches(label, prefix)][:10]
+            self.assertEqual(index.lookup(prefix), expected, prefix)
+
+
+class GeoSearchTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = self.create_user('host')
+        self.paris = self.create_listing(self.host, location='Paris, France', latitude=48.8566, longitude=2.3522)
+        self.versailles = self.create_listing(
+            self.host, location='Versailles, France', latitude=48.8049, longitude=2.1204,
+            price_per_night=Decimal('300.00'),
+        )
+        self.london = self.create_listing(self.host, location='London, UK', latitude=51.5074, longitude=-0.1278)
+        self.suva = self.create_listing(self.host, location='Suva, Fiji', latitude=-18.1416, longitude=178.4419)
+        self.taveuni = self.create_listing(self.host, location='Taveuni, Fiji', latitude=-16.85, longitude=-179.95)
+        self.create_listing(self.host, location='Nowhere')
+
+    def search(self, **params):
+        response = self.client.get('/api/listings/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {result['listing_id'] for result in response.json()['results']}
+
+    def ids(self, *listings):
+        return {str(listing.pk) for listing in listings}
+
+    def test_radius_and_bbox(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, precision=11), 'u4pruydqqvj')
+        self.assertEqual(self.search(near='48.8566,2.3522'), self.ids(self.paris))
+        self.assertEqual(self.search(near='48.86,2.35', radius=25), self.ids(self.paris, self.versailles))
+        self.assertEqual(self.search(near='48.86,2.35', radius=25, max_price=200), self.ids(self.paris))
+        self.assertEqual(self.search(near='48.86,2.35', radius=400), self.ids(self.paris, self.versailles, self.london))
+        self.assertEqual(self.search(near='-17.5,179.9', radius=200), self.ids(self.suva, self.taveuni))
+        self.assertEqual(self.search(bbox='48,1,52,3'), self.ids(self.paris, self.versailles))
+        self.assertEqual(self.search(bbox='48,-1,52,2.2'), self.ids(self.versailles, self.london))
+        # Across the antimeridian
+        self.assertEqual(self.search(bbox='-20,170,-15,-170'), self.ids(self.suva, self.taveuni))
+
+    def test_invalid_areas_are_rejected(self):
+        for params in [
+            {'near': 'paris'}, {'near': '48.8'}, {'near': '91,0'},
+            {'near': '48.8,2.3', 'radius': 0}, {'near': '48.8,2.3', 'radius': 10_000},
+            {'bbox': '48,1,52'}, {'bbox': '52,1,48,3'},
+        ]:
+            self.assertEqual(self.client.get('/api/listings/', params).status_code, 400, params)
+
+    def test_geohash_follows_coordinates(self):
+        self.client.force_login(self.host)
+        response = self.client.patch(
+            f'/api/listings/{self.london.pk}/', {'latitude': 48.85, 'longitude': 2.35}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.london.refresh_from_db()
+        self.assertEqual(self.london.geohash, geo.encode(48.85, 2.35))
+        self.assertEqual(self.search(near='48.86,2.35', radius=5), self.ids(self.paris, self.london))
+
+        response = self.client.patch(
+            f'/api/listings/{self.london.pk}/', {'latitude': None}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfill_command(self):
+        tokyo, atlantis, hashless = Listing.objects.bulk_create([
+            Listing(host=self.host, title='Tokyo Loft', description='Loft', location='Tokyo, Japan',
+                    price_per_night=Decimal('100.00'), max_guests=2,
+                    available_from=date.today(), available_to=date.today() + timedelta(days=30)),
+            Listing(host=self.host, title='Sunken Villa', description='Villa', location='Atlantis',
+                    price_per_night=Decimal('100.00'), max_guests=2,
+                    available_from=date.today(), available_to=date.today() + timedelta(days=30)),
+            Listing(host=self.host, title='Dubai Condo', description='Condo', location='Dubai, UAE',
+                    latitude=25.2, longitude=55.27, price_per_night=Decimal('100.00'), max_guests=2,
+                    available_from=date.today(), available_to=date.today() + timedelta(days=30)),
+        ])
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as gazetteer:
+            gazetteer.write('location,latitude,longitude\nVersailles,48.8049,2.1204\n')
+        self.addCleanup(os.remove, gazetteer.name)
+        output = StringIO()
+        call_command('backfill_coordinates', gazetteer=gazetteer.name, stdout=output)
+        self.assertIn('Unknown location: Atlantis (1 listings)', output.getvalue())
+        self.assertIn('Unknown location: Nowhere (1 listings)', output.getvalue())
+
+        tokyo.refresh_from_db()
+        self.assertEqual((tokyo.latitude, tokyo.longitude), geo.KNOWN_CITIES['tokyo'])
+        self.assertEqual(tokyo.geohash, geo.encode(*geo.KNOWN_CITIES['tokyo']))
+        hashless.refresh_from_db()
+        self.assertEqual(hashless.geohash, geo.encode(25.2, 55.27))
+        self.assertFalse(Listing.objects.filter(pk=atlantis.pk, latitude__isnull=False).exists())
+        self.assertEqual(self.search(near='35.68,139.65'), self.ids(tokyo))
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0, SYNC_CHUNK_SIZE=2)
+class DeltaSyncTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = self.create_user('host')
+        self.guest = self.create_user('guest')
+        self.other = self.create_user('other')
+        self.listings = [self.create_listing(self.host, title=f'Listing {number}') for number in range(5)]
+        self.booking = self.create_booking(self.listings[0], self.guest)
+        self.other_booking = self.create_booking(self.listings[1], self.other)
+        self.review = Review.objects.create(listing=self.listings[0], user=self.other, rating=4, comment='Nice')
+        self.client.force_login(self.guest)
+
+    def sync(self, cursor=None, **params):
+        response = self.client.get('/api/sync/', {**({'cursor': cursor} if cursor else {}), **params})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def sync_all(self, cursor=None, limit=3):
+        changes = []
+        while True:
+            page = self.sync(cursor, limit=limit)
+            self.assertLessEqual(len(page['changes']), limit)
+            changes += page['changes']
+            cursor = page['cursor']
+            if not page['has_more']:
+                return changes, cursor
+
+    def test_initial_download_in_pages(self):
+        # Timestamp ties across chunk and page boundaries
+        Listing.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        changes, _ = self.sync_all()
+        self.assertEqual(
+            sorted((change['type'], change['id']) for change in changes),
+            sorted(
+                [('listing', str(listing.pk)) for listing in self.listings]
+                + [('booking', str(self.booking.pk)), ('review', str(self.review.pk))]
+            ),
+        )
+        self.assertEqual([change['at'] for change in changes], sorted(change['at'] for change in changes))
+        self.assertEqual(changes[0]['data']['title'], 'Listing 0')
+
+    def test_changes_and_tombstones_since_cursor(self):
+        _, cursor = self.sync_all()
+        self.assertEqual(self.sync(cursor)['changes'], [])
+
+        self.listings[2].title = 'Renamed'
+        self.listings[2].save()
+        review_id, booking_id = self.review.pk, self.booking.pk
+        self.review.delete()
+        self.other_booking.delete()
+        self.booking.delete()
+        changes, cursor = self.sync_all(cursor)
+        self.assertEqual(
+            [(change['type'], change['op'], change['id']) for change in changes],
+            [
+                ('listing', 'upsert', str(self.listings[2].pk)),
+                ('review', 'delete', str(review_id)),
+                ('booking', 'delete', str(booking_id)),
+            ],
+        )
+        self.assertEqual(changes[0]['data']['title'], 'Renamed')
+
+        # Cascaded deletes are recorded as well
+        self.listings[1].delete()
+        changes, _ = self.sync_all(cursor)
+        self.assertEqual([(change['type'], change['op']) for change in changes], [('listing', 'delete')])
+
+    def test_cascaded_tombstones_are_written_at_once(self):
+        listing = self.listings[0]
+        for number in range(3):
+            self.create_booking(listing, self.guest)
+            Review.objects.create(listing=listing, user=self.create_user(f'reviewer{number}'), rating=5, comment='Great')
+        rows = {(kind, pk) for kind, model in [('booking', Booking), ('review', Review)]
+                for pk in model.objects.filter(listing=listing).values_list('pk', flat=True)}
+        rows.add(('listing', listing.pk))
+        with CaptureQueriesContext(connection) as queries:
+            listing.delete()
+        self.assertEqual(len([query for query in queries if 'INSERT INTO "tombstones"' in query['sql']]), 1)
+        self.assertEqual(set(Tombstone.objects.values_list('kind', 'object_id')), rows)
+        self.assertEqual(Tombstone.objects.get(object_id=self.booking.pk).user_id, self.guest.pk)
+
+        Listing.objects.filter(pk__in=[self.listings[1].pk, self.listings[2].pk]).delete()
+        self.assertEqual(Tombstone.objects.count(), len(rows) + 3)
+
+    def test_streams_asynchronously_under_asgi(self):
+        async def sync():
+            response = await self.async_client.get('/api/sync/', {'limit': 3})
+            self.assertTrue(response.is_async)
+            return [chunk async for chunk in response.streaming_content]
+
+        self.async_client.force_login(self.guest)
+        with override_settings(SYNC_PAGE_SIZE=3), mock.patch('listings.sync.BUFFER_SIZE', 1):
+            chunks = async_to_sync(sync)()
+        self.assertGreater(len(chunks), 1)
+        page = json.loads(b''.join(chunks))
+        self.assertEqual(page['changes'], self.sync(limit=3)['changes'])
+        self.assertTrue(page['has_more'])
+
+    def test_recent_changes_wait_to_settle(self):
+        _, cursor = self.sync_all()
+        self.create_listing(self.host)
+        with override_settings(SYNC_SETTLE_SECONDS=60):
+            self.assertEqual(self.sync(cursor)['changes'], [])
+        self.assertEqual(len(self.sync(cursor)['changes']), 1)
+
+    def test_invalid_and_expired_cursors(self):
+        cursor = self.sync()['cursor']
+        for params in [{'cursor': 'garbage'}, {'cursor': cursor[:-4]}, {'limit': 0}, {'limit': 'all'}]:
+            self.assertEqual(self.client.get('/api/sync/', params).status_code, 400, params)
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/sync/', {'cursor': cursor}).status_code, 400)
+        self.assertNotIn('booking', {change['type'] for change in self.sync()['changes']})
+
+        self.client.force_login(self.guest)
+        with override_settings(SYNC_TOMBSTONE_RETENTION_DAYS=0):
+            self.assertEqual(self.client.get('/api/sync/', {'cursor': cursor}).status_code, 410)
+
+    def test_purge_tombstones(self):
+        review_id = self.review.pk
+        self.review.delete()
+        Tombstone.objects.create(kind='listing', object_id=uuid.uuid4(), deleted_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(purge_tombstones.delay().get(), {'status': 'success', 'deleted': 1})
+        self.assertEqual(Tombstone.objects.get().object_id, review_id)
+
+
+@override_settings(PUSH_BROKER_URL='memory://tests', PUSH_HEARTBEAT_SECONDS=60)
+class StatusPushTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.booking = self.create_booking(self.create_listing(self.create_user('host')), self.create_user())
+        self.payment = Payment.objects.create(
+            booking=self.booking, amount=self.booking.total_price, chapa_reference='tx-push',
+        )
+        self.broker = push.get_broker()
+        self.application = push.StatusStreamApplication(self.django_application)
+
+    async def django_application(self, scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    def commit(self, change):
+        """
+        Run `change` in a worker thread, with its on_commit callbacks.
+        """
+        def run():
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+        return sync_to_async(run)()
+
+    async def open_stream(self, path, method='GET', headers=()):
+        """
+        Request `path` from the application; return the response start
+        message, a queue of body chunks and a function that disconnects.
+        """
+        started = asyncio.get_running_loop().create_future()
+        chunks = asyncio.Queue()
+        disconnect = asyncio.Event()
+        request = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+        async def receive():
+            if request:
+                return request.pop()
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                started.set_result(message)
+            else:
+                await chunks.put(message.get('body', b''))
+
+        task = asyncio.ensure_future(self.application({
+            'type': 'http', 'method': method, 'path': path, 'headers': list(headers),
+        }, receive, send))
+
+        async def close():
+            disconnect.set()
+            await task
+
+        return await started, chunks, close
+
+    async def next_event(self, chunks):
+        while True:
+            chunk = (await asyncio.wait_for(chunks.get(), 5)).decode()
+            if 'data: ' in chunk:
+                return json.loads(chunk.split('data: ', 1)[1])
+
+    def test_stream_sends_status_then_changes(self):
+        async def scenario():
+            start, chunks, close = await self.open_stream(
+                f'/api/payments/{self.payment.pk}/events/', headers=[(b'origin', b'http://localhost:3000')],
+            )
+            headers = dict(start['headers'])
+            self.assertEqual(start['status'], 200)
+            self.assertEqual(headers[b'content-type'], b'text/event-stream')
+            self.assertEqual(headers[b'access-control-allow-origin'], b'http://localhost:3000')
+            event = await self.next_event(chunks)
+            self.assertEqual((event['type'], event['id'], event['status']), ('payment', str(self.payment.pk), 'pending'))
+
+            def verify():
+                # As verify_payment does
+                with transaction.atomic():
+                    self.payment.payment_status = 'completed'
+                    self.payment.save()
+                    self.booking.status = 'confirmed'
+                    self.booking.save()
+            await self.commit(verify)
+            self.assertEqual((await self.next_event(chunks))['status'], 'completed')
+            self.assertEqual(self.broker.subscriber_count(), 1)
+            await close()
+            self.assertEqual(self.broker.subscriber_count(), 0)
+
+        async_to_sync(scenario)()
+
+    def test_streams_opened_together_share_reads(self):
+        paths = [
+            f'/api/payments/{self.payment.pk}/events/',
+            f'/api/bookings/{self.booking.pk}/events/',
+            f'/api/payments/{self.payment.pk}/events/',
+        ]
+
+        async def scenario():
+            streams = await asyncio.gather(*(self.open_stream(path) for path in paths))
+            events = [await self.next_event(chunks) for _, chunks, _ in streams]
+            for _, _, close in streams:
+                await close()
+            return events
+
+        with self.assertNumQueries(2):
+            events = async_to_sync(scenario)()
+        self.assertEqual([event['status'] for event in events], ['pending'] * 3)
+
+    def test_only_status_changes_are_published(self):
+        other = self.create_booking(self.booking.listing, self.booking.user)
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+
+        async def scenario():
+            subscription = self.broker.subscribe(
+                push.channel_name('booking', self.booking.pk), push.channel_name('payment', self.payment.pk),
+            )
+            try:
+                self.booking.number_of_guests = 3
+                await self.commit(self.booking.save)
+                self.assertIsNone(await subscription.get(0.05))
+
+                await self.commit(lambda: transition_bookings(Booking.objects.all(), admin.pk, 'confirmed'))
+                await self.commit(lambda: expire_payments(Payment.objects.all(), admin.pk))
+                events = [json.loads(await subscription.get(1)) for _ in range(2)]
+                self.assertEqual(
+                    [(event['type'], event['status']) for event in events],
+                    [('booking', 'confirmed'), ('payment', 'cancelled')],
+                )
+                self.assertIsNone(await subscription.get(0.05))
+            finally:
+                subscription.close()
+
+        async_to_sync(scenario)()
+        self.assertEqual(Booking.objects.get(pk=other.pk).status, 'confirmed')
+
+    def test_errors_and_other_paths(self):
+        async def scenario():
+            start, _, _ = await self.open_stream(f'/api/bookings/{uuid.uuid4()}/events/')
+            self.assertEqual(start['status'], 404)
+            start, _, _ = await self.open_stream(f'/api/bookings/{self.booking.pk}/events/', method='POST')
+            self.assertEqual(start['status'], 405)
+            with self.settings(PUSH_MAX_SUBSCRIBERS=0):
+                start, _, _ = await self.open_stream(f'/api/bookings/{self.booking.pk}/events/')
+            self.assertEqual(start['status'], 503)
+            start, _, _ = await self.open_stream(f'/api/bookings/{self.booking.pk}/')
+            self.assertEqual(start['status'], 204)
+            self.assertEqual(self.broker.subscriber_count(), 0)
+
+        async_to_sync(scenario)()
+
+    def test_slow_subscriber_keeps_latest_messages(self):
+        async def scenario():
+            subscription = self.broker.subscribe('booking:slow')
+            # From another thread, as a sync view publishes
+            await asyncio.to_thread(lambda: [self.broker.publish('booking:slow', str(n)) for n in range(20)])
+            await asyncio.sleep(0)
+            messages = []
+            while (message := await subscription.get(0.05)) is not None:
+                messages.append(message)
+            subscription.close()
+            return messages
+
+        with self.settings(PUSH_QUEUE_SIZE=4):
+            self.assertEqual(async_to_sync(scenario)(), ['16', '17', '18', '19'])
+
+
+class SeedCommandTests(TestCase):
+
+    def seed(self, **options):
+        call_command('seed', users=20, listings=40, bookings=200, seed=5, stdout=StringIO(), **options)
+        return list(
+            Booking.objects.order_by('booking_id')
+            .values_list('booking_id', 'listing_id', 'user__username', 'check_in_date', 'status')
+        )
+
+    def test_seed_is_deterministic_and_keeps_superusers(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+        first = self.seed(chunk_size=40)
+        second = self.seed(chunk_size=7)
+        self.assertEqual(first, second)
+        self.assertEqual(len(first), 200)
+        self.assertEqual(Listing.objects.count(), 40)
+        self.assertTrue(User.objects.filter(pk=admin.pk).exists())
+        self.assertEqual(User.objects.filter(is_superuser=False).count(), 20)
+
+    def test_seeded_bookings_do_not_overlap(self):
+        self.seed()
+        previous = {}
+        for booking in Booking.objects.order_by('listing_id', 'check_in_date'):
+            if booking.listing_id in previous:
+                self.assertGreaterEqual(booking.check_in_date, previous[booking.listing_id])
+            previous[booking.listing_id] = booking.check_out_date
+            self.assertNotEqual(booking.user_id, booking.listing.host_id)
+
+
+class QueryBudgetTests(QueryBudgetMixin, FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = self.create_user('host')
+        self.listing = self.create_listing(self.host)
+        self.guest = self.create_user()
+
+    def add_listing(self, index):
+        self.create_listing(self.create_user(f'host{index}'))
+
+    def add_booking(self, index):
+        listing = self.create_listing(self.create_user(f'host{index}'))
+        self.create_booking(listing, self.create_user(f'guest{index}'))
+
+    def add_review(self, index):
+        Review.objects.create(listing=self.listing, user=self.create_user(f'reviewer{index}'), rating=4)
+
+    def test_listing_endpoints(self):
+        self.assertConstantQueries(2, '/api/listings/', self.add_listing)
+        self.assertQueryBudget(1, 'get', f'/api/listings/{self.listing.listing_id}/')
+
+    def test_booking_endpoints(self):
+        self.assertConstantQueries(2, '/api/bookings/', self.add_booking)
+        booking = Booking.objects.first()
+        self.assertQueryBudget(1, 'get', f'/api/bookings/{booking.booking_id}/')
+
+    def test_review_endpoints(self):
+        self.assertConstantQueries(2, '/api/reviews/', self.add_review)
+        review = Review.objects.first()
+        self.assertQueryBudget(1, 'get', f'/api/reviews/{review.review_id}/')
+
+    @mock.patch('listings.views.send_payment_confirmation_email')
+    @mock.patch('listings.views.requests')
+    def test_payment_endpoints(self, chapa, email_task):
+        booking = self.create_booking(self.listing, self.guest)
+        chapa.post.return_value.status_code = 200
+        chapa.post.return_value.json.return_value = {
+            'status': 'success', 'data': {'checkout_url': 'https://checkout.chapa.co/checkout/payment/x'},
+        }
+        self.assertQueryBudget(
+            8, 'post', '/api/payments/initiate/',
+            data={'booking_id': str(booking.booking_id)}, content_type='application/json'
+        )
+
+        tx_ref = Payment.objects.get(booking=booking).chapa_reference
+        chapa.get.return_value.status_code = 200
+        chapa.get.return_value.json.return_value = {
+            'status': 'success', 'data': {'status': 'success', 'reference': 'chapa-ref'},
+        }
+        self.assertQueryBudget(5, 'get', '/api/payments/verify/', data={'tx_ref': tx_ref})
+        email_task.delay.assert_called_once()
+
+
+class AdminChangelistTests(QueryBudgetMixin, FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password123'))
+        self.listing = self.create_listing(self.create_user('host'))
+
+    def add_listing(self, index):
+        self.create_listing(self.create_user(f'host{index}'), title=f'Cabin {index}')
+
+    def add_booking(self, index):
+        listing = self.create_listing(self.create_user(f'host{index}'))
+        self.create_booking(listing, self.create_user(f'guest{index}'))
+
+    def add_review(self, index):
+        Review.objects.create(listing=self.listing, user=self.create_user(f'reviewer{index}'), rating=index % 5 + 1)
+
+    def test_listing_changelist(self):
+        self.assertConstantQueries(6, '/admin/listings/listing/', self.add_listing)
+
+    def test_booking_changelist(self):
+        self.assertConstantQueries(6, '/admin/listings/booking/', self.add_booking)
+
+    def test_review_changelist(self):
+        self.assertConstantQueries(6, '/admin/listings/review/', self.add_review)
+
+    def test_filters_and_prefix_search(self):
+        self.add_listing(1)
+        self.create_listing(self.create_user('pricey'), title='Penthouse', price_per_night=Decimal('650.00'))
+        response = self.client.get('/admin/listings/listing/', {'price': '500-'})
+        self.assertEqual([obj.title for obj in response.context['cl'].result_list], ['Penthouse'])
+        response = self.client.get('/admin/listings/listing/', {'q': 'cab'})
+        self.assertEqual([obj.title for obj in response.context['cl'].result_list], ['Cabin 1'])
+        # Prefix search: a word in the middle of the title does not match
+        response = self.client.get('/admin/listings/listing/', {'q': 'Villa'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+
+class BulkAdminActionTests(QueryBudgetMixin, FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+        self.client.force_login(self.admin)
+        self.listing = self.create_listing(self.create_user('host'))
+        self.guest = self.create_user()
+
+    def bookings(self, *statuses, **kwargs):
+        return [self.create_booking(self.listing, self.guest, status=status, **kwargs) for status in statuses]
+
+    def run_action(self, model, action, objects):
+        return self.client.post(f'/admin/listings/{model}/', {
+            'action': action,
+            '_selected_action': [str(obj.pk) for obj in objects],
+        }, follow=True)
+
+    def statuses(self, objects, field='status'):
+        return [getattr(type(obj).objects.get(pk=obj.pk), field) for obj in objects]
+
+    def test_booking_actions_follow_state_rules(self):
+        bookings = self.bookings('pending', 'confirmed', 'cancelled')
+        confirmed = metrics.REGISTRY.get_sample_value('bookings_confirmed_total', {'source': 'admin'}) or 0
+        response = self.run_action('booking', 'confirm_bookings', bookings)
+        self.assertContains(response, '1 confirmed; 2 left unchanged.')
+        self.assertEqual(self.statuses(bookings), ['confirmed', 'confirmed', 'cancelled'])
+        self.assertEqual(metrics.REGISTRY.get_sample_value('bookings_confirmed_total', {'source': 'admin'}), confirmed + 1)
+
+        # Only stays that have ended can be completed
+        self.run_action('booking', 'complete_bookings', bookings)
+        self.assertEqual(self.statuses(bookings), ['confirmed', 'confirmed', 'cancelled'])
+        past = date.today() - timedelta(days=10)
+        Booking.objects.update(check_in_date=past, check_out_date=past + timedelta(days=3))
+        self.run_action('booking', 'complete_bookings', bookings)
+        self.assertEqual(self.statuses(bookings), ['completed', 'completed', 'cancelled'])
+
+        self.assertEqual(LogEntry.objects.filter(user=self.admin).count(), 3)
+
+    def test_actions_run_constant_queries(self):
+        # The content type lookup is cached after the first use
+        ContentType.objects.get_for_model(Booking)
+        counts = []
+        for size in (1, 10):
+            bookings = self.bookings(*['pending'] * size)
+            with QueryRecorder() as recorder:
+                self.run_action('booking', 'cancel_bookings', bookings)
+            counts.append(recorder.count)
+        self.assertEqual(counts[0], counts[1])
+
+    @override_settings(BULK_ACTION_ASYNC_THRESHOLD=2, BULK_ACTION_CHUNK_SIZE=2)
+    def test_large_selection_runs_as_task(self):
+        bookings = self.bookings(*['pending'] * 5)
+        response = self.run_action('booking', 'cancel_bookings', bookings)
+        self.assertContains(response, '5 bookings are being processed in the background')
+        self.assertEqual(set(self.statuses(bookings)), {'cancelled'})
+
+        progress_url = response.context['messages']._loaded_messages[0].message.split('href="')[1].split('"')[0]
+        progress = self.client.get(progress_url).json()
+        self.assertEqual(progress['state'], 'finished')
+        self.assertEqual((progress['done'], progress['total']), (5, 5))
+        self.assertEqual(progress['counts'], {'cancelled': 5})
+
+    @override_settings(BULK_ACTION_ASYNC_THRESHOLD=2, CELERY_TASK_ALWAYS_EAGER=False)
+    @mock.patch('listings.admin.bulk_status_change')
+    def test_progress_needs_a_shared_cache(self, task):
+        task.delay.return_value.id = 'task-id'
+        bookings = self.bookings(*['pending'] * 3)
+        response = self.run_action('booking', 'cancel_bookings', bookings)
+        self.assertContains(response, 'Progress cannot be shown')
+        self.assertNotContains(response, 'bulk-progress')
+        task.delay.assert_called_once()
+
+        with override_settings(CACHES={
+            **settings.CACHES, 'progress': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        }, BULK_PROGRESS_CACHE_ALIAS='progress'):
+            response = self.run_action('booking', 'cancel_bookings', bookings)
+        self.assertContains(response, 'bulk-progress/task-id/')
+
+    @mock.patch('listings.bulk.requests')
+    def test_payment_actions(self, chapa):
+        booking_paid, booking_failed, booking_unknown = self.bookings('pending', 'pending', 'pending')
+        payments = [
+            Payment.objects.create(booking=booking, amount=booking.total_price, chapa_reference=reference)
+            for booking, reference in ((booking_paid, 'tx-paid'), (booking_failed, 'tx-failed'), (booking_unknown, 'tx-down'))
+        ]
+
+        def verify(url, **kwargs):
+            response = mock.Mock(status_code=200)
+            reference = url.rsplit('/', 1)[1]
+            if reference == 'tx-down':
+                response.status_code = 503
+                response.json.return_value = {'status': 'error'}
+            else:
+                chapa_status = 'success' if reference == 'tx-paid' else 'failed'
+                response.json.return_value = {'status': 'success', 'data': {'status': chapa_status, 'reference': 'ref'}}
+            return response
+
+        chapa.get.side_effect = verify
+        with mock.patch('listings.tasks.send_payment_confirmation_email.delay') as email, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.run_action('payment', 'reverify_payments', payments)
+        self.assertContains(response, '1 completed, 1 failed; 1 left unchanged.')
+        self.assertEqual(self.statuses(payments, 'payment_status'), ['completed', 'failed', 'pending'])
+        self.assertEqual(self.statuses([booking_paid, booking_failed]), ['confirmed', 'pending'])
+        email.assert_called_once_with(str(payments[0].pk), str(booking_paid.pk))
+
+        self.run_action('payment', 'expire_payments', payments)
+        self.assertEqual(self.statuses(payments, 'payment_status'), ['completed', 'failed', 'cancelled'])
+
+
+class ThrottlingTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        rates = mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'search': '3/min', 'payment': '2/min'})
+        rates.start()
+        self.addCleanup(rates.stop)
+        self.listing = self.create_listing(self.create_user('host'))
+
+    def test_search_budget_per_ip(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/listings/', {'search': 'villa'}).status_code, 200)
+        response = self.client.get('/api/listings/', {'search': 'villa'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+
+        # Other clients and other scopes have their own buckets
+        self.assertEqual(self.client.get('/api/listings/', REMOTE_ADDR='10.0.0.2').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/listings/{self.listing.pk}/').status_code, 200)
+
+    def test_bucket_refills(self):
+        with mock.patch('listings.throttling.time.time', return_value=1000.0) as clock:
+            for _ in range(3):
+                self.client.get('/api/listings/')
+            self.assertEqual(self.client.get('/api/listings/').status_code, 429)
+            clock.return_value = 1020.0
+            self.assertEqual(self.client.get('/api/listings/').status_code, 200)
+            self.assertEqual(self.client.get('/api/listings/').status_code, 429)
+
+    def test_payment_budget(self):
+        def throttled():
+            return metrics.REGISTRY.get_sample_value('throttled_requests_total', {'scope': 'payment'}) or 0
+
+        before = throttled()
+        statuses = [
+            self.client.post('/api/payments/initiate/', {}, content_type='application/json').status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(statuses, [400, 400, 429])
+        self.assertEqual(throttled(), before + 1)
+
+    def test_disabled(self):
+        with self.settings(THROTTLE_ENABLED=False):
+            for _ in range(5):
+                self.assertEqual(self.client.get('/api/listings/').status_code, 200)
+
+
+class QueryInstrumentationTests(FixturesMixin, TestCase):
+
+    def test_normalize_sql_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'  LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?'
+        )
+
+    def test_recorder_groups_duplicate_statements(self):
+        host = self.create_user('host')
+        for _ in range(3):
+            self.create_listing(host)
+        with QueryRecorder() as recorder:
+            for listing in Listing.objects.all():
+                listing.host.username
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(list(recorder.duplicates().values()), [3])
+
+    def test_middleware_reports_queries_and_flags_n_plus_one(self):
+        response = self.client.get('/api/listings/')
+        self.assertEqual(response['X-DB-Queries'], '1')
+        self.assertIn('X-DB-Time-ms', response)
+
+        host = self.create_user('host')
+        for _ in range(3):
+            self.create_listing(host)
+        with self.settings(N_PLUS_ONE_THRESHOLD=3, N_PLUS_ONE_RAISE=True), \
+                mock.patch('listings.views.ListingViewSet.queryset', Listing.objects.all()):
+            cache.clear()
+            with self.assertRaises(NPlusOneError):
+                self.client.get('/api/listings/')
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0, PROFILING_KEEP=2)
+class ProfilingTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        profiling_dir = self.settings(PROFILING_DIR=self.directory)
+        profiling_dir.enable()
+        self.addCleanup(profiling_dir.disable)
+        self.staff = User.objects.create_user('staff', password='password123', is_staff=True)
+
+    def test_only_staff_can_request_a_profile(self):
+        self.client.force_login(self.create_user())
+        response = self.client.get('/api/listings/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/listings/', HTTP_X_PROFILE='1')
+        profile_id = response['X-Profile-Id']
+
+        stdout = StringIO()
+        call_command('profiles', profile_id, stdout=stdout)
+        self.assertIn('GET /api/listings/ -> 200', stdout.getvalue())
+        self.assertIn('function calls', stdout.getvalue())
+
+    def test_sampled_profiles_are_pruned(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            for _ in range(3):
+                self.client.get('/api/listings/')
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+        stdout = StringIO()
+        call_command('profiles', stdout=stdout)
+        self.assertEqual(stdout.getvalue().count('GET /api/listings/'), 2)
+
+
+class MetricsTests(FixturesMixin, TestCase):
+
+    def sample(self, name, **labels):
+        return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_and_queries_are_recorded_per_route(self):
+        labels = {'method': 'GET', 'route': 'listings:listing-list', 'status': '200'}
+        before = self.sample('http_request_duration_seconds_count', **labels)
+        queries_before = self.sample('db_queries_per_request_sum', route='listings:listing-list')
+        self.client.get('/api/listings/')
+        self.assertEqual(self.sample('http_request_duration_seconds_count', **labels), before + 1)
+        self.assertEqual(self.sample('db_queries_per_request_sum', route='listings:listing-list'), queries_before + 1)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds_bucket{', response.content)
+
+    def test_metrics_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+    @mock.patch('listings.views.requests')
+    def test_payment_flow_counters(self, chapa):
+        booking = self.create_booking(self.create_listing(self.create_user('host')), self.create_user())
+        Payment.objects.create(booking=booking, amount=booking.total_price, chapa_reference='tx-metrics')
+        chapa.get.return_value.status_code = 200
+        chapa.get.return_value.json.return_value = {
+            'status': 'success', 'data': {'status': 'success', 'reference': 'chapa-ref'},
+        }
+        completed = self.sample('payments_total', status='completed')
+        confirmed = self.sample('bookings_confirmed_total', source='payment')
+        tasks = self.sample('celery_task_duration_seconds_count',
+                            task='listings.tasks.send_payment_confirmation_email', state='SUCCESS')
+        calls = self.sample('chapa_request_duration_seconds_count', operation='verify')
+
+        self.client.get('/api/payments/verify/', {'tx_ref': 'tx-metrics'})
+
+        self.assertEqual(self.sample('payments_total', status='completed'), completed + 1)
+        self.assertEqual(self.sample('bookings_confirmed_total', source='payment'), confirmed + 1)
+        self.assertEqual(self.sample('chapa_request_duration_seconds_count', operation='verify'), calls + 1)
+        # The email task runs eagerly through the project's Celery app
+        self.assertEqual(
+            self.sample('celery_task_duration_seconds_count',
+                        task='listings.tasks.send_payment_confirmation_email', state='SUCCESS'),
+            tasks + 1
+        )
+
+
+class RequestTimingTests(FixturesMixin, TestCase):
+
+    def test_server_timing_header_and_log_line(self):
+        host = self.create_user('host')
+        self.create_listing(host)
+        with self.assertLogs('listings.requests', 'INFO') as logs:
+            response = self.client.get('/api/listings/', HTTP_ACCEPT='application/json')
+
+        phases = {entry.split(';')[0] for entry in response['Server-Timing'].split(', ')}
+        self.assertLessEqual({'auth', 'db', 'serialization', 'render', 'total'}, phases)
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['route'], 'listings:listing-list')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['db_queries'], 2)
+
+    def test_disabled_mode_removes_middleware(self):
+        with self.settings(REQUEST_TIMING_ENABLED=False):
+            self.client = self.client_class()
+            response = self.client.get('/api/listings/')
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(OPENAPI_LIVE=False)
+class OpenAPISchemaTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        schema_dir = self.settings(OPENAPI_SCHEMA_DIR=directory.name)
+        schema_dir.enable()
+        self.addCleanup(schema_dir.disable)
+        call_command('build_schema', stdout=StringIO())
+
+    def test_prebuilt_schema_is_served_with_etag(self):
+        with mock.patch('listings.schema.generate_schema') as generate:
+            response = self.client.get('/swagger.json/')
+            generate.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/listings/', json.loads(response.content)['paths'])
+        self.assertIn('max-age=86400', response['Cache-Control'])
+
+        response = self.client.get('/swagger.json/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/swagger.yaml/')['Content-Type'], 'application/yaml')
+        self.assertEqual(self.client.get('/swagger.txt/').status_code, 404)
+
+
+class WarmUpTests(TestCase):
+
+    def test_runs_every_step(self):
+        with self.assertNoLogs('listings.warmup', level='ERROR'):
+            timings = warm_up()
+        self.assertEqual(set(timings), {'urls', 'serializers', 'connections'})
+
+    def test_disabled(self):
+        with self.settings(WARMUP_ON_START=False):
+            self.assertEqual(warm_up(), {})
+
+
+@override_settings(ROOT_URLCONF='listings.tests')
+class AsyncViewTests(FixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = self.create_user('host')
+        self.guest = self.create_user()
+        self.listing = self.create_listing(self.host)
+        self.create_listing(self.host, title='Mountain Cabin', location='Paris, France', max_guests=2)
+        self.review = Review.objects.create(listing=self.listing, user=self.guest, rating=5, comment='Great')
+
+    def async_get(self, path, **kwargs):
+        return async_to_sync(self.async_client.get)(path, **kwargs)
+
+    def test_responses_match_sync_api(self):
+        paths = [
+            '/api/listings/',
+            '/api/listings/?search=Cabin',
+            '/api/listings/?location=Paris, France',
+            '/api/listings/?ordering=price_per_night&page=last',
+            f'/api/listings/{self.listing.listing_id}/',
+            f'/api/reviews/?listing={self.listing.listing_id}',
+            f'/api/reviews/{self.review.review_id}/',
+            f'/api/listings/{uuid.uuid4()}/',
+            '/api/listings/?page=9',
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                cache.clear()
+                with self.settings(ROOT_URLCONF='urls'):
+                    expected = self.client.get(path, HTTP_ACCEPT='application/json')
+                cache.clear()
+                response = self.async_get(path)
+                self.assertTrue(issubclass(response.resolver_match.func.view_class, AsyncReadView))
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_other_listing_routes_reach_the_viewset(self):
+        # Only UUIDs match the async detail routes
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with self.settings(AUTOCOMPLETE_SNAPSHOT_PATH=os.path.join(directory.name, 'snapshot.idx')):
+            response = self.async_get('/api/listings/autocomplete/', data={'prefix': 'par'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.resolver_match.url_name, 'listing-autocomplete')
+        self.assertIn('Paris, France', [result['text'] for result in response.json()['results']])
+
+        response = self.async_get('/api/listings/not-a-uuid/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(issubclass(response.resolver_match.func.cls, AsyncReadView))
+
+    def test_shares_response_cache_with_sync_api(self):
+        with self.settings(ROOT_URLCONF='urls'):
+            self.client.get('/api/listings/')
+        self.assertEqual(self.async_get('/api/listings/')['X-Cache'], 'HIT')
+
+    def test_writes_and_browsable_api_use_viewset(self):
+        url = f'/api/reviews/{self.review.review_id}/'
+        self.assertIn(b'<html', self.async_get(url, headers={'Accept': 'text/html'}).content)
+
+        response = async_to_sync(self.async_client.delete)(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Review.objects.filter(pk=self.review.pk).exists())
+
+    def test_cache_and_throttle_calls_leave_the_event_loop(self):
+        on_loop = []
+
+        def record(function):
+            def wrapper(*args, **kwargs):
+                on_loop.append((function.__name__, asyncio._get_running_loop() is not None))
+                return function(*args, **kwargs)
+            return wrapper
+
+        with mock.patch('listings.cache.lookup', record(response_cache.lookup)), \
+                mock.patch('listings.cache.store', record(response_cache.store)), \
+                mock.patch.object(TokenBucketThrottle, 'allow_request', record(TokenBucketThrottle.allow_request)):
+            self.assertEqual(self.async_get('/api/listings/')['X-Cache'], 'MISS')
+        self.assertEqual({name for name, _ in on_loop}, {'allow_request', 'lookup', 'store'})
+        self.assertFalse(any(loop for _, loop in on_loop), on_loop)
+
+    def test_search_is_throttled(self):
+        rates = {'search': '1/min', 'write': None, 'payment': None}
+        with mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', rates):
+            self.assertEqual(self.async_get('/api/listings/').status_code, 200)
+            response = self.async_get('/api/listings/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_middleware_instruments_async_requests(self):
+        with self.assertLogs('listings.requests', 'INFO') as logs:
+            response = self.async_get('/api/listings/')
+        self.assertEqual(response['X-DB-Queries'], '2')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['route'], 'listings:listing-list')
+        self.assertEqual(line['db_queries'], 2)
@@ -0,0 +1,161 @@
+"""
+Token-bucket rate limiting for the API.
+
+Every client (the user id when authenticated, else the IP address) has
+one bucket per scope, holding up to N tokens and refilled at N per
+period, from the REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] string "N/period".
+A request takes one token; with none left it gets HTTP 429 and a
+Retry-After header with the seconds until the next token.
+
+Scopes:
+- search: list (search/filter) requests on the viewsets
+- write: unsafe-method requests on the viewsets
+- payment: the payment endpoints, which call Chapa
+
+The buckets live in the THROTTLE_CACHE_ALIAS cache so that every gunicorn
+worker shares them. On Redis a bucket is updated atomically by a Lua
+script in one round trip. Other backends read and write the bucket under
+a process-local lock: exact within a worker, while workers racing on the
+same bucket can let a few extra requests through.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+from . import metrics
+
+
+KEY_PREFIX = 'throttle:'
+
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ttl)
+return {allowed, tostring(wait)}
+"""
+
+
+class TokenBucket:
+    """
+    Token buckets stored in a Django cache.
+    """
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or settings.THROTTLE_CACHE_ALIAS]
+        self.lock = threading.Lock()
+        self.script = None
+
+    def consume(self, key, capacity, rate):
+        """
+        Take one token from the bucket `key` (`capacity` tokens, refilled at
+        `rate` tokens per second). Return (allowed, seconds until a token is
+        available).
+        """
+        # A bucket untouched for this long is full again and can expire
+        ttl = int(capacity / rate) + 1
+        if isinstance(self.cache, RedisCache):
+            return self._consume_redis(key, capacity, rate, ttl)
+        return self._consume_local(key, capacity, rate, ttl)
+
+    def _consume_redis(self, key, capacity, rate, ttl):
+        key = self.cache.make_and_validate_key(KEY_PREFIX + key)
+        client = self.cache._cache.get_client(key, write=True)
+        if self.script is None:
+            # Sent by SHA (EVALSHA), loaded on the first call to each server
+            self.script = client.register_script(TOKEN_BUCKET_LUA)
+        allowed, wait = self.script(keys=[key], args=[capacity, rate, ttl], client=client)
+        return bool(allowed), float(wait)
+
+    def _consume_local(self, key, capacity, rate, ttl):
+        key = KEY_PREFIX + key
+        with self.lock:
+            now = time.time()
+            tokens, stamp = self.cache.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - stamp) * rate)
+            if tokens >= 1:
+                self.cache.set(key, (tokens - 1, now), ttl)
+                return True, 0.0
+            self.cache.set(key, (tokens, now), ttl)
+            return False, (1 - tokens) / rate
+
+
+_buckets = {}
+
+
+def get_bucket():
+    alias = settings.THROTTLE_CACHE_ALIAS
+    if alias not in _buckets:
+        _buckets[alias] = TokenBucket(alias)
+    return _buckets[alias]
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Base throttle. Subclasses set `scope` and implement applies().
+    """
+
+    def applies(self, request, view):
+        raise NotImplementedError
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return f'{self.scope}:user:{request.user.pk}'
+        return f'{self.scope}:ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED or self.rate is None or not self.applies(request, view):
+            return True
+        allowed, self.retry_after = get_bucket().consume(
+            self.get_cache_key(request, view),
+            self.num_requests,
+            self.num_requests / self.duration,
+        )
+        if not allowed:
+            metrics.throttled_requests.labels(self.scope).inc()
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class SearchRateThrottle(TokenBucketThrottle):
+    scope = 'search'
+
+    def applies(self, request, view):
+        return request.method in SAFE_METHODS and getattr(view, 'action', None) == 'list'
+
+
+class WriteRateThrottle(TokenBucketThrottle):
+    scope = 'write'
+
+    def applies(self, request, view):
+        return request.method not in SAFE_METHODS
+
+
+class PaymentRateThrottle(TokenBucketThrottle):
+    scope = 'payment'
+
+    def applies(self, request, view):
+        return True
@@ -0,0 +1,112 @@
+"""
+Per-request phase timings.
+
+RequestTimingMiddleware starts a RequestTimings for each request and the
+instrumented pieces add to it:
+
+- auth: TimedSessionAuthentication
+- db: every SQL statement (listings.querycount.observe_queries)
+- serialization: serializers using TimedSerializerMixin
+- render: TimedJSONRenderer
+- external: Chapa API calls (listings.metrics.observe_chapa)
+
+Phases may overlap (a lazy query during serialization counts for both db
+and serialization). Outside an instrumented request, or when
+REQUEST_TIMING_ENABLED is off, timed() only does a context variable
+lookup.
+"""
+
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.renderers import JSONRenderer
+
+
+current_timings = ContextVar('current_timings', default=None)
+
+_NULL = nullcontext()
+
+
+class RequestTimings:
+    """
+    Accumulated seconds per phase, plus free-form fields for the request log.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counts = {}
+        self.fields = {}
+        self._active = set()
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    @contextmanager
+    def measure(self, phase):
+        if phase in self._active:
+            # Nested serializers: only the outermost call is timed
+            yield
+            return
+        self._active.add(phase)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._active.discard(phase)
+            self.add(phase, time.perf_counter() - start)
+
+    def on_query(self, alias, sql, seconds):
+        self.add('db', seconds)
+
+    def server_timing(self, total):
+        """
+        Format the phases as a Server-Timing header value (durations in ms).
+        """
+        entries = []
+        for phase, seconds in self.phases.items():
+            entry = f'{phase};dur={seconds * 1000:.2f}'
+            if phase in ('db', 'external'):
+                entry += f';desc="{self.counts[phase]} calls"'
+            entries.append(entry)
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def timed(phase):
+    """
+    Context manager adding the time spent in the block to the current request's phase.
+    """
+    timings = current_timings.get()
+    if timings is None:
+        return _NULL
+    return timings.measure(phase)
+
+
+def annotate(**fields):
+    """
+    Add fields to the current request's log line (no-op outside a timed request).
+    """
+    timings = current_timings.get()
+    if timings is not None:
+        timings.fields.update(fields)
+
+
+class TimedSessionAuthentication(SessionAuthentication):
+    def authenticate(self, request):
+        with timed('auth'):
+            return super().authenticate(request)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class TimedSerializerMixin:
+    def to_representation(self, instance):
+        with timed('serialization'):
+            return super().to_representation(instance)
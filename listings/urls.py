@@ -2,9 +2,10 @@
 URL configuration for listings app.
 Uses DRF Router to automatically generate RESTful routes for ViewSets.
 """
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 app_name = 'listings'
 
@@ -14,11 +15,29 @@ router.register(r'listings', views.ListingViewSet, basename='listing')
 router.register(r'bookings', views.BookingViewSet, basename='booking')
 router.register(r'reviews', views.ReviewViewSet, basename='review')
 
-urlpatterns = [
+# Primary keys are UUIDs; anything else in their place is another route
+# (/listings/autocomplete/) or a 404 from the viewset
+UUID_PATTERN = r'[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}'
+
+# Native async views with the same paths and names as the router's
+# list/detail routes, matched first when ASYNC_API_VIEWS is on
+async_urlpatterns = [
+    path('listings/', async_views.ListingReadView.as_view(), name='listing-list'),
+    re_path(rf'^listings/(?P<pk>{UUID_PATTERN})/$', async_views.ListingReadView.as_view(detail=True), name='listing-detail'),
+    path('reviews/', async_views.ReviewReadView.as_view(), name='review-list'),
+    re_path(rf'^reviews/(?P<pk>{UUID_PATTERN})/$', async_views.ReviewReadView.as_view(detail=True), name='review-detail'),
+]
+
+urlpatterns = async_urlpatterns if settings.ASYNC_API_VIEWS else []
+
+urlpatterns += [
     # Include router URLs
     path('', include(router.urls)),
 
     # Payment endpoints
     path('payments/initiate/', views.initiate_payment, name='initiate-payment'),
     path('payments/verify/', views.verify_payment, name='verify-payment'),
+
+    # Delta sync for mobile clients
+    path('sync/', views.sync_changes, name='sync'),
 ]
@@ -3,23 +3,41 @@ API Views for the travel booking application.
 Implements ViewSets for Listing, Booking, and Review models with full CRUD operations.
 """
 
+import logging
 import os
 import uuid
 import requests
-from datetime import datetime
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from rest_framework import viewsets, filters, permissions, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Listing, Booking, Review, Payment
+from .cache import AVAILABILITY_TAG, RATINGS_TAG, CachedResponseMixin
+from .filters import ListingFilter, RelevanceSearchFilter, ReviewFilter
+from . import autocomplete, metrics, schema, sync
+from .models import Listing, Booking, Review, Payment, SimilarListings
+from .pagination import ReviewCursorPagination
 from .serializers import ListingSerializer, BookingSerializer, ReviewSerializer, PaymentInitiateSerializer, PaymentResponseSerializer
+from .routers import primary_db
 from .tasks import send_payment_confirmation_email
+from .throttling import PaymentRateThrottle
+from .timing import annotate
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 
-class ListingViewSet(viewsets.ModelViewSet):
+logger = logging.getLogger(__name__)
+
+
+class ListingViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing property listings.
 
@@ -30,21 +48,130 @@ class ListingViewSet(viewsets.ModelViewSet):
     - update: PUT /api/listings/{id}/
     - partial_update: PATCH /api/listings/{id}/
     - destroy: DELETE /api/listings/{id}/
+    - reviews: GET /api/listings/{id}/reviews/
+    - similar: GET /api/listings/{id}/similar/
+    - autocomplete: GET /api/listings/autocomplete/?prefix=
 
     Features:
-    - Filtering by location and max_guests
-    - Search by title, description, and location
+    - Filtering by location, max_guests, price range, minimum rating, availability
+      and map area (radius or bounding box, listings.geo)
+    - Search over title, location and description, ranked by relevance (listings.search)
     - Ordering by price_per_night and created_at
+    - Cached list/retrieve responses, invalidated on listing changes (and on
+      booking or review changes for the availability and rating filters)
+    - Cursor-paginated reviews with a rating summary, first page cached
+    - Similar listings from the precomputed store (listings.recommendations)
+    - Typeahead suggestions from the shared prefix index (listings.autocomplete)
     """
     queryset = Listing.objects.all().select_related('host')
     serializer_class = ListingSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['location', 'max_guests']
-    search_fields = ['title', 'description', 'location']
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, RelevanceSearchFilter]
+    filterset_class = ListingFilter
     ordering_fields = ['price_per_night', 'created_at']
     ordering = ['-created_at']
 
+    def get_cache_tags(self):
+        if self.action == 'retrieve':
+            return [f'listing:{self.cache_tag_id(self.kwargs[self.lookup_field])}']
+        if self.action == 'reviews':
+            listing_id = self.cache_tag_id(self.kwargs[self.lookup_field])
+            return [f'listing:{listing_id}', f'reviews:listing:{listing_id}']
+        if self.action == 'similar':
+            # Neighbours are embedded, so any listing change invalidates
+            return ['listings', 'similar']
+        params = self.request.query_params
+        location = params.get('location')
+        tags = [f'listings:location:{location}'] if location else ['listings']
+        if params.get('check_in') or params.get('check_out'):
+            tags.append(AVAILABILITY_TAG)
+        if params.get('min_rating'):
+            tags.append(RATINGS_TAG)
+        return tags
+
+    @action(
+        detail=True,
+        methods=['get'],
+        serializer_class=ReviewSerializer,
+        pagination_class=ReviewCursorPagination,
+        filter_backends=[],
+    )
+    def reviews(self, request, pk=None):
+        """
+        The listing's reviews, newest first, with its rating summary.
+        Pages are followed with ?cursor=; only the first page is cached.
+        """
+        if request.query_params.get(self.paginator.cursor_query_param):
+            return self.list_reviews(request, pk)
+        return self.cached_response(self.list_reviews, request, pk)
+
+    def list_reviews(self, request, pk):
+        listing = get_object_or_404(Listing.objects.only('pk'), pk=pk)
+        page = self.paginate_queryset(
+            Review.objects.filter(listing=listing).select_related('user')
+        )
+        return Response({
+            'rating_summary': rating_summary(listing.pk),
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link(),
+            'results': self.get_serializer(page, many=True).data,
+        })
+
+    @action(detail=True, methods=['get'], pagination_class=None, filter_backends=[])
+    def similar(self, request, pk=None):
+        """
+        The listing's most similar listings, most similar first, each with
+        its similarity score (0-1). Empty until the listing has been
+        included in a refresh_similar_listings run.
+        """
+        return self.cached_response(self.list_similar, request, pk)
+
+    def list_similar(self, request, pk):
+        listing = get_object_or_404(Listing.objects.only('pk'), pk=pk)
+        stored = SimilarListings.objects.filter(listing=listing).first()
+        ranked = stored.ranked() if stored else []
+        neighbours = self.get_queryset().in_bulk([listing_id for listing_id, _ in ranked])
+        # Listings deleted since the last refresh are skipped
+        ranked = [(neighbours[listing_id], similarity) for listing_id, similarity in ranked if listing_id in neighbours]
+        results = self.get_serializer([neighbour for neighbour, _ in ranked], many=True).data
+        for data, (_, similarity) in zip(results, ranked):
+            data['similarity'] = round(similarity, 3)
+        return Response({'results': results})
+
+    @action(detail=False, methods=['get'], pagination_class=None, filter_backends=[])
+    def autocomplete(self, request):
+        """
+        Locations and title terms starting with ?prefix=, most listings
+        first, up to ?limit= (default AUTOCOMPLETE_RESULTS, at most 20).
+        Served from the memory-mapped snapshot, without SQL.
+        """
+        prefix = request.query_params.get('prefix', '')
+        try:
+            limit = int(request.query_params.get('limit', settings.AUTOCOMPLETE_RESULTS))
+        except ValueError:
+            limit = settings.AUTOCOMPLETE_RESULTS
+        response = Response({'prefix': prefix, 'results': autocomplete.suggest(prefix, limit)})
+        patch_cache_control(response, public=True, max_age=settings.AUTOCOMPLETE_REFRESH_SECONDS)
+        return response
+
+
+def rating_summary(listing_id):
+    """
+    Review count, average rating and number of reviews per star for a listing,
+    in one aggregate query.
+    """
+    stars = range(5, 0, -1)
+    totals = Review.objects.filter(listing_id=listing_id).aggregate(
+        count=Count('pk'),
+        average=Avg('rating'),
+        **{f'stars_{star}': Count('pk', filter=Q(rating=star)) for star in stars},
+    )
+    return {
+        'count': totals['count'],
+        'average': round(totals['average'], 2) if totals['average'] is not None else None,
+        'distribution': {str(star): totals[f'stars_{star}'] for star in stars},
+    }
+
 
 class BookingViewSet(viewsets.ModelViewSet):
     """
@@ -63,7 +190,7 @@ class BookingViewSet(viewsets.ModelViewSet):
     - Search by listing title and user username
     - Ordering by created_at and check_in_date
     """
-    queryset = Booking.objects.all().select_related('listing', 'user')
+    queryset = Booking.objects.all().select_related('listing__host', 'user')
     serializer_class = BookingSerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -73,7 +200,7 @@ class BookingViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing reviews.
 
@@ -89,19 +216,30 @@ class ReviewViewSet(viewsets.ModelViewSet):
     - Filtering by rating and listing
     - Search by comment and listing title
     - Ordering by rating and created_at
+    - Cached list/retrieve responses, invalidated on review changes
     """
     queryset = Review.objects.all().select_related('listing', 'user')
     serializer_class = ReviewSerializer
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['rating', 'listing']
+    filterset_class = ReviewFilter
     search_fields = ['comment', 'listing__title', 'user__username']
     ordering_fields = ['rating', 'created_at']
     ordering = ['-created_at']
 
+    def get_cache_tags(self):
+        if self.action == 'retrieve':
+            return [f'review:{self.cache_tag_id(self.kwargs[self.lookup_field])}']
+        listing_id = self.request.query_params.get('listing')
+        if listing_id:
+            return [f'reviews:listing:{self.cache_tag_id(listing_id)}']
+        return ['reviews']
+
 
 # Chapa Payment Integration Views
+# Payment views always read from the primary database.
 
+@primary_db
 @swagger_auto_schema(
     method='post',
     request_body=PaymentInitiateSerializer,
@@ -137,6 +275,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
 )
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([PaymentRateThrottle])
 def initiate_payment(request):
     """
     Initiate a payment transaction with Chapa.
@@ -174,7 +313,7 @@ def initiate_payment(request):
             )
 
         try:
-            booking = Booking.objects.get(booking_id=booking_id)
+            booking = Booking.objects.select_related('listing', 'user').get(booking_id=booking_id)
         except Booking.DoesNotExist:
             return Response(
                 {"status": "error", "message": "Booking not found"},
@@ -237,7 +376,7 @@ def initiate_payment(request):
             "Content-Type": "application/json"
         }
 
-        response = requests.post(chapa_url, json=chapa_data, headers=headers)
+        response = metrics.observe_chapa('initialize', requests.post, chapa_url, json=chapa_data, headers=headers)
         response_data = response.json()
 
         if response.status_code == 200 and response_data.get('status') == 'success':
@@ -252,6 +391,7 @@ def initiate_payment(request):
                     'checkout_url': response_data['data']['checkout_url']
                 }
             )
+            metrics.payments.labels('initiated').inc()
 
             return Response(
                 {
@@ -286,6 +426,7 @@ def initiate_payment(request):
         )
 
 
+@primary_db
 @swagger_auto_schema(
     method='get',
     manual_parameters=[
@@ -372,6 +513,7 @@ def initiate_payment(request):
 )
 @api_view(['GET', 'POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([PaymentRateThrottle])
 def verify_payment(request):
     """
     Verify a payment transaction with Chapa.
@@ -410,7 +552,7 @@ def verify_payment(request):
 
         # Find payment by reference
         try:
-            payment = Payment.objects.get(chapa_reference=tx_ref)
+            payment = Payment.objects.select_related('booking').get(chapa_reference=tx_ref)
         except Payment.DoesNotExist:
             return Response(
                 {"status": "error", "message": "Payment not found"},
@@ -440,7 +582,7 @@ def verify_payment(request):
             "Authorization": f"Bearer {os.getenv('CHAPA_SECRET_KEY')}"
         }
 
-        response = requests.get(chapa_url, headers=headers)
+        response = metrics.observe_chapa('verify', requests.get, chapa_url, headers=headers)
         response_data = response.json()
 
         if response.status_code == 200 and response_data.get('status') == 'success':
@@ -448,15 +590,21 @@ def verify_payment(request):
 
             # Update payment based on Chapa response
             if chapa_status == 'success':
-                payment.payment_status = 'completed'
-                payment.transaction_id = response_data['data'].get('reference')
-                payment.payment_method = response_data['data'].get('payment_method', 'Unknown')
-                payment.payment_date = datetime.now()
-                payment.save()
-
-                # Update booking status
-                payment.booking.status = 'confirmed'
-                payment.booking.save()
+                # Payment and booking are updated in one (IMMEDIATE on SQLite) transaction
+                with transaction.atomic():
+                    payment.payment_status = 'completed'
+                    payment.transaction_id = response_data['data'].get('reference')
+                    payment.payment_method = response_data['data'].get('payment_method', 'Unknown')
+                    payment.payment_date = timezone.now()
+                    payment.save()
+
+                    # Update booking status
+                    payment.booking.status = 'confirmed'
+                    payment.booking.save()
+
+                metrics.payments.labels('completed').inc()
+                metrics.payment_amount.labels(payment.currency).inc(float(payment.amount))
+                metrics.bookings_confirmed.labels('payment').inc()
 
                 # Send confirmation email
                 try:
@@ -465,17 +613,19 @@ def verify_payment(request):
                         str(payment.payment_id),
                         str(payment.booking.booking_id)
                     )
+                    annotate(email_delivery='queued')
                 except Exception as email_error:
                     # If Celery broker fails (PythonAnywhere free tier), call directly
-                    print(f"Celery broker unavailable, sending email directly: {email_error}")
+                    logger.warning("Celery broker unavailable, sending email directly: %s", email_error)
                     try:
                         send_payment_confirmation_email(
                             str(payment.payment_id),
                             str(payment.booking.booking_id)
                         )
-                        print("Email sent successfully via direct call")
+                        annotate(email_delivery='direct')
                     except Exception as direct_error:
-                        print(f"Failed to send email directly: {direct_error}")
+                        logger.error("Failed to send email directly: %s", direct_error)
+                        annotate(email_delivery='failed', email_error=str(direct_error))
 
                 return Response(
                     {
@@ -494,6 +644,7 @@ def verify_payment(request):
             else:
                 payment.payment_status = 'failed'
                 payment.save()
+                metrics.payments.labels('failed').inc()
 
                 return Response(
                     {
@@ -525,3 +676,127 @@ def verify_payment(request):
             },
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+# Delta sync for mobile clients, read from the primary: a lagging replica
+# could let a cursor move past changes it has not received yet
+
+@primary_db
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter(
+            'cursor',
+            openapi.IN_QUERY,
+            description="Cursor from the previous response; omit for the initial download",
+            type=openapi.TYPE_STRING,
+        ),
+        openapi.Parameter(
+            'limit',
+            openapi.IN_QUERY,
+            description="Changes per response (default SYNC_PAGE_SIZE, at most SYNC_MAX_PAGE_SIZE)",
+            type=openapi.TYPE_INTEGER,
+        ),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Changes since the cursor, oldest first",
+            examples={
+                "application/json": {
+                    "changes": [
+                        {"type": "listing", "op": "upsert", "id": "uuid-string",
+                         "at": "2026-10-19T10:00:00+00:00", "data": {"listing_id": "uuid-string"}},
+                        {"type": "booking", "op": "delete", "id": "uuid-string",
+                         "at": "2026-10-19T10:00:01+00:00"}
+                    ],
+                    "cursor": "opaque-string",
+                    "has_more": False
+                }
+            }
+        ),
+        400: "Invalid cursor or limit",
+        410: "Cursor expired - sync again without a cursor"
+    },
+)
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def sync_changes(request):
+    """
+    Listings, reviews and the user's bookings changed or deleted since
+    ?cursor= (listings.sync), streamed.
+
+    GET /api/sync/?cursor=<cursor>&limit=500
+
+    Call again with the returned cursor while has_more is true, then at the
+    next launch. Without a cursor the feed starts with every record.
+    Under ASGI the body is an async iterator, so it is streamed there too.
+    """
+    try:
+        limit = int(request.query_params.get('limit') or settings.SYNC_PAGE_SIZE)
+    except ValueError:
+        return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= settings.SYNC_MAX_PAGE_SIZE:
+        return Response(
+            {'detail': f'limit must be between 1 and {settings.SYNC_MAX_PAGE_SIZE}'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        feed = sync.ChangeFeed(request.user, request.query_params.get('cursor'), limit)
+    except sync.CursorExpired as error:
+        return Response({'detail': str(error)}, status=status.HTTP_410_GONE)
+    except ValueError as error:
+        return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    chunks = feed.astream() if isinstance(request._request, ASGIRequest) else feed.stream()
+    response = StreamingHttpResponse(chunks, content_type='application/json')
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+def metrics_view(request):
+    """
+    Prometheus metrics in text exposition format, aggregated over all
+    worker processes when PROMETHEUS_MULTIPROC_DIR is set.
+
+    GET /metrics
+    """
+    if not settings.METRICS_ENABLED:
+        return HttpResponse(status=404)
+    if settings.METRICS_TOKEN:
+        if request.headers.get('Authorization') != f'Bearer {settings.METRICS_TOKEN}':
+            return HttpResponse(status=401)
+    body, content_type = metrics.render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
+def _schema_format(format):
+    fmt = format.lstrip('.')
+    if fmt not in schema.CONTENT_TYPES:
+        raise Http404
+    return fmt
+
+
+@condition(etag_func=lambda request, format: schema.get_schema(_schema_format(format))[1])
+def _prebuilt_schema(request, format):
+    fmt = _schema_format(format)
+    content, etag = schema.get_schema(fmt)
+    response = HttpResponse(content, content_type=schema.CONTENT_TYPES[fmt])
+    patch_cache_control(response, public=True, max_age=settings.OPENAPI_CACHE_SECONDS)
+    return response
+
+
+def openapi_schema(request, format):
+    """
+    OpenAPI schema as JSON or YAML.
+
+    GET /swagger.json/, /swagger.yaml/
+
+    Serves the file written by `manage.py build_schema` with an ETag (304 on
+    If-None-Match) and a long max-age; regenerates it on each request only
+    when OPENAPI_LIVE is set.
+    """
+    if settings.OPENAPI_LIVE:
+        return _live_schema_view(request, format=format)
+    return _prebuilt_schema(request, format)
+
+
+_live_schema_view = schema.lazy_schema_view('without_ui', cache_timeout=0)
@@ -0,0 +1,67 @@
+"""
+Worker warm-up.
+
+The first requests a fresh worker serves pay for one-off work: populating
+the URL resolvers, building serializer fields from model metadata,
+compiling the first querysets and connecting to the database. warm_up()
+does that work at boot instead. It is called from wsgi.py (which
+pythonanywhere_wsgi.py imports) and asgi.py, or from gunicorn's post_fork
+hook when the app is preloaded in the master (see gunicorn.conf.py), and
+can be turned off with WARMUP_ON_START.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver, reverse
+
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls():
+    resolver = get_resolver()
+    # Builds the reverse dictionaries of every nested resolver
+    resolver.reverse_dict
+    for name in ('listings:listing-list', 'listings:booking-list', 'listings:review-list',
+                 'listings:initiate-payment', 'listings:verify-payment'):
+        resolver.resolve(reverse(name))
+
+
+def warm_serializers():
+    from .urls import router
+
+    for prefix, viewset, basename in router.registry:
+        serializer = viewset.serializer_class()
+        # Field construction walks the model metadata and nested serializers
+        for field in serializer.fields.values():
+            getattr(field, 'fields', None)
+        # Compiles the SQL of the queryset the list action starts from
+        str(viewset.queryset.query)
+
+
+def warm_connections():
+    for alias in ['default', *settings.DATABASE_REPLICAS]:
+        connections[alias].ensure_connection()
+
+
+def warm_up():
+    """
+    Run every warm-up step and return the time each took, in milliseconds.
+    """
+    if not settings.WARMUP_ON_START:
+        return {}
+
+    timings = {}
+    for name, step in (('urls', warm_urls), ('serializers', warm_serializers), ('connections', warm_connections)):
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # A cold worker is better than one that fails to boot
+            logger.exception('Warm-up step %s failed', name)
+        timings[name] = round((time.perf_counter() - start) * 1000, 3)
+    logger.info('Worker warm-up finished: %s', timings)
+    return timings
@@ -29,6 +29,6 @@ import environ
 env = environ.Env()
 environ.Env.read_env(os.path.join(path, '.env'))
 
-# Initialize Django WSGI application
-from django.core.wsgi import get_wsgi_application
-application = get_wsgi_application()
+# Initialize Django WSGI application through the project's wsgi.py, which
+# also warms the worker up (listings.warmup)
+from wsgi import application
@@ -16,23 +16,8 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include, re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-# Swagger/OpenAPI Schema Configuration
-schema_view = get_schema_view(
-    openapi.Info(
-        title="ALX Travel App API",
-        default_version='v1',
-        description="API documentation for ALX Travel App - A comprehensive travel listing platform",
-        terms_of_service="https://www.alxafrica.com/terms/",
-        contact=openapi.Contact(email="contact@alxtravelapp.com"),
-        license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from listings.schema import lazy_schema_view
+from listings.views import metrics_view, openapi_schema
 
 urlpatterns = [
     # Admin
@@ -41,8 +26,11 @@ urlpatterns = [
     # API URLs
     path('api/', include('listings.urls')),
 
-    # Swagger Documentation URLs
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    # Prometheus metrics
+    path('metrics', metrics_view, name='metrics'),
+
+    # Swagger Documentation URLs (the schema itself is prebuilt, see listings.schema)
+    path('swagger<format>/', openapi_schema, name='schema-json'),
+    path('swagger/', lazy_schema_view('with_ui', 'swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('redoc/', lazy_schema_view('with_ui', 'redoc', cache_timeout=0), name='schema-redoc'),
 ]
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
 
 application = get_wsgi_application()
+
+# Pay the first-request costs at boot. Under gunicorn with preload_app the
+# master imports this module, so gunicorn.conf.py defers it to post_fork.
+if os.environ.get('DJANGO_WARMUP', 'import') == 'import':
+    from listings.warmup import warm_up
+
+    warm_up()